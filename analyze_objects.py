@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+
+import os, sys
+import multiprocessing
+from functools import partial
+from tqdm.auto import tqdm
+
+from stdpipe.db import DB
+
+from reticulum import variability, ingest
+
+# Per-process database connection used by the workers
+db = None
+
+
+def init_worker(dbname, dbhost):
+    global db
+
+    db = DB(dbname=dbname, dbhost=dbhost)
+    db.conn.autocommit = False
+
+
+def analyze_pixel(ipix, **kwargs):
+    """Analyzes all objects in the pixel in a separate transaction, returns their number"""
+    try:
+        N = variability.analyze_pixel(db.conn, ipix, **kwargs)
+        db.conn.commit()
+    except:
+        db.conn.rollback()
+        raise
+
+    return N
+
+
+if __name__ == '__main__':
+    from optparse import OptionParser
+
+    parser = OptionParser(usage="usage: %prog [options]")
+    parser.add_option('-d', '--db', help='Database name', action='store', dest='db', type='str', default='reticulum')
+    parser.add_option('-H', '--host', help='Database host', action='store', dest='dbhost', type='str', default=None)
+    parser.add_option('--ra', help='Center RA of the region to process, degrees', action='store', dest='ra', type='float', default=None)
+    parser.add_option('--dec', help='Center Dec of the region to process, degrees', action='store', dest='dec', type='float', default=None)
+    parser.add_option('--sr', help='Radius of the region to process, degrees', action='store', dest='sr', type='float', default=1.0)
+    parser.add_option('--min-period', help='Minimal period to search, days', action='store', dest='min_period', type='float', default=0.05)
+    parser.add_option('--min-points', help='Minimal number of points for period search', action='store', dest='min_points', type='int', default=10)
+    parser.add_option('--min-chi2', help='Minimal reduced chi2 in any filter for period search', action='store', dest='min_chi2dof', type='float', default=3)
+    parser.add_option('-j', '--jobs', help='Number of parallel processes', action='store', dest='jobs', type='int', default=1)
+    parser.add_option('-v', '--verbose', help='Verbose', action='store_true', dest='verbose', default=False)
+
+    (options,args) = parser.parse_args()
+
+    init_worker(options.db, options.dbhost)
+
+    if options.ra is not None and options.dec is not None:
+        pixels = ingest.get_photometry_hpx_cone(options.ra, options.dec, options.sr)
+    else:
+        # All pixels with objects
+        cur = db.conn.cursor()
+        cur.execute('SELECT DISTINCT hpx FROM objects ORDER BY hpx')
+        pixels = [_[0] for _ in cur.fetchall()]
+        db.conn.commit()
+
+    kwargs = {'min_period': options.min_period, 'min_points': options.min_points, 'min_chi2dof': options.min_chi2dof}
+    nobjs = 0
+
+    with tqdm(total=len(pixels)) as pbar:
+        if options.jobs > 1:
+            with multiprocessing.Pool(options.jobs, initializer=init_worker, initargs=(options.db, options.dbhost)) as pool:
+                for N in pool.imap_unordered(partial(analyze_pixel, **kwargs), pixels):
+                    nobjs += N
+                    pbar.update(1)
+        else:
+            for ipix in pixels:
+                nobjs += analyze_pixel(ipix, **kwargs)
+                pbar.update(1)
+
+    print(f"{nobjs} objects in {len(pixels)} pixels analyzed")
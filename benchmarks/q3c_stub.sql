@@ -0,0 +1,19 @@
+-- Plain SQL stand-in for the parts of Q3C extension used by reticulum, for benchmarking
+-- on servers without Q3C. Radial queries are not index-assisted, so they rely on the
+-- pruning by photometry HEALPix pixels only, and are slower than with real Q3C.
+CREATE OR REPLACE FUNCTION q3c_dist(ra1 float8, dec1 float8, ra2 float8, dec2 float8) RETURNS float8 AS $$
+  SELECT degrees(2*asin(sqrt(sin(radians(dec2 - dec1)/2)^2 + cos(radians(dec1))*cos(radians(dec2))*sin(radians(ra2 - ra1)/2)^2)))
+$$ LANGUAGE sql IMMUTABLE PARALLEL SAFE;
+
+CREATE OR REPLACE FUNCTION q3c_radial_query(ra1 float8, dec1 float8, ra0 float8, dec0 float8, sr float8) RETURNS boolean AS $$
+  SELECT q3c_dist(ra1, dec1, ra0, dec0) < sr
+$$ LANGUAGE sql IMMUTABLE PARALLEL SAFE;
+
+-- Coarse 1x1 degree cells, only to let the schema create its indexes
+CREATE OR REPLACE FUNCTION q3c_ang2ipix(ra1 float8, dec1 float8) RETURNS bigint AS $$
+  SELECT (floor(dec1 + 90)*360 + floor(ra1))::bigint
+$$ LANGUAGE sql IMMUTABLE PARALLEL SAFE;
+
+CREATE OR REPLACE FUNCTION q3c_join(ra1 float8, dec1 float8, ra2 float8, dec2 float8, sr float8) RETURNS boolean AS $$
+  SELECT q3c_dist(ra1, dec1, ra2, dec2) < sr
+$$ LANGUAGE sql IMMUTABLE PARALLEL SAFE;
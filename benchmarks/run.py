@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""Benchmarks of calibration, ingestion and query hot paths on synthetic data.
+
+Synthetic SIPS exports and reference catalogue cache are generated in the work directory,
+so no network access is needed. Ingestion and query stages need PostgreSQL server reachable
+with the usual libpq environment (PGHOST, PGUSER, ...), where the benchmark database is
+re-created from db/*.sql on every run. If Q3C extension is not installed there, its plain
+SQL stand-in from q3c_stub.sql is used instead, which makes the cone queries slower, so
+only the results obtained with the same setup should be compared.
+
+Results are stored as JSON, and can be compared with the ones from another commit:
+
+    python benchmarks/run.py -o new.json --compare old.json
+"""
+
+import os, sys
+import time
+import json
+import shutil
+import platform
+import subprocess
+import traceback
+
+import numpy as np
+
+basepath = os.path.dirname(os.path.abspath(__file__))
+rootpath = os.path.dirname(basepath)
+sys.path.insert(0, rootpath)
+
+import psycopg2
+
+from reticulum import io, ingest, objects
+
+import synthetic
+
+# All stages in order of execution
+stages = ['parse', 'calibrate', 'ingest', 'objects', 'query', 'batch', 'json', 'arrow', 'jpeg']
+
+
+def measure(func, items):
+    """Calls the function for every item, returns the timing statistics.
+    Function may return the number of rows processed, for computing the throughput.
+    """
+    times, nrows = [], 0
+
+    for item in items:
+        t0 = time.perf_counter()
+        res = func(item)
+        times.append(time.perf_counter() - t0)
+
+        if res is not None:
+            nrows += res
+
+    times = np.array(times)
+
+    return {
+        'count': len(times),
+        'total': float(np.sum(times)),
+        'min': float(np.min(times)),
+        'median': float(np.median(times)),
+        'max': float(np.max(times)),
+        'rows': int(nrows),
+        'rows_per_sec': float(nrows/np.sum(times)) if nrows else None,
+    }
+
+
+def get_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=rootpath, text=True).strip()
+    except Exception:
+        return None
+
+
+def create_database(dbname, dbhost=None):
+    """Re-creates the benchmark database from the schema files, falling back to Q3C stand-in.
+    Returns the connection, and whether real Q3C is used.
+    """
+    conn = psycopg2.connect(dbname='postgres', host=dbhost)
+    conn.autocommit = True
+    conn.cursor().execute(f"DROP DATABASE IF EXISTS {dbname} WITH (FORCE)")
+    conn.cursor().execute(f"CREATE DATABASE {dbname}")
+    conn.close()
+
+    conn = psycopg2.connect(dbname=dbname, host=dbhost)
+    conn.autocommit = True
+
+    try:
+        conn.cursor().execute('CREATE EXTENSION q3c')
+        has_q3c = True
+    except psycopg2.Error:
+        with open(os.path.join(basepath, 'q3c_stub.sql')) as f:
+            conn.cursor().execute(f.read())
+        has_q3c = False
+
+    for name in ['frames.sql', 'photometry.sql', 'objects.sql']:
+        with open(os.path.join(rootpath, 'db', name)) as f:
+            sql = '\n'.join(_ for _ in f.read().splitlines() if 'CREATE EXTENSION q3c' not in _)
+        conn.cursor().execute(sql)
+
+    conn.autocommit = False
+
+    return conn, has_q3c
+
+
+def setup_django(dbname, dbhost=None):
+    """Configures Django to use the benchmark database and no caching, so that every request hits it"""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'reticulum.settings')
+    os.environ['CACHE_BACKEND'] = 'django.core.cache.backends.dummy.DummyCache'
+
+    import django
+    django.setup()
+
+    from django.conf import settings
+    settings.DATABASES['default']['NAME'] = dbname
+    if dbhost:
+        settings.DATABASES['default']['HOST'] = dbhost
+
+
+def run(options):
+    log = (lambda *args,**kwargs: print(*args, **kwargs, file=sys.stderr, flush=True)) if options.verbose else lambda *args,**kwargs: None
+
+    workdir = options.workdir
+    if os.path.exists(workdir):
+        shutil.rmtree(workdir)
+
+    cache_dir = os.path.join(workdir, 'cache')
+
+    log(f"Generating {options.frames} frames with ~{options.stars} stars each in {workdir}")
+    filenames = synthetic.make_dataset(os.path.join(workdir, 'frames'), nframes=options.frames, nstars=options.stars, seed=options.seed, cache_dir=cache_dir)
+
+    results = {}
+    selected = options.stages.split(',') if options.stages else stages
+
+    def run_stage(name, func, items, required=False):
+        if name not in selected:
+            # Stages preparing the data for the next ones are run anyway
+            if required:
+                for item in items:
+                    func(item)
+            return
+        log(f"Running {name} on {len(items)} items")
+        try:
+            results[name] = measure(func, items)
+            log(f"  {results[name]['median']:.4f} s median, {results[name]['total']:.3f} s total")
+        except Exception as e:
+            results[name] = {'error': f"{type(e).__name__}: {e}"}
+            log(traceback.format_exc())
+
+    # Parsing of SIPS exports
+    run_stage('parse', lambda filename: len(io.read_sips(filename, filled=True)), filenames)
+
+    # Calibration with synthetic reference catalogue
+    from calibrate import process_frame
+
+    # Frames are copied beforehand, so that only the calibration itself is timed
+    calibnames = [os.path.join(workdir, 'calib', os.path.basename(_)) for _ in filenames]
+    os.makedirs(os.path.join(workdir, 'calib'), exist_ok=True)
+    for filename,calibname in zip(filenames, calibnames):
+        shutil.copy(filename, calibname)
+
+    def calibrate(filename):
+        stats = {}
+        process_frame(filename, reprocess=True, cache_dir=cache_dir, offline=True, stats=stats)
+        return stats['stages'].get('write', {}).get('rows', 0)
+
+    run_stage('calibrate', calibrate, calibnames)
+
+    if not set(selected) & set(stages[2:]):
+        return results, None
+
+    # Calibrated frames with known zero point, independent of calibration stage
+    calibrated = [synthetic.make_calibrated(_, seed=options.seed) for _ in filenames]
+    batches = [calibrated[i:i + options.batch] for i in range(0, len(calibrated), options.batch)]
+
+    conn, has_q3c = create_database(options.db, options.dbhost)
+
+    def ingest_batch(batch):
+        nframes, nrows, _, _ = ingest.ingest_frames(conn, batch)
+        conn.commit()
+        return nrows
+
+    run_stage('ingest', ingest_batch, batches, required=True)
+
+    cur = conn.cursor()
+    cur.execute('SELECT DISTINCT hpx FROM photometry ORDER BY hpx')
+    pixels = [_[0] for _ in cur.fetchall()]
+    conn.commit()
+
+    run_stage('objects', lambda pixel: objects.build_objects(conn, [pixel])[0], pixels)
+
+    conn.close()
+
+    # Queries through the views, for random stars of the field
+    setup_django(options.db, options.dbhost)
+
+    from django.test import RequestFactory
+    from reticulum import views_photometry
+
+    rng = np.random.default_rng(options.seed)
+    frame = io.read_sips(filenames[0])
+    idx = rng.choice(len(frame), min(options.queries, len(frame)), replace=False)
+    requests = [RequestFactory().get('/', {'ra': frame['ra'][i], 'dec': frame['dec'][i], 'sr': options.sr}) for i in idx]
+    arrow_requests = [RequestFactory().get('/', {'ra': frame['ra'][i], 'dec': frame['dec'][i], 'sr': options.sr, 'format': 'arrow'}) for i in idx]
+
+    def query(request):
+        return len(views_photometry.fetch_lc_data(request)['mag'])
+
+    def render(mode):
+        return lambda request: len(views_photometry.lc(request, mode=mode).content)
+
+    run_stage('query', query, requests)
+
+    # All the same targets in a single batch request
+    batch = RequestFactory().post('/', json.dumps({'targets': [[frame['ra'][i], frame['dec'][i], options.sr] for i in idx]}), content_type='application/json')
+    run_stage('batch', lambda request: len(json.loads(views_photometry.lc_batch(request).content)['columns']['mag']), [batch])
+    run_stage('json', render('json'), requests)
+    # Same view as json stage, with format parameter selecting Arrow IPC encoding of the light curve
+    run_stage('arrow', render('json'), arrow_requests)
+    run_stage('jpeg', render('jpeg'), requests)
+
+    return results, has_q3c
+
+
+def compare(results, reference):
+    """Prints the ratios of median times with respect to reference results"""
+    print(f"{'stage':10s} {'reference':>12s} {'current':>12s} {'ratio':>8s}")
+
+    for name in stages:
+        new, old = results.get(name, {}), reference.get(name, {})
+        if 'median' in new and 'median' in old:
+            print(f"{name:10s} {old['median']:12.4f} {new['median']:12.4f} {new['median']/old['median']:8.2f}")
+
+
+if __name__ == '__main__':
+    from optparse import OptionParser
+
+    parser = OptionParser(usage="usage: %prog [options]")
+    parser.add_option('-n', '--frames', help='Number of synthetic frames', action='store', dest='frames', type='int', default=20)
+    parser.add_option('-s', '--stars', help='Number of stars per frame', action='store', dest='stars', type='int', default=2000)
+    parser.add_option('-b', '--batch', help='Number of frames to ingest in a single transaction', action='store', dest='batch', type='int', default=10)
+    parser.add_option('-q', '--queries', help='Number of light curve queries', action='store', dest='queries', type='int', default=20)
+    parser.add_option('--sr', help='Radius of light curve queries, arcsec', action='store', dest='sr', type='float', default=2.0)
+    parser.add_option('--stages', help='Comma-separated list of stages to run', action='store', dest='stages', type='str', default=None)
+    parser.add_option('--seed', help='Random seed', action='store', dest='seed', type='int', default=1)
+    parser.add_option('-d', '--db', help='Benchmark database name, will be re-created', action='store', dest='db', type='str', default='reticulum_bench')
+    parser.add_option('-H', '--host', help='Database host', action='store', dest='dbhost', type='str', default=None)
+    parser.add_option('-w', '--workdir', help='Directory for synthetic data, will be re-created', action='store', dest='workdir', type='str', default='/tmp/reticulum_bench')
+    parser.add_option('-o', '--output', help='Output JSON file', action='store', dest='output', type='str', default=None)
+    parser.add_option('-c', '--compare', help='JSON file with reference results to compare with', action='store', dest='compare', type='str', default=None)
+    parser.add_option('-v', '--verbose', help='Verbose', action='store_true', dest='verbose', default=False)
+
+    (options,args) = parser.parse_args()
+
+    results, has_q3c = run(options)
+
+    output = {
+        'meta': {
+            'commit': get_commit(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'host': platform.node(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'q3c': has_q3c,
+            'options': vars(options),
+        },
+        'results': results,
+    }
+
+    if options.output:
+        with open(options.output, 'w') as f:
+            json.dump(output, f, indent=2)
+    else:
+        print(json.dumps(output, indent=2))
+
+    if options.compare:
+        with open(options.compare) as f:
+            compare(results, json.load(f)['results'])
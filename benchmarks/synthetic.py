@@ -0,0 +1,210 @@
+import os
+
+import numpy as np
+from astropy.table import Table
+from astropy.time import Time
+
+from reticulum import calibration
+
+# Magnitude columns of synthetic reference catalogue, mimicking Gaia DR3 synphot from Vizier
+catalog_filters = ['B', 'V', 'R', 'I', 'g', 'r', 'i', 'z']
+
+
+def make_sky(nstars=2000, ra0=10.0, dec0=20.0, sr0=0.5, seed=0):
+    """Synthetic sky with uniformly distributed stars and power-law magnitude distribution"""
+    rng = np.random.default_rng(seed)
+
+    # Uniform on the sphere within the cone
+    cosr = rng.uniform(np.cos(np.radians(sr0)), 1, nstars)
+    r, pa = np.degrees(np.arccos(cosr)), rng.uniform(0, 2*np.pi, nstars)
+    dec = dec0 + r*np.cos(pa)
+    ra = (ra0 + r*np.sin(pa)/np.cos(np.radians(dec))) % 360
+
+    sky = Table()
+    sky['RAJ2000'] = ra
+    sky['DEJ2000'] = dec
+
+    # Number of stars grows as 10**(0.4*mag)
+    V = np.clip(18 + 2.5*np.log10(rng.uniform(0, 1, nstars)), 8, 18)
+    bv = rng.uniform(0, 1.5, nstars)
+
+    sky['Vmag'] = V
+    sky['Bmag'] = V + bv
+    sky['Rmag'] = V - 0.5*bv
+    sky['Imag'] = V - bv
+    sky['gmag'] = V + 0.6*bv - 0.1
+    sky['rmag'] = V - 0.4*bv + 0.1
+    sky['imag'] = V - 0.8*bv + 0.3
+    sky['zmag'] = V - 1.0*bv + 0.4
+
+    for fname in catalog_filters:
+        sky[f"e_{fname}mag"] = 0.005 + 0.01*10**(0.4*(sky[f"{fname}mag"] - 16))
+
+    return sky
+
+
+def get_frame_header(ra0, dec0, time, filter='V', width=2048, height=2048, pixscale=1.5, target='Synthetic', site='Bench'):
+    """SIPS header of the synthetic frame"""
+    return {
+        'Telescope': site,
+        'Observer': 'Benchmark',
+        'Object': target,
+        'Filter': filter,
+        'Exposure': Time(time).isot,
+        'ExposureTime': 60,
+        'Width': width,
+        'Depth': height,
+        'PixelScaleX': pixscale,
+        'PixelScaleY': pixscale,
+        'CenterRADeg': ra0,
+        'CenterDecDeg': dec0,
+    }
+
+
+def write_catalog_cache(sky, header, cache_dir, catalog='gaiadr3syn'):
+    """Stores the synthetic sky to the reference catalogue cache exactly where process_frame()
+    looks for the catalogue of the frame, so that it never goes to the network"""
+    sr0 = np.hypot(header['Width'], 1.1*header['Depth'])*header['PixelScaleX']/2/3600
+    ra0, dec0, sr0 = calibration.round_coords_to_grid(header['CenterRADeg'], header['CenterDecDeg'], sr0)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    filename = os.path.join(cache_dir, calibration.get_catalog_cache_key(catalog, ra0, dec0, sr0, {'rmag': '<16'}) + '.parquet')
+    sky[sky['rmag'] < 16].write(filename, format='parquet', overwrite=True)
+
+    return filename
+
+
+def _sexa(values, hour=False, sign=False):
+    """Formats the values in degrees as sexagesimal strings"""
+    values = np.asarray(values)/(15 if hour else 1)
+    signs = np.where(values < 0, '-', '+' if sign else '')
+    values = np.abs(values)
+
+    d = np.floor(values)
+    m = np.floor((values - d)*60)
+    s = (values - d - m/60)*3600
+
+    return [f"{_sign}{_d:02.0f} {_m:02.0f} {_s:05.2f}" for _sign,_d,_m,_s in zip(signs, d, m, s)]
+
+
+def make_sips(filename, sky, header, zero_point=25.0, fwhm=3.0, napertures=10, saturation=9.0, seed=None):
+    """Writes synthetic SIPS export with the stars of the sky falling inside the frame.
+    Instrumental fluxes follow the catalogue magnitudes in the filter of the frame with
+    the zero point and noise. Returns the number of stars written.
+    """
+    rng = np.random.default_rng(seed)
+
+    ra0, dec0 = header['CenterRADeg'], header['CenterDecDeg']
+    scale = header['PixelScaleX']/3600
+
+    # Tangent plane projection
+    dra = np.radians(sky['RAJ2000'] - ra0)
+    dec, d0 = np.radians(sky['DEJ2000']), np.radians(dec0)
+    cosc = np.sin(d0)*np.sin(dec) + np.cos(d0)*np.cos(dec)*np.cos(dra)
+    xi = np.degrees(np.cos(dec)*np.sin(dra)/cosc)
+    eta = np.degrees((np.cos(d0)*np.sin(dec) - np.sin(d0)*np.cos(dec)*np.cos(dra))/cosc)
+
+    x = header['Width']/2 + xi/scale
+    y = header['Depth']/2 + eta/scale
+    idx = (x > 0) & (x < header['Width']) & (y > 0) & (y < header['Depth'])
+
+    fname = header['Filter'] if header['Filter'] in catalog_filters else 'V'
+    mag = np.asarray(sky[f"{fname}mag"][idx])
+    N = len(mag)
+
+    flux = 10**(-0.4*(mag - zero_point))
+    fwhms = rng.normal(fwhm, 0.2, N)
+
+    columns = {
+        'Name': [f"Star{_}" for _ in range(N)],
+        'RA': _sexa(sky['RAJ2000'][idx], hour=True),
+        'Dec': _sexa(sky['DEJ2000'][idx], sign=True),
+        'X': [f"{_:.2f}" for _ in x[idx]],
+        'Y': [f"{_:.2f}" for _ in y[idx]],
+        'FWHMX': [f"{_:.2f}" for _ in fwhms],
+        'FWHMY': [f"{_:.2f}" for _ in fwhms],
+    }
+
+    for ap in range(1, napertures + 1):
+        # Larger apertures collect more flux and more background noise
+        frac = 1 - np.exp(-2.77*(ap/fwhms)**2)
+        fluxerr = np.sqrt(flux*frac + 50*ap**2)
+        values = flux*frac + rng.normal(0, 1, N)*fluxerr
+
+        values = np.where(mag < saturation, np.nan, values)
+
+        columns[f"Ap{ap}"] = ['saturated' if not np.isfinite(_) else f"{_:.2f}" for _ in values]
+        columns[f"Ap{ap}Dev"] = [f"{_:.2f}" for _ in fluxerr]
+
+    with open(filename, 'w') as f:
+        print('sep=;', file=f)
+        for key,value in header.items():
+            print(f"{key};{value}", file=f)
+        print(';'.join(columns.keys()), file=f)
+        for row in zip(*columns.values()):
+            print(';'.join(row), file=f)
+
+    return N
+
+
+def make_dataset(path, nframes=10, nstars=2000, filters=['V', 'r'], ra0=10.0, dec0=20.0, seed=0, cache_dir=None):
+    """Synthetic sequence of SIPS exports for the same field with approximately nstars stars
+    in every frame, cycling through the filters, and reference catalogue cache for them.
+    Returns the list of file names.
+    """
+    header = get_frame_header(ra0, dec0, Time(60310, format='mjd'))
+    sr0 = np.hypot(header['Width'], header['Depth'])*header['PixelScaleX']/2/3600
+    area = header['Width']*header['Depth']*(header['PixelScaleX']/3600)**2
+
+    sky = make_sky(int(nstars*np.pi*sr0**2/area), ra0, dec0, sr0, seed=seed)
+
+    os.makedirs(path, exist_ok=True)
+    filenames = []
+
+    for i in range(nframes):
+        header = get_frame_header(ra0, dec0, Time(60310 + i*120/86400, format='mjd'), filter=filters[i % len(filters)])
+        filename = os.path.join(path, f"frame_{i:05d}.csv")
+
+        make_sips(filename, sky, header, seed=seed + i)
+        filenames.append(filename)
+
+        if cache_dir is not None and i == 0:
+            write_catalog_cache(sky, header, cache_dir)
+
+    return filenames
+
+
+def make_calibrated(filename, outname=None, seed=None):
+    """Converts synthetic SIPS export to calibrated frame in the format written by process_frame(),
+    using the known zero point instead of fitting it, so that ingestion can be benchmarked without
+    running the calibration. Returns the name of calibrated file.
+    """
+    from reticulum import io
+
+    rng = np.random.default_rng(seed)
+
+    obj = io.read_sips(filename, filled=True)
+    N = len(obj)
+
+    time = Time(obj.meta['Exposure'])
+
+    # Same aperture as process_frame() would use
+    obj['fwhm'] = np.hypot(obj['FWHMX'], obj['FWHMY'])
+    aper = f"Ap{min(10, np.ceil(np.nanmedian(obj['fwhm']))):.0f}"
+    flux, fluxerr = obj[aper], obj[aper + 'Dev']
+
+    obj['mag'] = -2.5*np.log10(flux)
+    obj['magerr'] = 2.5/np.log(10)*fluxerr/flux
+    obj['flags'] = np.where(np.isfinite(obj['mag']), 0, 32)
+    obj['mag_calib'] = obj['mag'] + 25.0
+    obj['mag_calib_err'] = np.hypot(obj['magerr'], 0.01)
+    obj['time'] = time
+    obj['mjd'] = time.mjd
+    obj['mag_filter_name'] = (obj.meta['Filter'] if obj.meta['Filter'] in catalog_filters else 'V') + 'mag'
+    obj['mag_color_name'] = 'Bmag - Vmag'
+    obj['mag_color_term'] = np.stack([rng.normal(0.05, 0.01, N), rng.normal(0, 0.005, N)], axis=1)
+
+    outname = outname or filename + '.parquet'
+    obj.write(outname, format='parquet', overwrite=True)
+
+    return outname
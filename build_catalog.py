@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+
+import os, sys
+import functools
+import multiprocessing
+from tqdm.auto import tqdm
+
+import numpy as np
+
+from reticulum import calibration
+
+
+def build_tile(ipix, catalog, **kwargs):
+    try:
+        return ipix, calibration.build_catalog_tile(catalog, ipix, **kwargs)
+    except KeyboardInterrupt:
+        raise
+    except Exception as e:
+        print(f"Error building tile {ipix} of {catalog}: {type(e).__name__}: {e}", file=sys.stderr)
+        return ipix, None
+
+
+if __name__ == '__main__':
+    from optparse import OptionParser
+
+    parser = OptionParser(usage="usage: %prog [options] catalog1 catalog2 ...")
+    parser.add_option('-s', '--store', help='Directory for local catalogue store', action='store', dest='store_dir', type='str', default=None)
+    parser.add_option('-n', '--nside', help='HEALPix nside for the tiles', action='store', dest='nside', type='int', default=calibration.catalog_store_nside)
+    parser.add_option('-l', '--limit', help='Limiting magnitude', action='store', dest='limit', type='float', default=16)
+    parser.add_option('--ra', help='Center RA of the region to build, degrees', action='store', dest='ra', type='float', default=None)
+    parser.add_option('--dec', help='Center Dec of the region to build, degrees', action='store', dest='dec', type='float', default=None)
+    parser.add_option('--sr', help='Radius of the region to build, degrees', action='store', dest='sr', type='float', default=None)
+    parser.add_option('-j', '--jobs', help='Number of parallel downloads', action='store', dest='jobs', type='int', default=4)
+    parser.add_option('-o', '--overwrite', help='Re-download already existing tiles', action='store_true', dest='overwrite', default=False)
+    parser.add_option('-v', '--verbose', help='Verbose', action='store_true', dest='verbose', default=False)
+
+    (options,names) = parser.parse_args()
+
+    if not names:
+        names = ['gaiadr3syn']
+    elif names == ['all']:
+        names = list(calibration.supported_catalogs.keys())
+
+    if options.ra is not None and options.dec is not None and options.sr is not None:
+        tiles = calibration.get_catalog_tiles(options.ra, options.dec, options.sr, nside=options.nside)
+    else:
+        # Whole sky
+        tiles = np.arange(12*options.nside**2)
+
+    for catalog in names:
+        filters = {}
+        if catalog in calibration.supported_catalogs and options.limit:
+            filters[calibration.supported_catalogs[catalog]['limit']] = f"<{options.limit}"
+
+        print(f"Building {len(tiles)} tiles of {catalog} at nside={options.nside} with filters {filters}")
+
+        worker = functools.partial(
+            build_tile,
+            catalog=catalog, nside=options.nside, filters=filters,
+            store_dir=options.store_dir, overwrite=options.overwrite, verbose=options.verbose,
+        )
+
+        with multiprocessing.Pool(options.jobs) as pool:
+            results = list(tqdm(pool.imap_unordered(worker, tiles), total=len(tiles)))
+
+        failed = [ipix for ipix,N in results if N is None]
+        if failed:
+            print(f"{len(failed)} tiles of {catalog} failed, re-run to retry: {failed}", file=sys.stderr)
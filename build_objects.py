@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+
+import os, sys
+
+from stdpipe.db import DB
+
+from reticulum import objects, ingest
+
+
+if __name__ == '__main__':
+    from optparse import OptionParser
+
+    parser = OptionParser(usage="usage: %prog [options]")
+    parser.add_option('-d', '--db', help='Database name', action='store', dest='db', type='str', default='reticulum')
+    parser.add_option('-H', '--host', help='Database host', action='store', dest='dbhost', type='str', default=None)
+    parser.add_option('--ra', help='Center RA of the region to process, degrees', action='store', dest='ra', type='float', default=None)
+    parser.add_option('--dec', help='Center Dec of the region to process, degrees', action='store', dest='dec', type='float', default=None)
+    parser.add_option('--sr', help='Radius of the region to process, degrees', action='store', dest='sr', type='float', default=1.0)
+    parser.add_option('-r', '--radius', help='Association radius, arcsec', action='store', dest='radius', type='float', default=2.0)
+    parser.add_option('-v', '--verbose', help='Verbose', action='store_true', dest='verbose', default=False)
+
+    (options,args) = parser.parse_args()
+
+    db = DB(dbname=options.db, dbhost=options.dbhost)
+    db.conn.autocommit = False
+
+    if options.ra is not None and options.dec is not None:
+        pixels = ingest.get_photometry_hpx_cone(options.ra, options.dec, options.sr)
+    else:
+        # Everything not yet associated
+        pixels = None
+
+    ndets, nobjs = objects.build_objects(db.conn, pixels, sr=options.radius/3600, verbose=options.verbose)
+
+    print(f"{ndets} detections associated with objects, {nobjs} new objects")
@@ -2,6 +2,11 @@
 
 import os, sys, glob
 import io
+import json
+import cProfile
+import pstats
+import functools
+import multiprocessing
 from tqdm.auto import tqdm
 
 import numpy as np
@@ -14,23 +19,38 @@ import reticulum
 from reticulum import calibration
 
 
-def process_frame(filename, verbose=False, reprocess=False):
+def process_frame(filename, verbose=False, reprocess=False, cache_dir=None, cache_size=None, offline=False, store_dir=None, stats=None):
+    """Calibrates the frame and writes the measurements alongside it.
+    Returns the name of calibrated file, or None if the frame cannot be calibrated.
+
+    If stats dict is given, it is filled with the status of the frame and wall time, CPU time,
+    peak memory and number of rows for every processing stage, also when processing fails.
+    """
     # Simple wrapper around print for logging in verbose mode only
     log = (verbose if callable(verbose) else print) if verbose else lambda *args,**kwargs: None
 
+    timer = reticulum.utils.StageTimer()
+    if stats is None:
+        stats = {}
+    stats.update({'filename': filename, 'status': 'failed', 'stages': timer.stages})
+
     outname = filename + '.parquet'
 
     if os.path.exists(outname) and not reprocess:
-        return
+        stats['status'] = 'skipped'
+        return outname
 
     log(f"Processing {filename}")
 
     config = {}
 
-    obj = reticulum.io.read_sips(filename, filled=True)
+    with timer('read') as stage:
+        obj = reticulum.io.read_sips(filename, filled=True)
+        stage['rows'] = len(obj)
 
     if np.any(np.isnan(obj['ra'])):
         log("No sky coordinates, skipping")
+        stats['status'] = 'no coordinates'
         return
 
     time = Time(obj.meta['Exposure'])
@@ -70,14 +90,33 @@ def process_frame(filename, verbose=False, reprocess=False):
     ra0, dec0 = obj.meta['CenterRADeg'], obj.meta['CenterDecDeg']
     sr0 = np.hypot(obj.meta['Width'], 1.1 * obj.meta['Depth']) * obj.meta['PixelScaleX'] / 2 / 3600
     ra00,dec00,sr00 = calibration.round_coords_to_grid(ra0, dec0, sr0)
-    cat = catalogs.get_cat_vizier(
-        ra00,
-        dec00,
-        sr00,
-        config['cat_name'],
-        filters={'rmag': '<16'},
-        verbose=verbose,
-    )
+    with timer('catalog') as stage:
+        cat = None
+        if store_dir is not None:
+            # Local tiled store, if it covers the field
+            cat = calibration.get_cat_tiled(
+                ra00,
+                dec00,
+                sr00,
+                config['cat_name'],
+                filters={'rmag': '<16'},
+                store_dir=store_dir,
+                verbose=verbose,
+            )
+
+        if cat is None:
+            cat = calibration.get_cat_vizier_cached(
+                ra00,
+                dec00,
+                sr00,
+                config['cat_name'],
+                filters={'rmag': '<16'},
+                cache_dir=cache_dir,
+                max_size=cache_size,
+                offline=offline,
+                verbose=verbose,
+            )
+        stage['rows'] = len(cat) if cat is not None else 0
 
     # Catalogue settings
     config['cat_col_mag'],config['cat_col_mag_err'] = calibration.guess_catalogue_mag_columns(
@@ -104,17 +143,19 @@ def process_frame(filename, verbose=False, reprocess=False):
     log(f"Will use catalogue columns {config['cat_col_color_mag1']} and {config['cat_col_color_mag2']} for color")
 
 
-    m = pipeline.calibrate_photometry(
-        obj, cat, 2/3600,
-        cat_col_mag=config.get('cat_col_mag'),
-        cat_col_mag_err=config.get('cat_col_mag_err'),
-        cat_col_mag1=config.get('cat_col_color_mag1'),
-        cat_col_mag2=config.get('cat_col_color_mag2'),
-        order=2,
-        use_color=2,
-        verbose=verbose, max_intrinsic_rms=0.02,
-        nonlin=True,
-    )
+    with timer('calibrate') as stage:
+        m = pipeline.calibrate_photometry(
+            obj, cat, 2/3600,
+            cat_col_mag=config.get('cat_col_mag'),
+            cat_col_mag_err=config.get('cat_col_mag_err'),
+            cat_col_mag1=config.get('cat_col_color_mag1'),
+            cat_col_mag2=config.get('cat_col_color_mag2'),
+            order=2,
+            use_color=2,
+            verbose=verbose, max_intrinsic_rms=0.02,
+            nonlin=True,
+        )
+        stage['rows'] = len(obj)
 
     obj['time'] = time
     obj['mjd'] = time.mjd
@@ -126,24 +167,162 @@ def process_frame(filename, verbose=False, reprocess=False):
     if m['color_term'] is not None:
         obj['mag_color_term'] = [m['color_term']]*len(obj)
 
-    obj.write(outname, overwrite=True)
+    # Write to temporary file first and then atomically move it in place, so that
+    # concurrent workers never see partially written output
+    tmpname = outname + f".tmp{os.getpid()}"
+    with timer('write') as stage:
+        try:
+            obj.write(tmpname, format='parquet', overwrite=True)
+            os.replace(tmpname, outname)
+        finally:
+            if os.path.exists(tmpname):
+                os.unlink(tmpname)
+        stage['rows'] = len(obj)
 
     log(f"Calibrated measurements written to {outname}")
 
+    stats['status'] = 'processed'
+    log(f"Timing: {json.dumps(stats)}")
+
+    return outname
+
+
+def get_profile_name(profile_dir, filename):
+    """Name of the profile dump for the frame, unique for frames with the same name in different directories"""
+    return os.path.join(profile_dir, os.path.abspath(filename).strip(os.sep).replace(os.sep, '_') + '.prof')
+
+
+def process_frame_safe(filename, verbose=False, profile_dir=None, **kwargs):
+    """Wrapper around process_frame() suitable for running in worker processes.
+    Returns the filename, error message or None on success, and timing stats of the frame.
+    If profile_dir is set, cProfile dump of the frame is stored there.
+    """
+    if verbose and not callable(verbose):
+        # Prefix every log line with the worker and file it comes from
+        prefix = f"[{os.getpid()}] {os.path.basename(filename)}:"
+        verbose = lambda *args,**kwargs: print(prefix, *args, **kwargs, flush=True)
+
+    stats = {}
+    profiler = cProfile.Profile() if profile_dir else None
+
+    try:
+        if profiler is not None:
+            profiler.enable()
+
+        process_frame(filename, verbose=verbose, stats=stats, **kwargs)
+        return filename, None, stats
+    except KeyboardInterrupt:
+        raise
+    except Exception as e:
+        stats['error'] = f"{type(e).__name__}: {e}"
+        return filename, stats['error'], stats
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            os.makedirs(profile_dir, exist_ok=True)
+            profiler.dump_stats(get_profile_name(profile_dir, filename))
+
+
+def print_timing_summary(stats, file=sys.stdout):
+    """Prints the table of total times spent in every processing stage over all frames.
+    Peak RSS is the largest one of the process seen after the stage, so it includes everything
+    done before it, and with parallel jobs it is the one of the worker processes."""
+    summary = {}
+    for record in stats:
+        for name,stage in record.get('stages', {}).items():
+            s = summary.setdefault(name, {'frames': 0, 'wall': 0.0, 'cpu': 0.0, 'rows': 0, 'maxrss': 0.0})
+            s['frames'] += 1
+            s['wall'] += stage['wall']
+            s['cpu'] += stage['cpu']
+            s['rows'] += stage.get('rows', 0)
+            s['maxrss'] = max(s['maxrss'], stage['maxrss'])
+
+    if not summary:
+        return
+
+    total = sum(_['wall'] for _ in summary.values())
+    statuses = {}
+    for record in stats:
+        statuses[record.get('status')] = statuses.get(record.get('status'), 0) + 1
+
+    print(f"Timing of {len(stats)} frames: " + ", ".join(f"{v} {k}" for k,v in statuses.items()), file=file)
+    print(f"{'stage':10s} {'frames':>7s} {'wall, s':>9s} {'%':>6s} {'per frame':>10s} {'cpu, s':>9s} {'rows/s':>10s} {'peak RSS after stage, MB':>25s}", file=file)
+    for name,s in summary.items():
+        print(f"{name:10s} {s['frames']:7d} {s['wall']:9.2f} {100*s['wall']/total if total else 0:6.1f} {s['wall']/s['frames']:10.3f} {s['cpu']:9.2f} "
+              f"{s['rows']/s['wall'] if s['wall'] else 0:10.0f} {s['maxrss']:25.1f}", file=file)
+
 
 if __name__ == '__main__':
     from optparse import OptionParser
 
     parser = OptionParser(usage="usage: %prog [options] args")
     parser.add_option('-r', '--reprocess', help='Reprocess already processed frames', action='store_true', dest='reprocess', default=False)
+    parser.add_option('-j', '--jobs', help='Number of parallel worker processes', action='store', dest='jobs', type='int', default=1)
+    parser.add_option('-f', '--failed', help='File to store the list of failed frames', action='store', dest='failed', type='str', default=None)
+    parser.add_option('--cache-dir', help='Directory for reference catalogue cache', action='store', dest='cache_dir', type='str', default=None)
+    parser.add_option('--cache-size', help='Max size of reference catalogue cache, MB', action='store', dest='cache_size', type='float', default=1000)
+    parser.add_option('--store', help='Directory with local tiled reference catalogue store', action='store', dest='store_dir', type='str', default=None)
+    parser.add_option('--offline', help='Do not query Vizier, use only cached catalogues', action='store_true', dest='offline', default=False)
+    parser.add_option('--stats', help='File to store per-frame timing records as JSON lines', action='store', dest='stats', type='str', default=None)
+    parser.add_option('--profile', help='Directory to store per-frame cProfile dumps and their aggregate all.prof', action='store', dest='profile', type='str', default=None)
     parser.add_option('-v', '--verbose', help='Verbose', action='store_true', dest='verbose', default=False)
 
     (options,files) = parser.parse_args()
 
+    # Remove duplicates while preserving order, so that no two workers get the same frame
+    files = list(dict.fromkeys(files))
+
     if options.verbose:
-        progress_fn = tqdm
+        progress_fn = lambda _: tqdm(_, total=len(files))
     else:
         progress_fn = lambda _: _
 
-    for filename in progress_fn(files):
-        process_frame(filename, verbose=options.verbose, reprocess=options.reprocess)
+    kwargs = {
+        'reprocess': options.reprocess,
+        'cache_dir': options.cache_dir,
+        'cache_size': options.cache_size*1024*1024 if options.cache_size else None,
+        'offline': options.offline,
+        'store_dir': options.store_dir,
+        'profile_dir': options.profile,
+    }
+
+    if options.jobs > 1:
+        worker = functools.partial(process_frame_safe, verbose=options.verbose, **kwargs)
+
+        with multiprocessing.Pool(options.jobs) as pool:
+            # imap keeps the results in order of input files
+            results = list(progress_fn(pool.imap(worker, files, chunksize=1)))
+    else:
+        results = [process_frame_safe(filename, verbose=options.verbose, **kwargs)
+                   for filename in progress_fn(files)]
+
+    stats = [_[2] for _ in results]
+
+    if options.stats:
+        with open(options.stats, 'w') as f:
+            for record in stats:
+                print(json.dumps(record), file=f)
+
+    if options.profile:
+        names = [get_profile_name(options.profile, _) for _ in files]
+        names = [_ for _ in names if os.path.exists(_)]
+        if names:
+            pstats.Stats(*names).dump_stats(os.path.join(options.profile, 'all.prof'))
+            if options.verbose:
+                pstats.Stats(os.path.join(options.profile, 'all.prof')).sort_stats('cumulative').print_stats(20)
+
+    print_timing_summary(stats)
+
+    failed = [(filename, error) for filename,error,_ in results if error is not None]
+
+    if failed:
+        print(f"{len(failed)} of {len(files)} frames failed:", file=sys.stderr)
+        for filename,error in failed:
+            print(f"  {filename}: {error}", file=sys.stderr)
+
+        if options.failed:
+            with open(options.failed, 'w') as f:
+                for filename,error in failed:
+                    print(filename, file=f)
+
+        sys.exit(1)
@@ -10,7 +10,7 @@ CREATE TABLE sequences (
        observer TEXT,
        filter TEXT,
        target TEXT,
-       moc TEXT,
+       moc BYTEA, -- max order and depth 29 ranges as uint64, see ingest.moc_to_bytes()
        keywords JSONB
 );
 
@@ -34,7 +34,7 @@ CREATE TABLE frames (
        pixscale FLOAT,
        width INT,
        height INT,
-       moc TEXT,
+       moc BYTEA, -- max order and depth 29 ranges as uint64, see ingest.moc_to_bytes()
        keywords JSONB
 );
 
@@ -46,23 +46,28 @@ CREATE INDEX ON frames(filter);
 
 CREATE INDEX ON frames (q3c_ang2ipix(ra, dec));
 
--- Photometry measurements
-DROP TABLE IF EXISTS photometry CASCADE;
-CREATE TABLE photometry (
-       id SERIAL PRIMARY KEY,
-       sequence INT,
-       frame INT,
-       time TIMESTAMP,
-       filter TEXT, -- TODO: convert to integer?..
-       ra FLOAT,
-       dec FLOAT,
-       -- x, y, exposure, ... ?
-       mag FLOAT,
-       magerr FLOAT,
-       color_term FLOAT DEFAULT 0,
-       color_term2 FLOAT DEFAULT 0,
-       flags INT DEFAULT 0,
-       fwhm FLOAT
+-- Names of photometric filters, referenced by their ids from photometry table
+DROP TABLE IF EXISTS filters CASCADE;
+CREATE TABLE filters (
+       id SMALLSERIAL PRIMARY KEY,
+       name TEXT UNIQUE NOT NULL
+);
+
+-- Versions of sky regions (HEALPix nested pixels of order 6), bumped on every
+-- ingestion of new data there to invalidate cached light curves
+DROP TABLE IF EXISTS sky_versions CASCADE;
+CREATE TABLE sky_versions (
+       ipix INT PRIMARY KEY,
+       version INT DEFAULT 0
 );
 
-CREATE INDEX ON photometry (q3c_ang2ipix(ra, dec));
+-- Precomputed coverage MOCs, serialized as FITS: global one ('all') and the ones split
+-- by filter ('filter/V'), site ('site/...') and month ('month/2024-01').
+-- Incrementally updated on ingestion, with version bumped on every change
+DROP TABLE IF EXISTS coverage CASCADE;
+CREATE TABLE coverage (
+       name TEXT PRIMARY KEY,
+       moc BYTEA,
+       version INT DEFAULT 0,
+       time TIMESTAMP
+);
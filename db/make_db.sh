@@ -1,3 +1,5 @@
 #!/bin/sh
 
 psql reticulum < frames.sql
+psql reticulum < photometry.sql
+psql reticulum < objects.sql
@@ -0,0 +1,39 @@
+-- Objects, i.e. clusters of detections, with their mean positions and overall statistics.
+-- hpx is the same HEALPix pixel as for photometry
+DROP TABLE IF EXISTS objects CASCADE;
+CREATE TABLE objects (
+       id SERIAL PRIMARY KEY,
+       ra FLOAT,
+       dec FLOAT,
+       hpx INT,
+       nmeas INT DEFAULT 0,
+       time_min TIMESTAMP,
+       time_max TIMESTAMP,
+       -- Best Lomb-Scargle period (days), its power and false alarm probability
+       period FLOAT,
+       period_power REAL,
+       period_fap REAL
+);
+
+CREATE INDEX ON objects (q3c_ang2ipix(ra, dec));
+CREATE INDEX ON objects (hpx);
+
+-- Per-filter statistics of objects
+DROP TABLE IF EXISTS object_stats CASCADE;
+CREATE TABLE object_stats (
+       object INT,
+       filter SMALLINT, -- id in filters table
+       nmeas INT,
+       mag REAL, -- median
+       std REAL,
+       -- Variability indices, see variability.variability_indices()
+       wstd REAL,
+       chi2dof REAL,
+       iqr REAL,
+       eta REAL,
+       stetson_j REAL,
+       PRIMARY KEY (object, filter)
+);
+
+CREATE INDEX ON object_stats (filter, std);
+CREATE INDEX ON object_stats (filter, stetson_j);
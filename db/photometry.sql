@@ -0,0 +1,37 @@
+-- Photometry measurements, partitioned by sky region.
+-- hpx is HEALPix (nested) pixel of order 6 containing the measurement, and every partition
+-- holds the range of them inside a single pixel of order 2, so 192 partitions in total.
+-- Must be kept in sync with ingest.photometry_hpx_order and ingest.photometry_partition_order
+DROP TABLE IF EXISTS photometry CASCADE;
+CREATE TABLE photometry (
+       -- Columns are ordered by alignment to avoid padding.
+       -- Time of the measurement is the one of its frame
+       id BIGSERIAL,
+       ra FLOAT,
+       dec FLOAT,
+       mag FLOAT,
+       sequence INT,
+       frame INT,
+       hpx INT NOT NULL,
+       flags INT DEFAULT 0,
+       object INT, -- id in objects table, assigned by objects.build_objects()
+       -- x, y, exposure, ... ?
+       magerr REAL,
+       color_term REAL DEFAULT 0,
+       color_term2 REAL DEFAULT 0,
+       fwhm REAL,
+       filter SMALLINT, -- id in filters table
+       PRIMARY KEY (hpx, id)
+) PARTITION BY RANGE (hpx);
+
+DO $$
+BEGIN
+       FOR i IN 0..191 LOOP
+              EXECUTE format('CREATE TABLE photometry_%s PARTITION OF photometry FOR VALUES FROM (%s) TO (%s)', i, i*256, (i + 1)*256);
+       END LOOP;
+END $$;
+
+CREATE INDEX ON photometry (q3c_ang2ipix(ra, dec));
+CREATE INDEX ON photometry (object);
+-- Detections not yet associated with objects
+CREATE INDEX ON photometry (hpx) WHERE object IS NULL;
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+
+import os, sys
+
+from stdpipe.db import DB
+
+from reticulum import ingest, objects, variability
+
+# Available migration steps, in the order they should be applied
+steps = ['mocs', 'partitions', 'objects', 'variability']
+
+
+if __name__ == '__main__':
+    from optparse import OptionParser
+
+    parser = OptionParser(usage="usage: %prog [options] [step ...]\n\nMigration steps: " + ", ".join(steps) + " (all by default)")
+    parser.add_option('-d', '--db', help='Database name', action='store', dest='db', type='str', default='reticulum')
+    parser.add_option('-H', '--host', help='Database host', action='store', dest='dbhost', type='str', default=None)
+    parser.add_option('-b', '--batch', help='Number of rows to convert at once', action='store', dest='batch', type='int', default=1000)
+    parser.add_option('-v', '--verbose', help='Verbose', action='store_true', dest='verbose', default=False)
+
+    (options,args) = parser.parse_args()
+
+    for step in args:
+        if step not in steps:
+            parser.error(f"Unknown migration step {step}")
+
+    basepath = os.path.dirname(os.path.abspath(__file__))
+
+    db = DB(dbname=options.db, dbhost=options.dbhost)
+    db.conn.autocommit = False
+
+    # Every step in its own transaction
+    for step in steps:
+        if args and step not in args:
+            continue
+
+        if step == 'mocs':
+            # Convert ASCII MOC strings of sequences and frames to binary form
+            for table in ['sequences', 'frames']:
+                ingest.migrate_mocs(db.conn, table, batch=options.batch, verbose=options.verbose)
+                db.conn.commit()
+
+        elif step == 'partitions':
+            # Move photometry into the table partitioned by sky regions, converting it to compact
+            # layout with filter ids, no per-measurement time and narrower types at the same time
+            with open(os.path.join(basepath, 'db', 'photometry.sql')) as f:
+                schema = f.read()
+
+            ingest.migrate_photometry_partitions(db.conn, schema, batch=100*options.batch, verbose=options.verbose)
+            db.conn.commit()
+
+        elif step == 'objects':
+            # Links from detections to objects, and object tables
+            with open(os.path.join(basepath, 'db', 'objects.sql')) as f:
+                schema = f.read()
+
+            objects.migrate_objects(db.conn, schema, verbose=options.verbose)
+            db.conn.commit()
+
+        elif step == 'variability':
+            # Variability indices and periods of objects
+            variability.migrate_variability(db.conn, verbose=options.verbose)
+            db.conn.commit()
@@ -123,3 +123,333 @@ def round_coords_to_grid(ra0, dec0, sr0, nside=None):
     sr1 = (np.floor(sr0/res) + 1)*res
 
     return ra1, dec1, sr1
+
+
+import os
+import hashlib
+import json
+
+# Default location of the on-disk reference catalogue cache
+catalog_cache_dir = os.environ.get(
+    'RETICULUM_CATALOG_CACHE',
+    os.path.join(os.path.expanduser('~'), '.cache', 'reticulum', 'catalogs')
+)
+
+
+def get_catalog_cache_key(catalog, ra0, dec0, sr0, filters={}):
+    """Stable key for the catalogue query, to be used as a cache file name"""
+    key = json.dumps([catalog, f"{ra0:.6f}", f"{dec0:.6f}", f"{sr0:.6f}", sorted(filters.items())])
+
+    return f"{catalog}_" + hashlib.sha1(key.encode()).hexdigest()
+
+
+def cleanup_catalog_cache(cache_dir=None, max_size=None, verbose=False):
+    """Removes least recently used entries from the cache until its total size is below max_size bytes"""
+    log = (verbose if callable(verbose) else print) if verbose else lambda *args,**kwargs: None
+
+    if cache_dir is None:
+        cache_dir = catalog_cache_dir
+
+    if not max_size or not os.path.isdir(cache_dir):
+        return
+
+    entries = []
+    for entry in os.scandir(cache_dir):
+        if entry.is_file() and entry.name.endswith('.parquet'):
+            st = entry.stat()
+            entries.append((st.st_mtime, st.st_size, entry.path))
+
+    size = sum(_[1] for _ in entries)
+
+    # Oldest access time first
+    for mtime,fsize,path in sorted(entries):
+        if size <= max_size:
+            break
+
+        try:
+            os.unlink(path)
+            log(f"Removed {path} from catalogue cache")
+        except FileNotFoundError:
+            # Already removed by concurrent process
+            pass
+
+        size -= fsize
+
+
+def get_cat_vizier_cached(ra0, dec0, sr0, catalog, filters={}, cache_dir=None, max_size=None, offline=False, verbose=False, **kwargs):
+    """Wrapper around catalogs.get_cat_vizier() that keeps the results in a persistent on-disk cache.
+
+    The cache is keyed by catalogue name, coordinates and filters, so the coordinates should be
+    already rounded with round_coords_to_grid() for the neighbouring frames to share the entries.
+    Entries are stored as Parquet files, and the least recently used ones are removed when the
+    total size exceeds max_size bytes. In offline mode, cache miss raises RuntimeError instead of
+    querying Vizier.
+    """
+    log = (verbose if callable(verbose) else print) if verbose else lambda *args,**kwargs: None
+
+    if cache_dir is None:
+        cache_dir = catalog_cache_dir
+
+    cachename = os.path.join(cache_dir, get_catalog_cache_key(catalog, ra0, dec0, sr0, filters) + '.parquet')
+
+    if os.path.exists(cachename):
+        try:
+            cat = Table.read(cachename, format='parquet')
+            # Update access time for LRU eviction
+            os.utime(cachename)
+            log(f"Loaded {len(cat)} {catalog} catalogue stars from cache")
+
+            return cat
+        except FileNotFoundError:
+            # Evicted by concurrent process just now
+            pass
+
+    if offline:
+        raise RuntimeError(f"Catalogue {catalog} at {ra0:.4f} {dec0:.4f} {sr0:.3f} not found in cache in offline mode")
+
+    cat = catalogs.get_cat_vizier(ra0, dec0, sr0, catalog, filters=filters, verbose=verbose, **kwargs)
+
+    if cat is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+
+        # Atomic write so that concurrent processes never read partial files
+        tmpname = cachename + f".tmp{os.getpid()}"
+        try:
+            cat.write(tmpname, format='parquet', overwrite=True)
+            os.replace(tmpname, cachename)
+            log(f"Stored {len(cat)} {catalog} catalogue stars to cache")
+        except Exception as e:
+            log(f"Cannot store catalogue to cache: {e}")
+        finally:
+            if os.path.exists(tmpname):
+                os.unlink(tmpname)
+
+        cleanup_catalog_cache(cache_dir, max_size=max_size, verbose=verbose)
+
+    return cat
+
+
+import shutil
+from astropy_healpix import HEALPix
+
+# Default location of the local HEALPix-tiled reference catalogue store
+catalog_store_dir = os.environ.get(
+    'RETICULUM_CATALOG_STORE',
+    os.path.join(os.path.expanduser('~'), '.cache', 'reticulum', 'store')
+)
+
+# Default tiling of the store, ~1.8 degrees per tile
+catalog_store_nside = 32
+
+
+def _get_catalog_store_path(catalog, nside, store_dir=None):
+    if store_dir is None:
+        store_dir = catalog_store_dir
+
+    return os.path.join(store_dir, catalog, f"nside{nside}")
+
+
+def _get_catalog_tile_path(path, ipix):
+    # Group the tiles into subdirectories so that none of them grows too large
+    return os.path.join(path, f"{ipix // 1000:04d}", f"{ipix}")
+
+
+def _parse_catalog_filter(value):
+    """Interval (min, max, min included, max included) of simple Vizier-like numeric constraint like '<16' or '10..16'"""
+    value = value.strip()
+
+    if '..' in value:
+        vmin,vmax = [float(_) for _ in value.split('..')]
+        return vmin, vmax, True, True
+    elif value.startswith('<='):
+        return -np.inf, float(value[2:]), True, True
+    elif value.startswith('>='):
+        return float(value[2:]), np.inf, True, True
+    elif value.startswith('<'):
+        return -np.inf, float(value[1:]), True, False
+    elif value.startswith('>'):
+        return float(value[1:]), np.inf, False, True
+    else:
+        value = float(value[1:] if value.startswith('=') else value)
+        return value, value, True, True
+
+
+def _apply_catalog_filters(cat, filters={}):
+    """Applies simple Vizier-like numeric constraints like '<16' or '10..16' to the table"""
+    idx = np.ones(len(cat), dtype=bool)
+
+    for name,value in filters.items():
+        vmin, vmax, incmin, incmax = _parse_catalog_filter(value)
+        col = np.ma.filled(np.ma.asarray(cat[name], dtype=float), np.nan)
+
+        with np.errstate(invalid='ignore'):
+            idx &= (col >= vmin) if incmin else (col > vmin)
+            idx &= (col <= vmax) if incmax else (col < vmax)
+
+    return cat[idx]
+
+
+def _catalog_filters_cover(stored, filters):
+    """Whether the catalogue selected with stored constraints contains all the stars selected with the requested ones"""
+    for name,value in stored.items():
+        if name not in filters:
+            return False
+
+        smin, smax, sincmin, sincmax = _parse_catalog_filter(value)
+        rmin, rmax, rincmin, rincmax = _parse_catalog_filter(filters[name])
+
+        if rmin < smin or (rmin == smin and rincmin and not sincmin):
+            return False
+        if rmax > smax or (rmax == smax and rincmax and not sincmax):
+            return False
+
+    return True
+
+
+def build_catalog_tile(catalog, ipix, nside=catalog_store_nside, filters={}, store_dir=None, overwrite=False, verbose=False, **kwargs):
+    """Downloads the catalogue stars belonging to a single HEALPix (nested) pixel and stores them
+    in the local catalogue store, as a directory with one .npy file per column.
+
+    Returns the number of stars in the tile, or None if the download failed.
+    """
+    log = (verbose if callable(verbose) else print) if verbose else lambda *args,**kwargs: None
+
+    path = _get_catalog_store_path(catalog, nside, store_dir=store_dir)
+    tilename = _get_catalog_tile_path(path, ipix)
+
+    if os.path.exists(tilename) and not overwrite:
+        return len(np.load(os.path.join(tilename, 'ra.npy'), mmap_mode='r'))
+
+    hp = HEALPix(nside, order='nested')
+
+    # Cone around the pixel center fully covering it
+    ra0,dec0 = [_.to('deg').value for _ in hp.healpix_to_lonlat(ipix)]
+    bra,bdec = [_.to('deg').value for _ in hp.boundaries_lonlat(ipix, step=4)]
+    sr0 = 1.01*np.max(astrometry.spherical_distance(ra0, dec0, bra, bdec))
+
+    cat = catalogs.get_cat_vizier(ra0, dec0, sr0, catalog, filters=filters, verbose=verbose, **kwargs)
+
+    if cat is None:
+        log(f"Cannot download {catalog} for tile {ipix}")
+        return None
+
+    ra,dec = np.asarray(cat['RAJ2000'], dtype=float), np.asarray(cat['DEJ2000'], dtype=float)
+    cat = cat[hp.lonlat_to_healpix(ra*u.deg, dec*u.deg) == ipix]
+
+    # Common metadata for the whole store
+    os.makedirs(path, exist_ok=True)
+    metaname = os.path.join(path, 'meta.json')
+    if not os.path.exists(metaname):
+        meta = {
+            'catalog': catalog, 'nside': nside, 'order': 'nested', 'filters': filters,
+            'columns': {name: str(col.unit) if col.unit is not None else None for name,col in cat.columns.items()},
+        }
+        with open(metaname + f".tmp{os.getpid()}", 'w') as f:
+            json.dump(meta, f)
+        os.replace(metaname + f".tmp{os.getpid()}", metaname)
+
+    # Write the tile to temporary directory and move it in place atomically
+    tmpname = tilename + f".tmp{os.getpid()}"
+    os.makedirs(tmpname, exist_ok=True)
+
+    try:
+        for name,col in cat.columns.items():
+            data = np.ma.asarray(col)
+            if data.dtype.kind == 'O':
+                data = data.astype(str)
+            if data.dtype.kind == 'f':
+                data = np.ma.filled(data, np.nan)
+            elif np.ma.is_masked(data):
+                np.save(os.path.join(tmpname, f"{name}.mask.npy"), np.ma.getmaskarray(data))
+                data = np.ma.filled(data)
+
+            np.save(os.path.join(tmpname, f"{name}.npy"), np.asarray(data))
+
+        # Positions are always stored under the same names for the cone extraction
+        np.save(os.path.join(tmpname, 'ra.npy'), np.asarray(cat['RAJ2000'], dtype=float))
+        np.save(os.path.join(tmpname, 'dec.npy'), np.asarray(cat['DEJ2000'], dtype=float))
+
+        if os.path.exists(tilename):
+            shutil.rmtree(tilename)
+        os.replace(tmpname, tilename)
+    finally:
+        if os.path.exists(tmpname):
+            shutil.rmtree(tmpname)
+
+    log(f"Stored {len(cat)} {catalog} stars in tile {ipix}")
+
+    return len(cat)
+
+
+def get_catalog_tiles(ra0, dec0, sr0, nside=catalog_store_nside):
+    """HEALPix (nested) pixels overlapping with the cone"""
+    hp = HEALPix(nside, order='nested')
+
+    return hp.cone_search_lonlat(ra0*u.deg, dec0*u.deg, sr0*u.deg)
+
+
+def get_cat_tiled(ra0, dec0, sr0, catalog, filters={}, nside=catalog_store_nside, store_dir=None, verbose=False):
+    """Extracts the cone from the local HEALPix-tiled catalogue store built with build_catalog_tile().
+
+    Only the tiles overlapping with the cone are read, using memory-mapped per-column files.
+    Returns None if some of the tiles are not in the store, or if it was built with the filters
+    not covering the requested ones.
+    """
+    log = (verbose if callable(verbose) else print) if verbose else lambda *args,**kwargs: None
+
+    path = _get_catalog_store_path(catalog, nside, store_dir=store_dir)
+    metaname = os.path.join(path, 'meta.json')
+
+    if not os.path.exists(metaname):
+        log(f"No local store for {catalog} at nside={nside}")
+        return None
+
+    with open(metaname) as f:
+        meta = json.load(f)
+
+    # Store built with tighter limits would silently return incomplete catalogue
+    if not _catalog_filters_cover(meta.get('filters', {}), filters):
+        log(f"Local store for {catalog} built with filters {meta.get('filters')} does not cover {filters}")
+        return None
+
+    chunks = []
+
+    for ipix in get_catalog_tiles(ra0, dec0, sr0, nside=nside):
+        tilename = _get_catalog_tile_path(path, ipix)
+
+        if not os.path.exists(tilename):
+            log(f"Tile {ipix} of {catalog} is missing in local store")
+            return None
+
+        ra = np.load(os.path.join(tilename, 'ra.npy'), mmap_mode='r')
+        dec = np.load(os.path.join(tilename, 'dec.npy'), mmap_mode='r')
+
+        idx = np.where(astrometry.spherical_distance(ra0, dec0, ra, dec) < sr0)[0]
+
+        chunk = {}
+        for name in meta['columns']:
+            data = np.load(os.path.join(tilename, f"{name}.npy"), mmap_mode='r')[idx]
+
+            maskname = os.path.join(tilename, f"{name}.mask.npy")
+            if os.path.exists(maskname):
+                data = np.ma.masked_array(data, mask=np.load(maskname, mmap_mode='r')[idx])
+
+            chunk[name] = data
+
+        chunks.append(chunk)
+
+    cat = Table()
+    for name,unit in meta['columns'].items():
+        data = [_[name] for _ in chunks]
+        if any(np.ma.isMaskedArray(_) for _ in data):
+            cat[name] = np.ma.concatenate(data)
+        else:
+            cat[name] = np.concatenate(data)
+        if unit is not None:
+            cat[name].unit = unit
+
+    cat = _apply_catalog_filters(cat, filters)
+
+    log(f"Got {len(cat)} {catalog} stars from {len(chunks)} local tiles")
+
+    return cat
@@ -0,0 +1,12 @@
+import os
+
+from celery import Celery
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'reticulum.settings')
+
+app = Celery('reticulum')
+
+# All Celery settings live in Django settings with CELERY_ prefix
+app.config_from_object('django.conf:settings', namespace='CELERY')
+
+app.autodiscover_tasks()
@@ -0,0 +1,161 @@
+"""JSON and binary encodings of columnar data for the API responses, and their compression.
+
+Columns are dicts of numpy arrays, encoded as a whole without converting individual values.
+Formats are selected either explicitly or by Accept header. JSON is written by orjson if it
+is installed. Msgpack and zstd compression are available only if their packages are installed.
+"""
+
+import io
+import re
+import math
+import gzip
+import json
+
+import numpy as np
+
+from django.utils.cache import patch_vary_headers
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Binary formats and their content types
+binary_formats = {
+    'arrow': 'application/vnd.apache.arrow.stream',
+    'npz': 'application/x-npz',
+}
+
+if msgpack is not None:
+    binary_formats['msgpack'] = 'application/msgpack'
+
+
+def get_format(request, formats, default='json', default_type='application/json'):
+    """Format requested by format parameter, or else the one preferred in Accept header"""
+    if request.GET.get('format') in formats:
+        return request.GET.get('format')
+
+    types = {value: key for key,value in formats.items()}
+    preferred = request.get_preferred_type([default_type] + list(types))
+
+    return types.get(preferred, default)
+
+
+def _finite(obj):
+    """Copy of nested dicts and lists with numpy arrays and scalars converted to lists and values,
+    and non-finite floats replaced with None"""
+    if isinstance(obj, dict):
+        return {key: _finite(value) for key,value in obj.items()}
+    elif isinstance(obj, (list, tuple)):
+        return [_finite(_) for _ in obj]
+    elif isinstance(obj, float):
+        return obj if math.isfinite(obj) else None
+    elif isinstance(obj, (np.ndarray, np.generic)):
+        # Every array or numpy scalar is converted in a single call
+        if obj.dtype.kind == 'f':
+            if obj.dtype.itemsize < 8:
+                # Shortest representation of single precision values, like orjson does
+                obj = obj.astype(str).astype(np.float64)
+            obj = np.where(np.isfinite(obj), obj.astype(object), None)
+        return obj.tolist()
+    else:
+        return obj
+
+
+def encode_json(data):
+    """JSON of the nested dicts and lists with numpy arrays inside, with NaNs and infinities as null"""
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_SERIALIZE_NUMPY)
+    else:
+        return json.dumps(_finite(data), allow_nan=False).encode()
+
+
+def encode_arrow(columns, meta=None):
+    """Arrow IPC stream with metadata dict stored as JSON in schema metadata"""
+    import pyarrow as pa
+
+    table = pa.table(columns)
+    if meta is not None:
+        table = table.replace_schema_metadata({'meta': json.dumps(meta)})
+
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+
+    return sink.getvalue().to_pybytes()
+
+
+def encode_npz(columns, meta=None):
+    """Uncompressed NumPy npz archive, loadable without pickle, with metadata as JSON string in 'meta' array"""
+    arrays = dict(columns)
+    if meta is not None:
+        arrays['meta'] = np.array(json.dumps(meta))
+
+    buf = io.BytesIO()
+    np.savez(buf, **arrays)
+
+    return buf.getvalue()
+
+
+def encode_msgpack(columns, meta=None):
+    """MessagePack map with 'meta' and 'columns' keys, times as integer microseconds since Unix epoch"""
+    columns = {key: (value.astype('datetime64[us]').astype(np.int64) if value.dtype.kind == 'M' else value).tolist()
+               for key,value in columns.items()}
+
+    return msgpack.packb({'meta': meta, 'columns': columns})
+
+
+encoders = {
+    'arrow': encode_arrow,
+    'npz': encode_npz,
+    'msgpack': encode_msgpack,
+}
+
+
+def encode(format, columns, meta=None):
+    return encoders[format](columns, meta)
+
+
+def get_accepted_encodings(request):
+    """Content codings listed in Accept-Encoding header, except explicitly refused ones"""
+    encodings = set()
+
+    for token in request.headers.get('Accept-Encoding', '').split(','):
+        name, _, params = token.partition(';')
+        if name.strip() and not re.match(r'^\s*q\s*=\s*0(\.0*)?\s*$', params):
+            encodings.add(name.strip().lower())
+
+    return encodings
+
+
+def compress_response(request, response, min_size=1024, gzip_level=4, zstd_level=3):
+    """Compresses the content of the response with zstd or gzip, whichever is accepted by the client"""
+    patch_vary_headers(response, ['Accept-Encoding'])
+
+    if len(response.content) < min_size or response.has_header('Content-Encoding'):
+        return response
+
+    accepted = get_accepted_encodings(request)
+
+    if zstandard is not None and 'zstd' in accepted:
+        response.content = zstandard.ZstdCompressor(level=zstd_level).compress(response.content)
+        response['Content-Encoding'] = 'zstd'
+    elif 'gzip' in accepted:
+        response.content = gzip.compress(response.content, compresslevel=gzip_level, mtime=0)
+        response['Content-Encoding'] = 'gzip'
+    else:
+        return response
+
+    response['Content-Length'] = len(response.content)
+
+    return response
@@ -0,0 +1,668 @@
+import os
+import io
+import struct
+
+import numpy as np
+from astropy.table import Table
+from astropy import units as u
+
+from mocpy import MOC
+from astropy_healpix import HEALPix
+
+import psycopg2.extras
+
+
+# Columns of photometry table and their PostgreSQL types, in the order used for COPY
+photometry_columns = [
+    ('sequence', 'int4'),
+    ('frame', 'int4'),
+    ('filter', 'int2'),
+    ('ra', 'float8'),
+    ('dec', 'float8'),
+    ('mag', 'float8'),
+    ('magerr', 'float4'),
+    ('color_term', 'float4'),
+    ('color_term2', 'float4'),
+    ('flags', 'int4'),
+    ('fwhm', 'float4'),
+    ('hpx', 'int4'),
+]
+
+# Photometry table is partitioned by HEALPix (nested) pixels of partition order, and every row
+# keeps the pixel of hpx order containing it. Must be kept in sync with db/photometry.sql
+photometry_hpx_order = 6
+photometry_partition_order = 2
+
+# Binary representation of fixed-size PostgreSQL types
+_copy_formats = {
+    'int2': '>i2',
+    'int4': '>i4',
+    'int8': '>i8',
+    'float4': '>f4',
+    'float8': '>f8',
+    'timestamp': '>i8',
+}
+
+# PostgreSQL timestamps are stored as microseconds since this epoch
+_pg_epoch = np.datetime64('2000-01-01T00:00:00', 'us')
+
+
+def make_copy_binary(columns, types):
+    """Encodes the list of numpy arrays as PostgreSQL binary COPY data.
+
+    Rows are packed with structured numpy dtypes, without any per-row Python code.
+    Text columns are encoded as UTF-8, and the rows are grouped by the lengths of
+    their text values so that every group may be packed with a fixed-size dtype.
+    """
+    nrows = len(columns[0]) if columns else 0
+
+    values = []
+    for col,pgtype in zip(columns, types):
+        col = np.asarray(col)
+        if pgtype == 'timestamp':
+            col = (col.astype('datetime64[us]') - _pg_epoch).astype(np.int64)
+        elif pgtype == 'text':
+            col = np.char.encode(col.astype(str), 'utf-8')
+        values.append(col)
+
+    text_idx = [i for i,pgtype in enumerate(types) if pgtype == 'text']
+
+    if text_idx:
+        lengths = np.stack([np.char.str_len(values[i]) for i in text_idx], axis=1)
+        groups, inverse = np.unique(lengths, axis=0, return_inverse=True)
+        inverse = inverse.ravel()
+    else:
+        groups, inverse = np.zeros((1, 0), dtype=int), np.zeros(nrows, dtype=int)
+
+    chunks = [b'PGCOPY\n\xff\r\n\x00' + struct.pack('>ii', 0, 0)]
+
+    for gi,group in enumerate(groups):
+        idx = inverse == gi
+        lens = dict(zip(text_idx, group))
+
+        dtype = [('nfields', '>i2')]
+        for i,pgtype in enumerate(types):
+            dtype.append((f"len{i}", '>i4'))
+            if pgtype == 'text':
+                if lens[i] > 0:
+                    dtype.append((f"val{i}", f"S{lens[i]}"))
+            else:
+                dtype.append((f"val{i}", _copy_formats[pgtype]))
+
+        rows = np.empty(np.sum(idx), dtype=dtype)
+        rows['nfields'] = len(types)
+
+        for i,pgtype in enumerate(types):
+            if pgtype == 'text':
+                rows[f"len{i}"] = lens[i]
+                if lens[i] > 0:
+                    rows[f"val{i}"] = values[i][idx]
+            else:
+                rows[f"len{i}"] = np.dtype(_copy_formats[pgtype]).itemsize
+                rows[f"val{i}"] = values[i][idx]
+
+        chunks.append(rows.tobytes())
+
+    chunks.append(struct.pack('>h', -1))
+
+    return b''.join(chunks)
+
+
+def copy_binary(cur, table, columns, data, types):
+    """Loads the list of numpy arrays into the table using binary COPY"""
+    buf = io.BytesIO(make_copy_binary(data, types))
+    cur.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT binary)", buf)
+
+
+def load_frame(filename):
+    """Reads calibrated frame and computes its footprint"""
+    obj = Table.read(filename)
+
+    moc = MOC.from_lonlat(
+        obj["ra"].T * u.deg,
+        obj["dec"].T * u.deg,
+        max_norder=10,
+    )
+
+    return {
+        'filename': filename,
+        'path': os.path.split(filename)[0],
+        'obj': obj,
+        'moc': moc,
+        'time': obj['time'][0].datetime,
+    }
+
+
+def get_frame_row(frame, seq_id):
+    obj = frame['obj']
+
+    return (
+        seq_id,
+        frame['time'],
+        #obj['mag_filter_name'][0],
+        obj.meta['Filter'],
+        obj.meta['ExposureTime'],
+        obj.meta['CenterRADeg'], obj.meta['CenterDecDeg'],
+        float(0.5*np.hypot(
+            obj.meta['Width']*obj.meta['PixelScaleX'],
+            obj.meta['Depth']*obj.meta['PixelScaleY']
+        )/3600),
+        float(0.5*np.hypot(
+            obj.meta['PixelScaleX'],
+            obj.meta['PixelScaleY']
+        )/3600),
+        obj.meta['Width'],
+        obj.meta['Depth'],
+        psycopg2.Binary(moc_to_bytes(frame['moc'])),
+        psycopg2.extras.Json(obj.meta),
+    )
+
+
+def get_photometry_columns(frame, seq_id, frame_id):
+    obj = frame['obj']
+    N = len(obj)
+
+    color_term = np.asarray(obj['mag_color_term'])
+
+    return [
+        np.full(N, seq_id, dtype=np.int32),
+        np.full(N, frame_id, dtype=np.int32),
+        # Filter names, to be replaced with their ids before loading
+        np.asarray(obj['mag_filter_name']),
+        np.ma.filled(obj['ra'], np.nan),
+        np.ma.filled(obj['dec'], np.nan),
+        np.ma.filled(obj['mag_calib'], np.nan),
+        np.ma.filled(obj['mag_calib_err'], np.nan),
+        color_term[:, 0],
+        color_term[:, 1],
+        np.ma.filled(obj['flags'], 0),
+        np.ma.filled(obj['fwhm'], np.nan),
+        get_photometry_hpx(np.ma.filled(obj['ra'], np.nan), np.ma.filled(obj['dec'], np.nan)),
+    ]
+
+
+def create_filters_table(conn):
+    """Creates filters table, if missing, for migrating older databases. Should match db/frames.sql"""
+    conn.cursor().execute('CREATE TABLE IF NOT EXISTS filters (id SMALLSERIAL PRIMARY KEY, name TEXT UNIQUE NOT NULL)')
+
+
+def get_filter_ids(conn, names):
+    """Ids of the filters with given names in filters table, creating new entries if necessary.
+    Returns the dict mapping names to ids. Does not commit the transaction.
+    """
+    names = sorted(set(names))
+    cur = conn.cursor()
+
+    cur.execute('INSERT INTO filters (name) SELECT unnest(%s::text[]) ON CONFLICT DO NOTHING', (names,))
+    cur.execute('SELECT name, id FROM filters WHERE name = ANY(%s)', (names,))
+
+    return dict(cur.fetchall())
+
+
+def get_photometry_hpx(ra, dec):
+    """HEALPix pixels of photometry partitioning scheme for given positions"""
+    hp = HEALPix(2**photometry_hpx_order, order='nested')
+
+    return hp.lonlat_to_healpix(np.asarray(ra)*u.deg, np.asarray(dec)*u.deg).astype(np.int32)
+
+
+def get_photometry_hpx_cone(ra0, dec0, sr0):
+    """HEALPix pixels of photometry partitioning scheme overlapping with the cone"""
+    hp = HEALPix(2**photometry_hpx_order, order='nested')
+
+    return [int(_) for _ in hp.cone_search_lonlat(ra0*u.deg, dec0*u.deg, sr0*u.deg)]
+
+
+def copy_photometry(cur, data):
+    """Loads the list of photometry_columns arrays directly into the partitions of photometry table"""
+    names = [_[0] for _ in photometry_columns]
+    types = [_[1] for _ in photometry_columns]
+
+    parts = data[names.index('hpx')] >> 2*(photometry_hpx_order - photometry_partition_order)
+
+    for part in np.unique(parts):
+        idx = parts == part
+        copy_binary(cur, f"photometry_{part}", names, [_[idx] for _ in data], types)
+
+
+def moc_to_bytes(moc):
+    """Serializes the MOC to compact binary form stored in the database: its max order
+    followed by the sorted depth 29 ranges, all as little-endian uint64"""
+    return np.concatenate([[moc.max_order], moc.to_depth29_ranges.ravel()]).astype('<u8').tobytes()
+
+
+def moc_from_bytes(data):
+    """Loads the MOC from the binary form produced by moc_to_bytes(), without copying the buffer"""
+    data = np.frombuffer(data, dtype='<u8')
+
+    return MOC.from_depth29_ranges(int(data[0]), data[1:].reshape(-1, 2))
+
+
+def union_mocs(mocs):
+    """Union of the list of MOCs in a single operation"""
+    mocs = [_ for _ in mocs if _ is not None]
+
+    if not mocs:
+        return None
+    elif len(mocs) == 1:
+        return mocs[0]
+    else:
+        return mocs[0].union(*mocs[1:])
+
+
+def merge_mocs(mocs, other):
+    """Merges the footprints from other dict (per-sequence or per-coverage) into mocs, in place"""
+    for key,moc in other.items():
+        mocs[key] = union_mocs([mocs.get(key), moc])
+
+    return mocs
+
+
+def update_sequence_mocs(conn, mocs, verbose=False):
+    """Adds the footprints from the dict of per-sequence MOCs to the ones stored in the database.
+
+    Every sequence is updated once, with its row locked for the duration of the transaction,
+    so that concurrent ingestion processes updating the same sequences do not lose the changes.
+    Does not commit the transaction.
+    """
+    log = (verbose if callable(verbose) else print) if verbose else lambda *args,**kwargs: None
+
+    if not mocs:
+        return
+
+    cur = conn.cursor()
+
+    # Consistent locking order to avoid deadlocks between concurrent processes
+    cur.execute(
+        'SELECT id, moc FROM sequences WHERE id = ANY(%s) ORDER BY id FOR UPDATE',
+        (sorted(mocs.keys()),)
+    )
+
+    updates = []
+    for seq_id,moc in cur.fetchall():
+        moc = union_mocs([moc_from_bytes(moc) if moc else None, mocs[seq_id]])
+        updates.append((seq_id, psycopg2.Binary(moc_to_bytes(moc))))
+
+    psycopg2.extras.execute_values(
+        cur,
+        'UPDATE sequences SET moc = v.moc FROM (VALUES %s) AS v (id, moc) WHERE sequences.id = v.id',
+        updates,
+    )
+
+    log(f"Updated footprints of {len(updates)} sequences")
+
+
+# Sky regions used for invalidating cached light curves are HEALPix (nested) pixels of this order
+sky_versions_order = 6
+
+
+def bump_sky_versions(conn, moc):
+    """Increments the versions of all sky regions touched by the MOC, so that cached
+    light curves there become invalid. Does not commit the transaction.
+    """
+    if moc is None:
+        return
+
+    bump_sky_pixels(conn, moc.degrade_to_order(sky_versions_order).flatten())
+
+
+def bump_sky_pixels(conn, ipix):
+    """Increments the versions of sky regions given by their pixel numbers. Does not commit the transaction."""
+    if not len(ipix):
+        return
+
+    conn.cursor().execute(
+        'INSERT INTO sky_versions (ipix, version) SELECT unnest(%s::int[]), 1 '
+        'ON CONFLICT (ipix) DO UPDATE SET version = sky_versions.version + 1',
+        ([int(_) for _ in ipix],)
+    )
+
+
+def get_sky_version(cursor, ra0, dec0, sr0):
+    """Version stamp for the cone, changing whenever new data is ingested anywhere inside it"""
+    hp = HEALPix(2**sky_versions_order, order='nested')
+    ipix = hp.cone_search_lonlat(ra0*u.deg, dec0*u.deg, sr0*u.deg)
+
+    cursor.execute(
+        'SELECT coalesce(sum(version), 0) FROM sky_versions WHERE ipix = ANY(%s)',
+        ([int(_) for _ in ipix],)
+    )
+
+    return cursor.fetchone()[0]
+
+
+def moc_to_fits(moc):
+    """Serializes the MOC to the bytes of FITS file"""
+    buf = io.BytesIO()
+    moc.serialize(format='fits').writeto(buf)
+
+    return buf.getvalue()
+
+
+def moc_from_fits(data):
+    return MOC.from_fits(io.BytesIO(bytes(data)))
+
+
+def get_coverage_names(filter=None, site=None, time=None):
+    """Names of precomputed coverage MOCs the data with given properties contribute to"""
+    names = ['all']
+
+    if filter:
+        names.append(f"filter/{filter}")
+    if site:
+        names.append(f"site/{site}")
+    if time is not None:
+        names.append(f"month/{time.year:04d}-{time.month:02d}")
+
+    return names
+
+
+def update_coverage_mocs(conn, mocs, verbose=False):
+    """Adds the footprints from the dict of MOCs, keyed by coverage name, to the precomputed
+    coverage stored in the database, incrementing their versions.
+
+    Rows are locked for the duration of the transaction, so that concurrent ingestion
+    processes do not lose the changes. Does not commit the transaction.
+    """
+    log = (verbose if callable(verbose) else print) if verbose else lambda *args,**kwargs: None
+
+    if not mocs:
+        return
+
+    names = sorted(mocs.keys())
+    cur = conn.cursor()
+
+    # Ensure all rows exist, so that they may be locked
+    cur.execute('INSERT INTO coverage (name) SELECT unnest(%s::text[]) ON CONFLICT DO NOTHING', (names,))
+
+    cur.execute('SELECT name, moc FROM coverage WHERE name = ANY(%s) ORDER BY name FOR UPDATE', (names,))
+
+    updates = []
+    for name,moc in cur.fetchall():
+        moc = union_mocs([moc_from_fits(moc) if moc else None, mocs[name]])
+        updates.append((name, psycopg2.Binary(moc_to_fits(moc))))
+
+    psycopg2.extras.execute_values(
+        cur,
+        'UPDATE coverage SET moc = v.moc, version = coverage.version + 1, time = timezone(\'utc\', now()) '
+        'FROM (VALUES %s) AS v (name, moc) WHERE coverage.name = v.name',
+        updates,
+    )
+
+    log(f"Updated {len(updates)} coverage maps")
+
+
+def migrate_mocs(conn, table, batch=1000, verbose=False):
+    """Converts the moc column of the table from ASCII strings to binary form of moc_to_bytes().
+    Does nothing if it is already converted. Does not commit the transaction.
+    """
+    log = (verbose if callable(verbose) else print) if verbose else lambda *args,**kwargs: None
+
+    cur = conn.cursor()
+
+    cur.execute(
+        "SELECT data_type FROM information_schema.columns WHERE table_name = %s AND column_name = 'moc'",
+        (table,)
+    )
+    res = cur.fetchone()
+    if res is None or res[0] == 'bytea':
+        log(f"Nothing to migrate in {table}")
+        return
+
+    cur.execute(f'ALTER TABLE {table} ADD COLUMN moc_bin BYTEA')
+
+    # Server-side cursor, so that the strings are not all loaded at once
+    cur1 = conn.cursor(name=f'migrate_mocs_{table}')
+    cur1.execute(f'SELECT id, moc FROM {table} WHERE moc IS NOT NULL')
+
+    nrows = 0
+    while True:
+        rows = cur1.fetchmany(batch)
+        if not rows:
+            break
+
+        psycopg2.extras.execute_values(
+            cur,
+            f'UPDATE {table} SET moc_bin = v.moc FROM (VALUES %s) AS v (id, moc) WHERE {table}.id = v.id',
+            [(id, psycopg2.Binary(moc_to_bytes(MOC.from_string(moc)))) for id,moc in rows],
+        )
+
+        nrows += len(rows)
+        log(f"{nrows} rows of {table} converted")
+
+    cur1.close()
+
+    cur.execute(f'ALTER TABLE {table} DROP COLUMN moc')
+    cur.execute(f'ALTER TABLE {table} RENAME COLUMN moc_bin TO moc')
+
+
+def migrate_photometry_partitions(conn, schema, batch=100000, verbose=False):
+    """Converts unpartitioned photometry table into partitioned one, created by schema SQL
+    (db/photometry.sql), by moving the rows there in batches of consecutive ids, keeping
+    the ids and NULL values. New table has the compact layout, with filter ids instead of
+    names, no per-measurement time and narrower types. Every batch is committed after its rows are deleted from the
+    old table, so that interrupted migration is resumed by calling it again. Does nothing
+    if it is already partitioned and fully moved.
+    """
+    log = (verbose if callable(verbose) else print) if verbose else lambda *args,**kwargs: None
+
+    cur = conn.cursor()
+
+    cur.execute("SELECT relkind FROM pg_class WHERE relname = 'photometry'")
+    res = cur.fetchone()
+    if res is None:
+        log("Nothing to migrate in photometry")
+        return
+
+    if res[0] != 'p':
+        create_filters_table(conn)
+
+        cur.execute('ALTER TABLE photometry RENAME TO photometry_old')
+        cur.execute('ALTER SEQUENCE photometry_id_seq RENAME TO photometry_old_id_seq')
+        cur.execute('ALTER INDEX photometry_pkey RENAME TO photometry_old_pkey')
+
+        cur.execute(schema)
+
+        # New rows get ids after the moved ones
+        cur.execute("SELECT setval(pg_get_serial_sequence('photometry', 'id'), coalesce(max(id), 0) + 1, false) FROM photometry_old")
+        conn.commit()
+
+    else:
+        cur.execute("SELECT to_regclass('photometry_old')")
+        if cur.fetchone()[0] is None:
+            log("Nothing to migrate in photometry")
+            return
+
+    names = [_[0] for _ in photometry_columns if _[0] not in ('filter', 'hpx')]
+
+    nrows, last = 0, 0
+    while True:
+        # Position of every row is needed for its pixel, the rest is copied by the server
+        cur.execute('SELECT id, ra, dec FROM photometry_old WHERE id > %s ORDER BY id LIMIT %s', (last, batch))
+        rows = cur.fetchall()
+        if not rows:
+            break
+
+        ids = [_[0] for _ in rows]
+        ra, dec = np.array([_[1:] for _ in rows], dtype=np.float64).T
+        first, last = ids[0], ids[-1]
+
+        # Old layout keeps filter names instead of their ids
+        cur.execute(
+            'INSERT INTO filters (name) SELECT DISTINCT filter FROM photometry_old '
+            'WHERE id BETWEEN %s AND %s AND filter IS NOT NULL ON CONFLICT DO NOTHING',
+            (first, last)
+        )
+        cur.execute(
+            f"INSERT INTO photometry (id, {', '.join(names)}, filter, hpx) "
+            f"SELECT o.id, {', '.join('o.' + _ for _ in names)}, f.id, v.hpx FROM photometry_old o "
+            'JOIN unnest(%s::bigint[], %s::int[]) AS v (id, hpx) ON v.id = o.id '
+            'LEFT JOIN filters f ON f.name = o.filter',
+            (ids, get_photometry_hpx(ra, dec).tolist())
+        )
+        cur.execute('DELETE FROM photometry_old WHERE id BETWEEN %s AND %s', (first, last))
+        conn.commit()
+
+        nrows += len(rows)
+        log(f"{nrows} rows of photometry moved")
+
+    cur.execute('DROP TABLE photometry_old')
+
+
+def rebuild_coverage(conn, batch=1000, verbose=False):
+    """Recomputes all precomputed coverage MOCs from the footprints of all frames.
+    Does not commit the transaction.
+    """
+    log = (verbose if callable(verbose) else print) if verbose else lambda *args,**kwargs: None
+
+    mocs = {}
+
+    # Server-side cursor, so that the footprints are not all loaded at once
+    cur = conn.cursor(name='rebuild_coverage')
+    cur.execute('SELECT f.moc, f.filter, s.site, f.time FROM frames f JOIN sequences s ON s.id = f.sequence WHERE f.moc IS NOT NULL')
+
+    nframes = 0
+    while True:
+        rows = cur.fetchmany(batch)
+        if not rows:
+            break
+
+        batch_mocs = {}
+        for moc,filter,site,time in rows:
+            moc = moc_from_bytes(moc)
+            for name in get_coverage_names(filter, site, time):
+                batch_mocs.setdefault(name, []).append(moc)
+
+        merge_mocs(mocs, {name: union_mocs(_) for name,_ in batch_mocs.items()})
+
+        nframes += len(rows)
+        log(f"{nframes} frames processed")
+
+    cur.close()
+
+    cur = conn.cursor()
+    cur.execute('DELETE FROM coverage')
+
+    update_coverage_mocs(conn, mocs, verbose=verbose)
+
+
+def ingest_frames(conn, filenames, update_mocs=True, verbose=False):
+    """Ingests the batch of calibrated frames into the database using set-based statements.
+
+    Sequences and frames of the whole batch are inserted with a single statement each,
+    and all the photometry is loaded with a single binary COPY. Footprints of the sequences
+    are merged in memory, and if update_mocs is set, already existing sequences are updated
+    once per sequence. Otherwise the caller is responsible for passing the returned MOCs
+    to update_sequence_mocs() and update_coverage_mocs() later. Does not commit the transaction.
+
+    The same applies to the precomputed coverage MOCs.
+
+    Returns the number of new frames and photometric measurements, the dict
+    with footprints of new frames for every sequence, and the dict with
+    the ones for every coverage map.
+    """
+    log = (verbose if callable(verbose) else print) if verbose else lambda *args,**kwargs: None
+
+    frames = [load_frame(_) for _ in filenames]
+
+    if not frames:
+        return 0, 0, {}, {}
+
+    cur = conn.cursor()
+
+    # Sequences, with first frame of every one providing the metadata.
+    # Sorted by path so that concurrent processes lock them in the same order
+    seqs = {}
+    for frame in sorted(frames, key=lambda _: _['path']):
+        seqs.setdefault(frame['path'], []).append(frame)
+
+    rows = []
+    for path,sframes in seqs.items():
+        moc = union_mocs([_['moc'] for _ in sframes])
+        meta = sframes[0]['obj'].meta
+        rows.append((path, meta['Telescope'], meta['Observer'], meta['Filter'], meta['Object'], psycopg2.Binary(moc_to_bytes(moc))))
+
+    res = psycopg2.extras.execute_values(
+        cur,
+        'INSERT INTO sequences (path, site, observer, filter, target, moc) '
+        'VALUES %s ON CONFLICT DO NOTHING RETURNING id, path',
+        rows,
+        fetch=True,
+    )
+    seq_ids = {path: seq_id for seq_id,path in res}
+    new_seqs = set(seq_ids.keys())
+
+    # Already existing sequences
+    if len(new_seqs) < len(seqs):
+        cur.execute(
+            'SELECT id, path FROM sequences WHERE path = ANY(%s)',
+            ([_ for _ in seqs.keys() if _ not in new_seqs],)
+        )
+        for seq_id,path in cur.fetchall():
+            seq_ids[path] = seq_id
+
+    # Frames
+    res = psycopg2.extras.execute_values(
+        cur,
+        'INSERT INTO frames (sequence, time, filter, exposure, ra, dec, radius, pixscale, width, height, moc, keywords) '
+        'VALUES %s ON CONFLICT DO NOTHING RETURNING id, sequence, time',
+        [get_frame_row(frame, seq_ids[frame['path']]) for frame in frames],
+        fetch=True,
+    )
+    frame_ids = {(seq_id, time): frame_id for frame_id,seq_id,time in res}
+
+    # Photometry for newly inserted frames only
+    data = []
+    for frame in frames:
+        seq_id = seq_ids[frame['path']]
+        frame_id = frame_ids.pop((seq_id, frame['time']), None)
+
+        if frame_id is not None:
+            data.append(get_photometry_columns(frame, seq_id, frame_id))
+            frame['new'] = True
+
+    if data:
+        data = [np.concatenate(_) for _ in zip(*data)]
+
+        # Filter names to ids
+        fidx = [_[0] for _ in photometry_columns].index('filter')
+        fnames, inverse = np.unique(data[fidx], return_inverse=True)
+        fids = get_filter_ids(conn, fnames)
+        data[fidx] = np.array([fids[_] for _ in fnames], dtype=np.int16)[inverse.ravel()]
+
+        copy_photometry(cur, data)
+
+    # Footprints of new frames for every sequence
+    mocs = {}
+    for path,sframes in seqs.items():
+        moc = union_mocs([_['moc'] for _ in sframes if _.get('new')])
+        if moc is not None:
+            mocs[seq_ids[path]] = moc
+
+    # Footprints of new frames for every coverage map
+    coverage = {}
+    for frame in frames:
+        if frame.get('new'):
+            meta = frame['obj'].meta
+            for name in get_coverage_names(meta['Filter'], meta['Telescope'], frame['time']):
+                coverage.setdefault(name, []).append(frame['moc'])
+    coverage = {name: union_mocs(_) for name,_ in coverage.items()}
+
+    # Invalidate cached light curves in the regions with new data
+    bump_sky_versions(conn, coverage.get('all'))
+
+    if update_mocs:
+        # Newly created sequences already have correct footprints
+        update_sequence_mocs(
+            conn,
+            {seq_ids[path]: mocs[seq_ids[path]] for path in seqs if path not in new_seqs and seq_ids[path] in mocs},
+            verbose=verbose
+        )
+        update_coverage_mocs(conn, coverage, verbose=verbose)
+
+    nrows = len(data[0]) if data else 0
+    nframes = sum(1 for _ in frames if _.get('new'))
+
+    log(f"{nframes} new frames with {nrows} measurements in {len(seqs)} sequences ({len(new_seqs)} new)")
+
+    return nframes, nrows, mocs, coverage
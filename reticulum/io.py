@@ -1,5 +1,8 @@
+import csv
+import itertools
+
 import numpy as np
-from astropy.table import Table
+from astropy.table import Table, Column, MaskedColumn
 
 
 def parse_sexa(string, hour=False):
@@ -19,64 +22,150 @@ def parse_sexa(string, hour=False):
     return scale * sign * (s[0] + s[1]/60 + s[2]/3600)
 
 
+def parse_sexa_array(strings, hour=False):
+    """Vectorized version of parse_sexa() for the whole array of strings.
+    Masked or empty entries are converted to NaNs.
+    """
+    strings = np.ma.filled(np.ma.asarray(strings).astype(str), '')
+    strings = np.char.strip(strings)
+
+    result = np.full(strings.shape, np.nan)
+
+    idx = strings != ''
+    if not np.any(idx):
+        return result
+
+    values = strings[idx]
+    sign = np.where(np.char.startswith(values, '-'), -1, 1)
+    values = np.char.lstrip(values, '+-')
+
+    parts = ' '.join(values).split()
+    if len(parts) != 3*len(values):
+        # Irregular formatting somewhere - fall back to per-element parsing
+        result[idx] = [parse_sexa(_, hour=hour) for _ in strings[idx]]
+        return result
+
+    parts = np.array(parts, dtype=float).reshape(-1, 3)
+    scale = 15 if hour else 1
+
+    result[idx] = scale * sign * (parts[:, 0] + parts[:, 1]/60 + parts[:, 2]/3600)
+
+    return result
+
+
+def _parse_header_value(val):
+    for t in (int, float):
+        try:
+            return t(val)
+        except:
+            pass
+
+    return val
+
+
+def _convert_column(values, name, fill_values=(), converter=None):
+    """Converts the array of strings to the narrowest of int, float or str,
+    masking the fill values the same way astropy.io.ascii does.
+    """
+    values = np.char.strip(values)
+    mask = np.isin(values, fill_values)
+    if np.any(mask):
+        values = np.where(mask, '0', values)
+
+    if converter is not None:
+        data = np.array(values, dtype=converter)
+    else:
+        for dtype in (np.int64, np.float64):
+            try:
+                data = values.astype(dtype)
+                break
+            except (ValueError, OverflowError):
+                pass
+        else:
+            data = values
+
+    if np.any(mask):
+        return MaskedColumn(data, name=name, mask=mask)
+    else:
+        return Column(data, name=name)
+
+
 def read_sips(filename, filled=False):
     with open(filename, 'r') as f:
-        header = {}
-
-        for i,line in enumerate(f):
-            line = line.strip()
-            # Format check
-            if i == 0:
-                if line != 'sep=;':
-                    return None
-
-            elif line.startswith('Name;'):
-                # Header
-                table = Table.read(
-                    filename,
-                    format='ascii',
-                    header_start=i,
-                    delimiter=';',
-                    fill_values=(('', '0'), ('saturated', '0')),
-                    converters={'Name': str},
-                )
-                table.meta.update(header)
-
-                # Convert coordinates
-                for __ in ('', 'Catalog'):
-                    if (__ + 'RA') in table.colnames:
-                        table[__ + 'RA'] = [parse_sexa(_, hour=True) for _ in table[__ + 'RA']]
-                        table[__ + 'Dec'] = [parse_sexa(_) for _ in table[__ + 'Dec']]
-
-                # Rename some columns
-                table.rename_column('RA', 'ra')
-                table.rename_column('Dec', 'dec')
-
-                table.rename_column('X', 'x')
-                table.rename_column('Y', 'y')
-
-                # Adjust fill values for floating point columns
-                for col in table.itercols():
-                    if col.dtype.kind == 'f':
-                        col.fill_value = np.nan
-
-                if filled:
-                    table = table.filled()
-
-                return table
-
-            else:
-                s = line.split(';')
-                if len(s) == 2:
-                    val = s[1]
-
-                    for t in (int, float):
-                        try:
-                            val = t(val)
-                            break
-                        except:
-                            pass
-
-                    header[s[0]] = val
-
-    return None
+        lines = f.read().splitlines()
+
+    # Format check
+    if not lines or lines[0].strip() != 'sep=;':
+        return None
+
+    header = {}
+
+    for i,line in enumerate(lines[1:], start=1):
+        line = line.strip()
+
+        if line.startswith('Name;'):
+            break
+
+        s = next(csv.reader([line], delimiter=';'))
+        if len(s) == 2:
+            header[s[0]] = _parse_header_value(s[1])
+    else:
+        return None
+
+    fill_values = ('', 'saturated')
+
+    # Header
+    colnames = [_.strip() for _ in next(csv.reader([lines[i]], delimiter=';'))]
+    ncols = len(colnames)
+
+    # Data section, split all at once and then sliced into columns
+    rows = [_ for _ in lines[i+1:] if _.strip() and not _.lstrip().startswith('#')]
+    fields = ';'.join(rows)
+
+    if '"' in fields:
+        # Quoted fields may contain separators, so the csv module is needed
+        fields = list(itertools.chain.from_iterable(csv.reader(rows, delimiter=';')))
+    else:
+        fields = fields.split(';') if rows else []
+
+    if len(fields) != ncols*len(rows):
+        raise ValueError(f"Inconsistent number of columns in the data section of {filename}")
+
+    # Sexagesimal coordinate columns and whether they are in hours
+    sexa_columns = {}
+    for __ in ('', 'Catalog'):
+        if (__ + 'RA') in colnames:
+            sexa_columns[__ + 'RA'] = True
+            sexa_columns[__ + 'Dec'] = False
+
+    columns = []
+    for j,name in enumerate(colnames):
+        values = np.array(fields[j::ncols], dtype=str)
+
+        if name in sexa_columns:
+            # Convert coordinates for the whole column at once
+            values = np.ma.masked_array(values, mask=np.isin(np.char.strip(values), fill_values))
+            columns.append(Column(parse_sexa_array(values, hour=sexa_columns[name]), name=name))
+            continue
+
+        columns.append(_convert_column(values, name, fill_values=fill_values, converter=str if name == 'Name' else None))
+
+    table = Table(columns)
+    table.meta.update(header)
+
+    # Rename some columns
+    table.rename_column('RA', 'ra')
+    table.rename_column('Dec', 'dec')
+
+    table.rename_column('X', 'x')
+    table.rename_column('Y', 'y')
+
+    # Adjust fill values for floating point columns
+    for col in table.itercols():
+        if col.dtype.kind == 'f':
+            col.fill_value = np.nan
+
+    if filled:
+        table = table.filled()
+
+    return table
@@ -14,7 +14,7 @@ class Sequences(models.Model):
     observer = models.TextField(blank=True, null=True)
     filter = models.TextField(blank=True, null=True)
     target = models.TextField(blank=True, null=True)
-    moc = models.TextField(blank=True, null=True)
+    moc = models.BinaryField(blank=True, null=True)
     keywords = models.JSONField(blank=True, null=True)
 
     class Meta:
@@ -33,7 +33,7 @@ class Frames(models.Model):
     pixscale = models.FloatField(blank=True, null=True)
     width = models.IntegerField(blank=True, null=True)
     height = models.IntegerField(blank=True, null=True)
-    moc = models.TextField(blank=True, null=True)
+    moc = models.BinaryField(blank=True, null=True)
     keywords = models.JSONField(blank=True, null=True)
 
     class Meta:
@@ -42,11 +42,34 @@ class Frames(models.Model):
         unique_together = (('sequence', 'time'),)
 
 
+class Filters(models.Model):
+    name = models.TextField(unique=True)
+
+    class Meta:
+        managed = False
+        db_table = 'filters'
+
+
+class Objects(models.Model):
+    ra = models.FloatField(blank=True, null=True)
+    dec = models.FloatField(blank=True, null=True)
+    hpx = models.IntegerField(blank=True, null=True)
+    nmeas = models.IntegerField(blank=True, null=True)
+    time_min = models.DateTimeField(blank=True, null=True)
+    time_max = models.DateTimeField(blank=True, null=True)
+    period = models.FloatField(blank=True, null=True)
+    period_power = models.FloatField(blank=True, null=True)
+    period_fap = models.FloatField(blank=True, null=True)
+
+    class Meta:
+        managed = False
+        db_table = 'objects'
+
+
 class Photometry(models.Model):
     sequence = models.ForeignKey(Sequences, on_delete=models.DO_NOTHING, db_column='sequence', blank=True, null=True)
     frame = models.ForeignKey(Frames, on_delete=models.DO_NOTHING, db_column='frame', blank=True, null=True)
-    time = models.DateTimeField(blank=True, null=True)
-    filter = models.TextField(blank=True, null=True)
+    filter = models.ForeignKey(Filters, on_delete=models.DO_NOTHING, db_column='filter', blank=True, null=True)
     ra = models.FloatField(blank=True, null=True)
     dec = models.FloatField(blank=True, null=True)
     mag = models.FloatField(blank=True, null=True)
@@ -55,7 +78,20 @@ class Photometry(models.Model):
     color_term2 = models.FloatField(blank=True, null=True)
     flags = models.IntegerField(blank=True, null=True)
     fwhm = models.FloatField(blank=True, null=True)
+    hpx = models.IntegerField()
+    object = models.ForeignKey(Objects, on_delete=models.DO_NOTHING, db_column='object', blank=True, null=True)
 
     class Meta:
         managed = False
         db_table = 'photometry'
+
+
+class Coverage(models.Model):
+    name = models.TextField(primary_key=True)
+    moc = models.BinaryField(blank=True, null=True)
+    version = models.IntegerField(blank=True, null=True)
+    time = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        managed = False
+        db_table = 'coverage'
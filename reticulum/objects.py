@@ -0,0 +1,244 @@
+import numpy as np
+
+from astropy_healpix import HEALPix
+
+from scipy.spatial import cKDTree
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+
+import psycopg2.extras
+
+from . import ingest
+
+# Default radius for associating detections with objects, in degrees
+object_match_radius = 2/3600
+
+# Arbitrary key for advisory lock serializing object builders
+_objects_lock = 0x0b1ec7
+
+
+def radec_to_xyz(ra, dec):
+    ra,dec = np.radians(ra), np.radians(dec)
+
+    return np.stack([np.cos(dec)*np.cos(ra), np.cos(dec)*np.sin(ra), np.sin(dec)], axis=-1)
+
+
+def xyz_to_radec(xyz):
+    ra = np.degrees(np.arctan2(xyz[..., 1], xyz[..., 0])) % 360
+    dec = np.degrees(np.arctan2(xyz[..., 2], np.hypot(xyz[..., 0], xyz[..., 1])))
+
+    return ra, dec
+
+
+def _chord(sr):
+    """Chord length corresponding to the angular distance in degrees"""
+    return 2*np.sin(np.radians(sr)/2)
+
+
+def cluster_positions(ra, dec, obj_ra=[], obj_dec=[], sr=object_match_radius):
+    """Clusters the positions into objects.
+
+    Every position is first associated with the nearest of known objects within sr degrees.
+    The rest are grouped by friends-of-friends linking with the same radius, and every group
+    becomes a new object. Returns the indices into known objects, or into new ones, offset
+    by the number of known objects, and the list of centers of new objects.
+    """
+    xyz = radec_to_xyz(ra, dec)
+    chord = _chord(sr)
+
+    index = np.full(len(xyz), -1, dtype=np.int64)
+
+    if len(obj_ra) and len(xyz):
+        dist,idx = cKDTree(radec_to_xyz(obj_ra, obj_dec)).query(xyz, k=1, distance_upper_bound=chord)
+        good = np.isfinite(dist)
+        index[good] = idx[good]
+
+    rest = np.where(index < 0)[0]
+
+    if not len(rest):
+        return index, (np.zeros(0), np.zeros(0))
+
+    pairs = cKDTree(xyz[rest]).query_pairs(chord, output_type='ndarray')
+    graph = coo_matrix((np.ones(len(pairs)), (pairs[:, 0], pairs[:, 1])), shape=(len(rest), len(rest)))
+    nobj,labels = connected_components(graph, directed=False)
+
+    index[rest] = len(obj_ra) + labels
+
+    # Centers of new objects
+    center = np.zeros((nobj, 3))
+    np.add.at(center, labels, xyz[rest])
+
+    return index, xyz_to_radec(center)
+
+
+def update_object_stats(conn, ids, pixels):
+    """Recomputes the statistics of the objects from their detections in the list of
+    photometry HEALPix pixels. Does not commit the transaction.
+    """
+    if not len(ids):
+        return
+
+    ids = [int(_) for _ in ids]
+    pixels = [int(_) for _ in pixels]
+
+    cur = conn.cursor()
+
+    # Mean positions, number of measurements and time spans
+    cur.execute(
+        'SELECT p.object, count(*), min(f.time), max(f.time), '
+        'avg(cos(radians(p.dec))*cos(radians(p.ra))), avg(cos(radians(p.dec))*sin(radians(p.ra))), avg(sin(radians(p.dec))) '
+        'FROM photometry p JOIN frames f ON f.id = p.frame '
+        'WHERE p.hpx = ANY(%s) AND p.object = ANY(%s) GROUP BY p.object',
+        (pixels, ids)
+    )
+    res = cur.fetchall()
+
+    if not res:
+        return
+
+    ra,dec = xyz_to_radec(np.array([_[4:] for _ in res], dtype=np.float64))
+    hpx = ingest.get_photometry_hpx(ra, dec)
+
+    psycopg2.extras.execute_values(
+        cur,
+        'UPDATE objects SET ra = v.ra, dec = v.dec, hpx = v.hpx, nmeas = v.nmeas, time_min = v.time_min, time_max = v.time_max '
+        'FROM (VALUES %s) AS v (id, ra, dec, hpx, nmeas, time_min, time_max) WHERE objects.id = v.id',
+        [(r[0], float(_ra), float(_dec), int(_hpx), r[1], r[2], r[3]) for r,_ra,_dec,_hpx in zip(res, ra, dec, hpx)],
+    )
+
+    # Per-filter median magnitudes and scatter, keeping variability indices until they are re-computed
+    cur.execute(
+        'INSERT INTO object_stats (object, filter, nmeas, mag, std) '
+        'SELECT object, filter, count(*), percentile_cont(0.5) WITHIN GROUP (ORDER BY mag), coalesce(stddev_samp(mag), 0) '
+        "FROM photometry WHERE hpx = ANY(%s) AND object = ANY(%s) AND mag <> 'NaN' GROUP BY object, filter "
+        'ON CONFLICT (object, filter) DO UPDATE SET nmeas = excluded.nmeas, mag = excluded.mag, std = excluded.std',
+        (pixels, ids)
+    )
+
+
+def associate_pixel(conn, ipix, sr=object_match_radius, verbose=False):
+    """Associates all not yet associated detections in the photometry HEALPix pixel with objects,
+    creating new ones when necessary, and updates the statistics of affected objects.
+    Returns the number of associated detections and new objects. Does not commit the transaction.
+    """
+    log = (verbose if callable(verbose) else print) if verbose else lambda *args,**kwargs: None
+
+    ipix = int(ipix)
+    cur = conn.cursor()
+
+    cur.execute('SELECT id, ra, dec FROM photometry WHERE hpx = %s AND object IS NULL', (ipix,))
+    res = cur.fetchall()
+
+    if not res:
+        return 0, 0
+
+    det_ids = np.array([_[0] for _ in res], dtype=np.int64)
+    ra, dec = np.array([_[1:] for _ in res], dtype=np.float64).T
+
+    # Known objects in the pixel and its neighbours, so that the ones near the border are not duplicated
+    hp = HEALPix(2**ingest.photometry_hpx_order, order='nested')
+    pixels = [ipix] + [int(_) for _ in hp.neighbours(ipix) if _ >= 0]
+
+    cur.execute('SELECT id, ra, dec FROM objects WHERE hpx = ANY(%s)', (pixels,))
+    res = cur.fetchall()
+
+    obj_ids = np.array([_[0] for _ in res], dtype=np.int64)
+    obj_ra, obj_dec = np.array([_[1:] for _ in res], dtype=np.float64).reshape(-1, 2).T
+
+    index, (new_ra, new_dec) = cluster_positions(ra, dec, obj_ra, obj_dec, sr=sr)
+
+    if len(new_ra):
+        res = psycopg2.extras.execute_values(
+            cur,
+            'INSERT INTO objects (ra, dec, hpx) VALUES %s RETURNING id',
+            [(float(_ra), float(_dec), int(_hpx)) for _ra,_dec,_hpx in zip(new_ra, new_dec, ingest.get_photometry_hpx(new_ra, new_dec))],
+            fetch=True,
+            page_size=len(new_ra),
+        )
+        obj_ids = np.concatenate([obj_ids, [_[0] for _ in res]])
+
+    det_objects = obj_ids[index]
+
+    # Link detections to objects through temporary table loaded with binary COPY
+    cur.execute('CREATE TEMPORARY TABLE IF NOT EXISTS object_links (id BIGINT, object INT) ON COMMIT DROP')
+    cur.execute('TRUNCATE object_links')
+    ingest.copy_binary(cur, 'object_links', ['id', 'object'], [det_ids, det_objects], ['int8', 'int4'])
+    cur.execute(
+        'UPDATE photometry p SET object = l.object FROM object_links l WHERE p.hpx = %s AND p.id = l.id',
+        (ipix,)
+    )
+
+    # Objects near the border may have detections in the neighbouring pixels, and their centers
+    # may move there, so the statistics are computed over all of them
+    update_object_stats(conn, np.unique(det_objects), pixels + [int(_) for _ in hp.neighbours(pixels).ravel() if _ >= 0])
+
+    # Invalidate cached light curves and object searches there, including the neighbours where the objects may move
+    shift = 2*(ingest.photometry_hpx_order - ingest.sky_versions_order)
+    ingest.bump_sky_pixels(conn, sorted(set(_ >> shift for _ in pixels)))
+
+    log(f"Pixel {ipix}: {len(det_ids)} detections associated with {len(np.unique(det_objects))} objects, {len(new_ra)} new")
+
+    return len(det_ids), len(new_ra)
+
+
+def build_objects(conn, pixels=None, sr=object_match_radius, verbose=False):
+    """Associates not yet associated detections with objects in the list of photometry HEALPix pixels,
+    or everywhere if pixels is None. Every pixel is processed in its own transaction, with concurrent
+    builders serialized. Returns the number of associated detections and new objects.
+    """
+    log = (verbose if callable(verbose) else print) if verbose else lambda *args,**kwargs: None
+
+    cur = conn.cursor()
+
+    if pixels is None:
+        cur.execute('SELECT DISTINCT hpx FROM photometry WHERE object IS NULL ORDER BY hpx')
+        pixels = [_[0] for _ in cur.fetchall()]
+        conn.commit()
+
+    ndets, nobjs = 0, 0
+
+    for ipix in sorted(set(int(_) for _ in pixels)):
+        try:
+            cur.execute('SELECT pg_advisory_xact_lock(%s)', (_objects_lock,))
+            res = associate_pixel(conn, ipix, sr=sr, verbose=verbose)
+            conn.commit()
+        except:
+            conn.rollback()
+            raise
+
+        ndets += res[0]
+        nobjs += res[1]
+
+    log(f"{ndets} detections associated, {nobjs} new objects in {len(pixels)} pixels")
+
+    return ndets, nobjs
+
+
+def get_moc_pixels(moc):
+    """Photometry HEALPix pixels touched by the MOC"""
+    if moc is None:
+        return []
+
+    return [int(_) for _ in moc.degrade_to_order(ingest.photometry_hpx_order).flatten()]
+
+
+def migrate_objects(conn, schema, verbose=False):
+    """Adds the links to objects to existing photometry table and creates object tables using
+    schema SQL (db/objects.sql). Does nothing if already done. Does not commit the transaction.
+    """
+    log = (verbose if callable(verbose) else print) if verbose else lambda *args,**kwargs: None
+
+    cur = conn.cursor()
+
+    cur.execute("SELECT 1 FROM information_schema.columns WHERE table_name = 'photometry' AND column_name = 'object'")
+    if cur.fetchone() is not None:
+        log("Nothing to migrate for objects")
+        return
+
+    cur.execute('ALTER TABLE photometry ADD COLUMN object INT')
+    cur.execute('CREATE INDEX ON photometry (object)')
+    cur.execute('CREATE INDEX ON photometry (hpx) WHERE object IS NULL')
+
+    cur.execute(schema)
+
+    log("Created object tables")
@@ -0,0 +1,93 @@
+import io
+
+import numpy as np
+
+from matplotlib.backends.backend_agg import FigureCanvasAgg as FigureCanvas
+from matplotlib.figure import Figure
+from matplotlib.collections import LineCollection
+from matplotlib import colors as mcolors
+from matplotlib import dates as mdates
+
+from astropy.stats import mad_std
+
+# Supported image formats and their content types
+plot_formats = {
+    'jpeg': 'image/jpeg',
+    'png': 'image/png',
+    'webp': 'image/webp',
+    'svg': 'image/svg+xml',
+}
+
+
+def downsample_lc(times, mags, magerrs, groups, max_points=5000, nsigma=3):
+    """Selects at most max_points points of the light curve for display, keeping all outliers.
+
+    Outliers are the points deviating from the median of their group (filter) by more than
+    nsigma combined robust scatter and error. The rest are thinned evenly in time within every
+    group. Returns the indices of selected points, ordered by time.
+    """
+    times, mags, magerrs = [np.asarray(_) for _ in (times, mags, magerrs)]
+    N = len(mags)
+
+    if N <= max_points:
+        return np.arange(N)
+
+    _,groups = np.unique(groups, return_inverse=True)
+    groups = groups.ravel()
+
+    outlier = np.zeros(N, dtype=bool)
+    for g in np.unique(groups):
+        idx = groups == g
+        dev = np.abs(mags[idx] - np.nanmedian(mags[idx]))
+        outlier[idx] = dev > nsigma*np.hypot(mad_std(mags[idx], ignore_nan=True), magerrs[idx])
+
+    # Rank of regular points in time order within every group
+    order = np.lexsort((times, groups))
+    regular = order[~outlier[order]]
+    rg = groups[regular]
+    start = np.searchsorted(rg, np.arange(rg.max() + 1 if len(rg) else 0))
+    rank = np.arange(len(regular)) - start[rg]
+
+    step = int(np.ceil(len(regular)/max(1, max_points - np.sum(outlier))))
+    keep = np.concatenate([np.where(outlier)[0], regular[rank % step == 0]])
+
+    return keep[np.argsort(times[keep], kind='stable')]
+
+
+def render_lc(times, mags, magerrs, colors, title=None, size=800, format='jpeg', max_points=5000, groups=None):
+    """Renders the light curve with a single artist for error bars and a single one for points,
+    with dense light curves downsampled for display. Times are numpy datetime64 values,
+    colors are matplotlib color names of the points. Returns the bytes of the image.
+    """
+    times, mags, magerrs, colors = [np.asarray(_) for _ in (times, mags, magerrs, colors)]
+
+    idx = downsample_lc(times, mags, magerrs, colors if groups is None else groups, max_points=max_points)
+    times, mags, magerrs, colors = times[idx], mags[idx], magerrs[idx], colors[idx]
+
+    x = mdates.date2num(times)
+    # Color names to RGBA converted once per unique name
+    cnames,inverse = np.unique(colors, return_inverse=True)
+    rgba = mcolors.to_rgba_array(cnames)[inverse.ravel()] if len(cnames) else np.zeros((0, 4))
+
+    fig = Figure(facecolor='white', dpi=72, figsize=(size/72, 0.5*size/72), tight_layout=True)
+    ax = fig.add_subplot(111)
+    ax.grid(True, alpha=0.1, color='gray')
+
+    segments = np.stack([np.stack([x, mags - magerrs], axis=1), np.stack([x, mags + magerrs], axis=1)], axis=1)
+    errcolors = rgba.copy()
+    errcolors[:, 3] = 0.3
+    ax.add_collection(LineCollection(segments, colors=errcolors, linewidths=1))
+
+    ax.scatter(x, mags, marker='.', c=rgba)
+
+    ax.xaxis_date()
+    ax.autoscale_view()
+    ax.invert_yaxis()
+
+    if title:
+        ax.set_title(title)
+
+    buf = io.BytesIO()
+    FigureCanvas(fig).print_figure(buf, format=format)
+
+    return buf.getvalue()
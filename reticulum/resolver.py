@@ -0,0 +1,137 @@
+"""Resolution of target names for the photometry form, with as little network access as possible.
+
+Coordinate strings are parsed directly, common objects are taken from the local table in
+data/targets.csv, and everything else is resolved by stdpipe.resolve.resolve() with the results,
+both positive and negative, kept in the persistent Django cache. Network lookups run in a small
+thread pool and are waited for at most RESOLVE_TIMEOUT seconds - if they take longer, their
+results are still cached for the next request.
+"""
+
+from django.core.cache import cache
+from django.conf import settings
+
+import os
+import re
+import csv
+import hashlib
+import threading
+
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from astropy.coordinates import SkyCoord
+import astropy.units as u
+
+from stdpipe import resolve as _resolve
+
+executor = ThreadPoolExecutor(max_workers=settings.RESOLVE_THREADS, thread_name_prefix='reticulum-resolver')
+
+_targets = None
+
+# Lookups in progress, so that the same name is not resolved twice concurrently
+_pending = {}
+_pending_lock = threading.Lock()
+
+
+def normalize_name(name):
+    """Canonical form of the name, so that e.g. 'M 31' and 'm31' are the same"""
+    return re.sub(r'\s+', '', name).lower()
+
+
+def get_targets():
+    """Table of common targets as a dict of normalized names to (ra, dec), loaded once"""
+    global _targets
+
+    if _targets is None:
+        targets = {}
+
+        for filename in [os.path.join(os.path.dirname(__file__), 'data', 'targets.csv')] + settings.RESOLVE_TARGETS:
+            with open(filename, newline='') as f:
+                for row in csv.DictReader(f):
+                    for name in row['name'].split('|'):
+                        targets[normalize_name(name)] = (float(row['ra']), float(row['dec']))
+
+        _targets = targets
+
+    return _targets
+
+
+def parse_coords(string):
+    """Coordinates given directly as decimal degrees or sexagesimal hours and degrees, or None"""
+    m = re.match(r'^\s*(\d+\.?\d*)\s*[,\s]\s*([+-]?\d+\.?\d*)\s*$', string)
+    if m:
+        ra, dec = float(m.group(1)), float(m.group(2))
+
+        return SkyCoord(ra, dec, unit='deg') if ra < 360 and abs(dec) <= 90 else None
+
+    # Only digits, separators and unit letters, e.g. '12 34 56.7 +45 12 34' or '12h34m56.7s +45d12m34s'
+    m = re.match(r'^\s*(\d+)[\d\s:.,+\-hmsd]*$', string)
+    if m and int(m.group(1)) < 24:
+        try:
+            target = SkyCoord(string.replace(',', ' '), unit=(u.hourangle, u.deg))
+
+            if abs(target.dec.deg) <= 90:
+                return target
+        except (ValueError, TypeError, u.UnitsError):
+            pass
+
+    return None
+
+
+def get_cache_key(name):
+    return 'resolve:' + hashlib.sha1(normalize_name(name).encode()).hexdigest()
+
+
+def resolve_local(string):
+    """Resolves coordinate strings and names from the table of common targets, never going to the network"""
+    target = parse_coords(string)
+
+    if target is None and (coords := get_targets().get(normalize_name(string))) is not None:
+        target = SkyCoord(*coords, unit='deg')
+
+    return target
+
+
+def resolve_remote(string):
+    """Resolves the name with network services, storing the result in the cache"""
+    target = _resolve.resolve(string)
+
+    if target is not None:
+        cache.set(get_cache_key(string), (target.ra.deg, target.dec.deg), timeout=settings.RESOLVE_CACHE_TIMEOUT)
+    else:
+        # Empty tuple marks the names that cannot be resolved
+        cache.set(get_cache_key(string), (), timeout=settings.RESOLVE_NEGATIVE_TIMEOUT)
+
+    return target
+
+
+def resolve(string, timeout=None, verbose=False):
+    """Resolves coordinate string or object name to SkyCoord, or returns None if it cannot be
+    resolved, or if the network lookup takes longer than timeout seconds (RESOLVE_TIMEOUT by default)"""
+    log = (verbose if callable(verbose) else print) if verbose else lambda *args,**kwargs: None
+
+    string = string.strip()
+
+    target = resolve_local(string)
+    if target is not None:
+        log(f"Resolved {string} locally")
+        return target
+
+    key = get_cache_key(string)
+
+    coords = cache.get(key)
+    if coords is not None:
+        log(f"Cached result for {string}")
+        return SkyCoord(*coords, unit='deg') if coords else None
+
+    with _pending_lock:
+        future = _pending.get(key)
+
+        if future is None:
+            future = _pending[key] = executor.submit(resolve_remote, string)
+            future.add_done_callback(lambda _: _pending.pop(key, None))
+
+    try:
+        return future.result(timeout=settings.RESOLVE_TIMEOUT if timeout is None else timeout)
+    except TimeoutError:
+        log(f"Timeout resolving {string}")
+        return None
@@ -0,0 +1,194 @@
+import os
+import time
+import fnmatch
+import hashlib
+import sqlite3
+
+try:
+    import inotify_simple
+except ImportError:
+    inotify_simple = None
+
+state_schema = '''
+CREATE TABLE IF NOT EXISTS files (
+       path TEXT PRIMARY KEY,
+       mtime INTEGER,
+       size INTEGER,
+       hash TEXT,
+       status TEXT,
+       time REAL
+);
+CREATE INDEX IF NOT EXISTS files_status_idx ON files (status);
+CREATE TABLE IF NOT EXISTS dirs (
+       path TEXT PRIMARY KEY,
+       mtime INTEGER
+);
+'''
+
+
+def open_state(filename):
+    """Opens (and creates if necessary) the state database of the scanner"""
+    conn = sqlite3.connect(filename)
+    conn.executescript(state_schema)
+
+    return conn
+
+
+def file_hash(filename, blocksize=1024*1024):
+    """Hash of the file contents"""
+    h = hashlib.blake2b(digest_size=16)
+
+    with open(filename, 'rb') as f:
+        while block := f.read(blocksize):
+            h.update(block)
+
+    return h.hexdigest()
+
+
+def check_file(conn, path, st):
+    """Updates the state of the file, returns True if it is new or its contents changed.
+    Contents are hashed only if the modification time or size differ from the stored ones.
+    """
+    row = conn.execute('SELECT mtime, size, hash FROM files WHERE path = ?', (path,)).fetchone()
+
+    if row is not None and row[0] == st.st_mtime_ns and row[1] == st.st_size:
+        return False
+
+    digest = file_hash(path)
+
+    if row is not None and row[2] == digest:
+        # Touched but not changed
+        conn.execute('UPDATE files SET mtime = ?, size = ? WHERE path = ?', (st.st_mtime_ns, st.st_size, path))
+        return False
+
+    conn.execute(
+        'INSERT OR REPLACE INTO files (path, mtime, size, hash, status, time) VALUES (?, ?, ?, ?, ?, ?)',
+        (path, st.st_mtime_ns, st.st_size, digest, 'new', time.time())
+    )
+
+    return True
+
+
+def scan(conn, roots, pattern='*.csv', full=False, check_known=False, min_age=60, dirty=(), on_dir=None, verbose=False):
+    """Walks the directory trees looking for new or changed files matching the pattern.
+
+    Directories whose modification time did not change since the previous scan are only
+    descended into, without listing new files there, so re-scanning large unchanged archives
+    is fast. Files changed in place do not change their directories, so they are found only
+    with full set, if their directories are listed in dirty, or with check_known set, which
+    compares the modification times and sizes of known files in unchanged directories with
+    the stored ones. Files modified less than min_age seconds ago are deferred until they
+    are completely written. Returns the list of new or changed files and the number of
+    deferred ones. Commits the state.
+    """
+    log = (verbose if callable(verbose) else print) if verbose else lambda *args,**kwargs: None
+
+    dirs = dict(conn.execute('SELECT path, mtime FROM dirs'))
+    stack = [os.path.abspath(_) for _ in roots]
+    paths, ndeferred, ndirs = [], 0, 0
+    now = time.time()
+
+    while stack:
+        dirname = stack.pop()
+
+        try:
+            # Directory time is taken before listing, so that anything changing it during the listing
+            # is seen on the next scan
+            mtime = os.stat(dirname).st_mtime_ns
+            entries = list(os.scandir(dirname))
+        except OSError as e:
+            log(f"Cannot scan {dirname}: {e}")
+            continue
+
+        if on_dir is not None:
+            on_dir(dirname)
+
+        changed = full or dirname in dirty or dirs.get(dirname) != mtime
+        deferred = False
+
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                stack.append(entry.path)
+            elif (changed or check_known) and fnmatch.fnmatch(entry.name, pattern) and entry.is_file():
+                st = entry.stat()
+
+                if now - st.st_mtime < min_age:
+                    deferred = True
+                    ndeferred += 1
+                elif check_file(conn, entry.path, st):
+                    paths.append(entry.path)
+
+        # Directory with deferred files has to be checked again next time
+        if deferred:
+            conn.execute('DELETE FROM dirs WHERE path = ?', (dirname,))
+        elif changed:
+            conn.execute('INSERT OR REPLACE INTO dirs (path, mtime) VALUES (?, ?)', (dirname, mtime))
+        ndirs += changed
+
+        conn.commit()
+
+    log(f"{len(paths)} new or changed files, {ndeferred} deferred, {ndirs} directories checked")
+
+    return sorted(paths), ndeferred
+
+
+def get_files(conn, status='new'):
+    """Files with given status"""
+    return [_[0] for _ in conn.execute('SELECT path FROM files WHERE status = ? ORDER BY path', (status,))]
+
+
+def set_status(conn, paths, status):
+    """Sets the status of the files. Commits the state."""
+    conn.executemany('UPDATE files SET status = ?, time = ? WHERE path = ?', [(status, time.time(), _) for _ in paths])
+    conn.commit()
+
+
+def watch(conn, roots, callback, pattern='*.csv', interval=60, min_age=60, verbose=False):
+    """Scans the directory trees continuously, calling callback with the list of new or changed files.
+    Callback should change the status of the files it handled, otherwise they are passed again.
+
+    With inotify_simple available, next scan is started as soon as anything changes in the trees,
+    otherwise they are re-scanned every interval seconds, with known files checked for in-place
+    changes by their modification times and sizes. Never returns.
+    """
+    log = (verbose if callable(verbose) else print) if verbose else lambda *args,**kwargs: None
+
+    inotify, on_dir = None, None
+    # Watched directories, and their watch descriptors
+    watched, dirty = {}, set()
+
+    if inotify_simple is not None:
+        flags = inotify_simple.flags
+        mask = flags.CLOSE_WRITE | flags.MOVED_TO | flags.CREATE | flags.DELETE
+
+        inotify = inotify_simple.INotify()
+
+        def on_dir(dirname):
+            if dirname not in watched:
+                watched[dirname] = inotify.add_watch(dirname, mask)
+    else:
+        log("inotify is not available, will poll")
+
+    while True:
+        # Pending files from previous runs, e.g. if callback failed
+        paths = get_files(conn, 'new')
+        paths = sorted(set(paths + scan(conn, roots, pattern, check_known=inotify is None, min_age=min_age,
+                                        dirty=dirty, on_dir=on_dir, verbose=verbose)[0]))
+
+        if paths:
+            callback(paths)
+
+        if inotify is not None:
+            # Wait for the first event, then for the rest of the burst. Directories with
+            # files changed in place are checked on the next scan
+            events = inotify.read(timeout=interval*1000)
+            if events:
+                events += inotify.read(timeout=0, read_delay=1000)
+            wds = set(_.wd for _ in events)
+            dirty = set(dirname for dirname,wd in watched.items() if wd in wds)
+
+            # Watches of removed directories
+            for dirname in [dirname for dirname,wd in watched.items() if wd in wds and not os.path.isdir(dirname)]:
+                del watched[dirname]
+        else:
+            time.sleep(interval)
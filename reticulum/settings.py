@@ -11,7 +11,7 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
 from pathlib import Path
-from decouple import config # Getting environment from .env
+from decouple import config, Csv # Getting environment from .env
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -43,6 +43,7 @@ INSTALLED_APPS = [
     'crispy_forms',
     'crispy_bootstrap5',
     'el_pagination',
+    'django_celery_results',
     'reticulum',
 ]
 
@@ -96,6 +97,80 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.filebased.FileBasedCache', cast=str),
+        'LOCATION': config('CACHE_LOCATION', default=str(BASE_DIR / 'cache'), cast=str),
+    }
+}
+
+# How long light curves are kept in cache, seconds. They are also invalidated by ingestion of new data
+LC_CACHE_TIMEOUT = config('LC_CACHE_TIMEOUT', default=86400, cast=int)
+
+
+# Celery task queue
+# https://docs.celeryq.dev/en/stable/django/first-steps-with-django.html
+
+CELERY_BROKER_URL = config('CELERY_BROKER_URL', default='redis://localhost:6379/0', cast=str)
+CELERY_RESULT_BACKEND = config('CELERY_RESULT_BACKEND', default='django-db', cast=str)
+CELERY_RESULT_EXTENDED = True
+
+# Run the tasks synchronously in the calling process, e.g. with memory:// broker for tests
+CELERY_TASK_ALWAYS_EAGER = config('CELERY_TASK_ALWAYS_EAGER', default=False, cast=bool)
+CELERY_TASK_EAGER_PROPAGATES = True
+
+# Long tasks are acknowledged only after completion, and are not prefetched,
+# so that they are re-delivered if the worker dies
+CELERY_TASK_ACKS_LATE = True
+CELERY_TASK_REJECT_ON_WORKER_LOST = True
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+
+# CPU-bound calibration and database-bound ingestion run on separate worker pools, e.g.
+# celery -A reticulum.celery worker -Q calibration -c 16
+# celery -A reticulum.celery worker -Q ingestion -c 2
+CELERY_TASK_DEFAULT_QUEUE = 'ingestion'
+CELERY_TASK_ROUTES = {
+    'reticulum.tasks.calibrate_frame': {'queue': 'calibration'},
+    'reticulum.tasks.*': {'queue': 'ingestion'},
+}
+
+# How long the per-frame idempotency keys are kept, seconds
+FRAME_TASK_TIMEOUT = config('FRAME_TASK_TIMEOUT', default=3600, cast=int)
+
+# Cache holding the idempotency keys. It has to be shared by the workers on all hosts and
+# support atomic add(), so Redis or Memcached, not the default file-based cache.
+# Redis broker is used for it by default, and process-local memory for eager or non-Redis setups
+if CELERY_BROKER_URL.startswith(('redis://', 'rediss://')) and not CELERY_TASK_ALWAYS_EAGER:
+    TASK_CACHE_BACKEND = config('TASK_CACHE_BACKEND', default='django.core.cache.backends.redis.RedisCache', cast=str)
+else:
+    TASK_CACHE_BACKEND = config('TASK_CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache', cast=str)
+
+CACHES['tasks'] = {
+    'BACKEND': TASK_CACHE_BACKEND,
+    'LOCATION': config('TASK_CACHE_LOCATION', default=CELERY_BROKER_URL if TASK_CACHE_BACKEND.endswith('RedisCache') else 'tasks', cast=str),
+}
+
+
+# Asynchronous views for ASGI deployment, see views_async.py. Blocking database queries and
+# name resolution run in the pool of this many threads, every one keeping its own database connection
+ASYNC_VIEWS = config('ASYNC_VIEWS', default=False, cast=bool)
+ASYNC_DB_THREADS = config('ASYNC_DB_THREADS', default=8, cast=int)
+
+
+# Target name resolution, see resolver.py. Max time the photometry form waits for the network lookup,
+# seconds, and the number of lookups running in parallel
+RESOLVE_TIMEOUT = config('RESOLVE_TIMEOUT', default=10, cast=float)
+RESOLVE_THREADS = config('RESOLVE_THREADS', default=4, cast=int)
+# How long resolved and unresolved names are kept in cache, seconds
+RESOLVE_CACHE_TIMEOUT = config('RESOLVE_CACHE_TIMEOUT', default=30*86400, cast=int)
+RESOLVE_NEGATIVE_TIMEOUT = config('RESOLVE_NEGATIVE_TIMEOUT', default=3600, cast=int)
+# Additional CSV files with name,ra,dec columns of common targets, like data/targets.csv
+RESOLVE_TARGETS = config('RESOLVE_TARGETS', default='', cast=Csv())
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
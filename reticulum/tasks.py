@@ -0,0 +1,190 @@
+import os
+import hashlib
+
+from celery import shared_task, chain, chord, group
+from celery.utils.log import get_task_logger
+
+from django.conf import settings
+from django.core.cache import caches
+
+from stdpipe.db import DB
+
+from . import ingest, objects
+# Celery app is configured here and not in the package, so that web processes do not need celery installed
+from .celery import app
+
+logger = get_task_logger(__name__)
+
+# Idempotency keys have to be visible to the workers on all hosts, see TASK_CACHE_BACKEND
+cache = caches['tasks']
+
+
+def log(*args, **kwargs):
+    """Print-like logging function for the verbose arguments of processing routines"""
+    logger.info(' '.join(str(_) for _ in args))
+
+# Per-process database connection used by ingestion tasks
+_db = None
+
+
+def get_db():
+    """Database connection of the worker process, re-opened if it was closed"""
+    global _db
+
+    if _db is None or _db.conn.closed:
+        params = settings.DATABASES['default']
+        _db = DB(
+            dbname=params['NAME'],
+            dbhost=params.get('HOST') or None,
+            dbport=int(params['PORT']) if params.get('PORT') else None,
+            dbuser=params.get('USER') or None,
+            dbpassword=params.get('PASSWORD') or None,
+        )
+        _db.conn.autocommit = False
+
+    return _db.conn
+
+
+def get_frame_key(filename, prefix='frame'):
+    """Idempotency key of the file, changing whenever it is modified"""
+    st = os.stat(filename)
+    key = f"{os.path.abspath(filename)}:{st.st_mtime_ns}:{st.st_size}"
+
+    return prefix + ':' + hashlib.sha1(key.encode()).hexdigest()
+
+
+def acquire_frame(task, filename, prefix='frame'):
+    """Marks the file as being processed by the task. Returns False if the same version of the file
+    was already handled by another task, so that duplicate submissions do nothing.
+    Re-delivery of the same task after worker loss is allowed to proceed.
+    """
+    key = get_frame_key(filename, prefix)
+
+    if cache.add(key, task.request.id, timeout=settings.FRAME_TASK_TIMEOUT):
+        return key
+
+    if cache.get(key) == task.request.id:
+        return key
+
+    return None
+
+
+@shared_task(bind=True)
+def calibrate_frame(self, filename, reprocess=False, **kwargs):
+    """Calibrates the SIPS export, returns the name of calibrated file,
+    or None if it was skipped or could not be calibrated.
+    Errors are only logged, so that a single bad frame does not fail the whole batch.
+    """
+    # Top-level script, importable when the worker runs from the project directory
+    from calibrate import process_frame
+
+    key = acquire_frame(self, filename, 'calibrate')
+    if key is None:
+        logger.info(f"{filename} is already being calibrated, skipping")
+        return None
+
+    try:
+        return process_frame(filename, verbose=log, reprocess=reprocess, **kwargs)
+    except Exception:
+        logger.exception(f"Error calibrating {filename}")
+        # Let the failed frame be re-submitted
+        cache.delete(key)
+        return None
+
+
+@shared_task(bind=True)
+def ingest_files(self, filenames):
+    """Ingests the calibrated files into the database in a single transaction, then updates
+    the footprints of their sequences and coverage maps once for the whole batch in a short
+    separate one, like upload.py does, re-tried by update_mocs task if it fails.
+    Returns the list of photometry HEALPix pixels with new data.
+    """
+    if isinstance(filenames, str):
+        filenames = [filenames]
+    # Frames that failed or were skipped in calibration
+    filenames = [_ for _ in filenames or [] if _ is not None]
+
+    keys = [acquire_frame(self, _, 'ingest') for _ in filenames]
+    filenames = [_ for _,key in zip(filenames, keys) if key is not None]
+
+    if not filenames:
+        return []
+
+    conn = get_db()
+
+    try:
+        nframes, nrows, mocs, coverage = ingest.ingest_frames(conn, filenames, update_mocs=False, verbose=log)
+        conn.commit()
+    except:
+        conn.rollback()
+        for key in keys:
+            if key is not None:
+                cache.delete(key)
+        raise
+
+    try:
+        ingest.update_sequence_mocs(conn, mocs, verbose=log)
+        ingest.update_coverage_mocs(conn, coverage, verbose=log)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        logger.exception(f"Error updating footprints of {len(filenames)} files, re-trying separately")
+        # Frames are already committed and would not be ingested again, so only the merge is re-tried
+        update_mocs.delay(encode_mocs(mocs), encode_mocs(coverage))
+        for key in keys:
+            if key is not None:
+                cache.delete(key)
+
+    return objects.get_moc_pixels(coverage.get('all'))
+
+
+def encode_mocs(mocs):
+    """Dict of MOCs as JSON-serializable list of keys and hex strings of their binary form"""
+    return [(key, ingest.moc_to_bytes(moc).hex()) for key,moc in mocs.items()]
+
+
+def decode_mocs(mocs):
+    return {key: ingest.moc_from_bytes(bytes.fromhex(moc)) for key,moc in mocs}
+
+
+@shared_task(bind=True, max_retries=10, default_retry_delay=60)
+def update_mocs(self, mocs, coverage):
+    """Merges the footprints of already ingested frames, serialized by encode_mocs(), into the ones
+    of their sequences and into the coverage maps. Re-tried until it succeeds.
+    """
+    conn = get_db()
+
+    try:
+        ingest.update_sequence_mocs(conn, decode_mocs(mocs), verbose=log)
+        ingest.update_coverage_mocs(conn, decode_mocs(coverage), verbose=log)
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        raise self.retry(exc=e)
+
+
+@shared_task
+def update_objects(pixels):
+    """Associates new detections in the photometry HEALPix pixels with objects.
+    Cached light curves there are invalidated by the association itself.
+    Returns the number of associated detections and new objects.
+    """
+    if not pixels:
+        return 0, 0
+
+    return objects.build_objects(get_db(), pixels, verbose=log)
+
+
+def process_frames(filenames, batch=100, **kwargs):
+    """Submits the SIPS exports for calibration, ingestion and association with objects.
+    Frames are calibrated in parallel on the CPU-bound queue, and every batch of them is then
+    ingested in a single task on the database-bound one, followed by association with objects.
+    Returns the list of async results, one per batch.
+    """
+    return [
+        chord(
+            group(calibrate_frame.s(filename, **kwargs) for filename in filenames[i:i + batch]),
+            chain(ingest_files.s(), update_objects.s())
+        ).apply_async()
+        for i in range(0, len(filenames), batch)
+    ]
@@ -25,18 +25,33 @@ from django.contrib.auth import views as auth_views
 from . import views
 from . import views_photometry
 
+# Asynchronous versions of photometry and coverage views for ASGI deployment
+if settings.ASYNC_VIEWS:
+    from . import views_async
+    views_lc = views_coverage = views_async
+else:
+    views_lc, views_coverage = views_photometry, views
+
 urlpatterns = [
     path('', views.index, name='index'),
 
     # Photometry
-    path(r'photometry/', views_photometry.photometry, name='photometry'),
-    path(r'photometry/lc', views_photometry.lc, {'mode': 'jpeg'}, name='photometry_lc'),
-    path(r'photometry/json', views_photometry.lc, {'mode': 'json'}, name='photometry_json'),
-    path(r'photometry/text', views_photometry.lc, {'mode': 'text'}, name='photometry_text'),
-    path(r'photometry/mjd', views_photometry.lc, {'mode': 'mjd'}, name='photometry_mjd'),
+    path(r'photometry/', views_lc.photometry, name='photometry'),
+    path(r'photometry/lc', views_lc.lc, {'mode': 'jpeg'}, name='photometry_lc'),
+    path(r'photometry/json', views_lc.lc, {'mode': 'json'}, name='photometry_json'),
+    path(r'photometry/text', views_lc.lc_export, {'format': 'text'}, name='photometry_text'),
+    path(r'photometry/mjd', views_lc.lc_export, {'format': 'mjd'}, name='photometry_mjd'),
+    path(r'photometry/csv', views_lc.lc_export, {'format': 'csv'}, name='photometry_csv'),
+    path(r'photometry/votable', views_lc.lc_export, {'format': 'votable'}, name='photometry_votable'),
+    path(r'photometry/parquet', views_lc.lc_export, {'format': 'parquet'}, name='photometry_parquet'),
+    path(r'photometry/variability', views_lc.lc_variability, name='photometry_variability'),
+    path(r'photometry/objects', views_lc.objects_search, name='photometry_objects'),
+    path(r'photometry/batch', views_lc.lc_batch, name='photometry_batch'),
 
     # Coverage
-    path(r'coverage/all', views.coverage, name='coverage_all'),
+    path(r'coverage/', views_coverage.coverage_list, name='coverage_list'),
+    path(r'coverage/all', views_coverage.coverage, name='coverage_all'),
+    path(r'coverage/<path:name>', views_coverage.coverage, name='coverage'),
 
     # Auth
     path('login/', auth_views.LoginView.as_view(), name='login'),
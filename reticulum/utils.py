@@ -1,5 +1,8 @@
 import numpy as np
 import json
+import time
+import resource
+import contextlib
 
 
 class NumpyEncoder(json.JSONEncoder):
@@ -27,3 +30,33 @@ class NumpyEncoder(json.JSONEncoder):
             return None
 
         return json.JSONEncoder.default(self, obj)
+
+
+class StageTimer:
+    """Collects wall and CPU times, peak memory and row counts of named processing stages.
+    Peak memory is the one of the whole process up to the end of the stage, not of the stage itself.
+
+    Usage:
+        timer = StageTimer()
+        with timer('read') as stage:
+            obj = read()
+            stage['rows'] = len(obj)
+    """
+    def __init__(self):
+        self.stages = {}
+
+    @contextlib.contextmanager
+    def __call__(self, name):
+        stage = self.stages.setdefault(name, {'wall': 0.0, 'cpu': 0.0})
+        wall0, cpu0 = time.perf_counter(), time.process_time()
+
+        try:
+            yield stage
+        finally:
+            stage['wall'] += time.perf_counter() - wall0
+            stage['cpu'] += time.process_time() - cpu0
+            # Peak resident memory of the process since its start, MB, as seen after the stage
+            stage['maxrss'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss/1024
+
+    def total(self, key='wall'):
+        return sum(_.get(key, 0) for _ in self.stages.values())
@@ -0,0 +1,236 @@
+import numpy as np
+
+from astropy.timeseries import LombScargle
+from astropy_healpix import HEALPix
+
+import psycopg2.extras
+
+from . import ingest
+
+# Names of variability indices returned by variability_indices()
+variability_columns = ['nmeas', 'wmean', 'wstd', 'chi2dof', 'iqr', 'eta', 'stetson_j']
+
+
+def _group_quantile(values, start, counts, q):
+    """Quantiles of the values sorted within contiguous groups, with linear interpolation"""
+    result = np.full(len(counts), np.nan)
+    good = counts > 0
+
+    pos = start[good] + q*(counts[good] - 1)
+    lo = np.floor(pos).astype(np.int64)
+    hi = np.ceil(pos).astype(np.int64)
+
+    result[good] = values[lo] + (pos - lo)*(values[hi] - values[lo])
+
+    return result
+
+
+def variability_indices(times, mags, magerrs, groups=None, ngroups=None):
+    """Variability indices for many light curves at once.
+
+    Light curves are defined by group labels (0..ngroups-1) of the points, and all indices
+    are computed with vectorized per-group sums. Returns the dict of arrays with one value
+    per group for every name in variability_columns: number of points, weighted mean and
+    standard deviation, reduced chi2 with respect to the weighted mean, interquartile range,
+    von Neumann ratio eta, and Stetson J index for consecutive pairs of points.
+    """
+    times, mags, magerrs = [np.asarray(_, dtype=np.float64) for _ in (times, mags, magerrs)]
+    groups = np.zeros(len(mags), dtype=np.int64) if groups is None else np.asarray(groups, dtype=np.int64)
+
+    if ngroups is None:
+        ngroups = groups.max() + 1 if len(groups) else 0
+
+    idx = np.isfinite(times) & np.isfinite(mags) & np.isfinite(magerrs) & (magerrs > 0)
+
+    # Points ordered by time within every group
+    order = np.lexsort((times[idx], groups[idx]))
+    t, m, e, g = [_[idx][order] for _ in (times, mags, magerrs, groups)]
+
+    def gsum(x, labels=g):
+        return np.bincount(labels, weights=x, minlength=ngroups)
+
+    n = np.bincount(g, minlength=ngroups).astype(np.float64)
+    w = 1/e**2
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        wmean = gsum(w*m) / gsum(w)
+        dm = m - wmean[g]
+
+        chi2dof = gsum(w*dm**2) / (n - 1)
+        wstd = np.sqrt(gsum(w*dm**2) / gsum(w) * n / (n - 1))
+
+        mean = gsum(m) / n
+        var = gsum((m - mean[g])**2) / (n - 1)
+
+        # Consecutive pairs within the same group
+        same = g[1:] == g[:-1]
+        gp = g[1:][same]
+
+        eta = gsum(np.diff(m)[same]**2, gp) / (n - 1) / var
+
+        delta = np.sqrt(n/(n - 1))[g] * dm / e
+        prod = (delta[1:]*delta[:-1])[same]
+        stetson_j = gsum(np.sign(prod)*np.sqrt(np.abs(prod)), gp) / np.bincount(gp, minlength=ngroups)
+
+    # Interquartile range from the points sorted by magnitude within every group
+    ms = m[np.lexsort((m, g))]
+    start = np.cumsum(n).astype(np.int64) - n.astype(np.int64)
+    iqr = _group_quantile(ms, start, n.astype(np.int64), 0.75) - _group_quantile(ms, start, n.astype(np.int64), 0.25)
+
+    return {
+        'nmeas': n.astype(np.int64), 'wmean': wmean, 'wstd': wstd, 'chi2dof': chi2dof,
+        'iqr': iqr, 'eta': eta, 'stetson_j': stetson_j,
+    }
+
+
+def periodogram(times, mags, magerrs, filters=None, min_period=0.05, max_period=None,
+                samples_per_peak=5, max_frequencies=100000, min_points=10):
+    """Lomb-Scargle periodogram of the light curve, with times in days.
+
+    Points in different filters are combined after subtracting per-filter weighted means,
+    which is the simplest form of multi-band periodogram. The frequency grid spans from
+    1/max_period (or inverse time span) to 1/min_period, and is coarsened if necessary to
+    keep it below max_frequencies. Returns the dict with the best period, its power and
+    false alarm probability, and the periodogram itself, or None if there are not enough points.
+    """
+    times, mags, magerrs = [np.asarray(_, dtype=np.float64) for _ in (times, mags, magerrs)]
+    filters = np.zeros(len(mags), dtype=int) if filters is None else np.asarray(filters)
+
+    idx = np.isfinite(times) & np.isfinite(mags) & np.isfinite(magerrs) & (magerrs > 0)
+
+    if np.sum(idx) < min_points:
+        return None
+
+    t, m, e, f = times[idx], mags[idx], magerrs[idx], filters[idx]
+
+    _,groups = np.unique(f, return_inverse=True)
+    groups = groups.ravel()
+    w = 1/e**2
+    m = m - (np.bincount(groups, weights=w*m) / np.bincount(groups, weights=w))[groups]
+
+    span = np.ptp(t)
+    if span <= min_period:
+        return None
+
+    fmin = 1/(max_period or span)
+    fmax = 1/min_period
+    nfreq = int(min(max_frequencies, max(100, samples_per_peak*span*(fmax - fmin))))
+
+    frequency = np.linspace(fmin, fmax, nfreq)
+
+    ls = LombScargle(t, m, e)
+    power = ls.power(frequency, method='fast', assume_regular_frequency=True)
+
+    best = np.argmax(power)
+
+    return {
+        'period': 1/frequency[best],
+        'power': power[best],
+        'fap': ls.false_alarm_probability(power[best], minimum_frequency=fmin, maximum_frequency=fmax),
+        'frequency': frequency,
+        'periodogram': power,
+    }
+
+
+def analyze_lc(times, mags, magerrs, filters, **kwargs):
+    """Variability indices for every filter, and the periodogram of the whole light curve"""
+    filters = np.asarray(filters)
+    fnames,groups = np.unique(filters, return_inverse=True)
+
+    indices = variability_indices(times, mags, magerrs, groups.ravel(), ngroups=len(fnames))
+
+    return {
+        'filters': {fn: {name: indices[name][i] for name in variability_columns} for i,fn in enumerate(fnames)},
+        'periodogram': periodogram(times, mags, magerrs, filters, **kwargs),
+    }
+
+
+def analyze_pixel(conn, ipix, min_points=10, min_chi2dof=3, **kwargs):
+    """Computes variability indices for all objects with centers in the photometry HEALPix pixel,
+    and periods for the candidate variables among them, with reduced chi2 above min_chi2dof in
+    any filter, as the periodogram is much more expensive than the indices. Stores them in
+    object_stats and objects tables. Returns the number of objects. Does not commit the transaction.
+    """
+    ipix = int(ipix)
+
+    # Detections of the objects may lie in the neighbouring pixels, or in their neighbours
+    hp = HEALPix(2**ingest.photometry_hpx_order, order='nested')
+    pixels = np.unique(np.concatenate([[ipix], hp.neighbours(ipix).ravel()]))
+    pixels = np.unique(np.concatenate([pixels, hp.neighbours(pixels[pixels >= 0]).ravel()]))
+    pixels = [int(_) for _ in pixels if _ >= 0]
+
+    cur = conn.cursor()
+    cur.execute(
+        "SELECT p.object, p.filter, EXTRACT(EPOCH FROM f.time)/86400 + 40587, p.mag, p.magerr "
+        "FROM photometry p JOIN frames f ON f.id = p.frame JOIN objects o ON o.id = p.object "
+        "WHERE o.hpx = %s AND p.hpx = ANY(%s) AND p.mag <> 'NaN'",
+        (ipix, pixels)
+    )
+    res = cur.fetchall()
+
+    if not res:
+        return 0
+
+    obj, filt, mjd, mag, magerr = [np.array(_) for _ in zip(*res)]
+    mjd, mag, magerr = [_.astype(np.float64) for _ in (mjd, mag, magerr)]
+
+    # Indices for every object and filter at once
+    keys,groups = np.unique(np.stack([obj, filt], axis=1), axis=0, return_inverse=True)
+    indices = variability_indices(mjd, mag, magerr, groups.ravel(), ngroups=len(keys))
+
+    def value(x):
+        return float(x) if np.isfinite(x) else None
+
+    psycopg2.extras.execute_values(
+        cur,
+        'UPDATE object_stats SET wstd = v.wstd, chi2dof = v.chi2dof, iqr = v.iqr, eta = v.eta, stetson_j = v.stetson_j '
+        'FROM (VALUES %s) AS v (object, filter, wstd, chi2dof, iqr, eta, stetson_j) '
+        'WHERE object_stats.object = v.object AND object_stats.filter = v.filter',
+        [(int(key[0]), int(key[1])) + tuple(value(indices[name][i]) for name in ['wstd', 'chi2dof', 'iqr', 'eta', 'stetson_j'])
+         for i,key in enumerate(keys)],
+        template='(%s, %s, %s::real, %s::real, %s::real, %s::real, %s::real)',
+    )
+
+    # Periods for candidate variables with enough points, the ones of other objects are reset
+    candidates = np.unique(keys[indices['chi2dof'] > min_chi2dof, 0])
+    cur.execute(
+        'UPDATE objects SET period = NULL, period_power = NULL, period_fap = NULL '
+        'WHERE hpx = %s AND period IS NOT NULL AND id <> ALL(%s)',
+        (ipix, [int(_) for _ in candidates])
+    )
+
+    idx = np.flatnonzero(np.isin(obj, candidates))
+    order = idx[np.argsort(obj[idx], kind='stable')]
+    oids,start = np.unique(obj[order], return_index=True)
+
+    rows = []
+    for oid,idx in zip(oids, np.split(order, start[1:])):
+        res = periodogram(mjd[idx], mag[idx], magerr[idx], filt[idx], min_points=min_points, **kwargs)
+        if res is not None:
+            rows.append((int(oid), float(res['period']), float(res['power']), float(res['fap'])))
+
+    if rows:
+        psycopg2.extras.execute_values(
+            cur,
+            'UPDATE objects SET period = v.period, period_power = v.power, period_fap = v.fap '
+            'FROM (VALUES %s) AS v (id, period, power, fap) WHERE objects.id = v.id',
+            rows,
+        )
+
+    return len(np.unique(keys[:, 0]))
+
+
+def migrate_variability(conn, verbose=False):
+    """Adds variability columns to existing object tables. Does not commit the transaction."""
+    log = (verbose if callable(verbose) else print) if verbose else lambda *args,**kwargs: None
+
+    cur = conn.cursor()
+
+    for name in ['wstd', 'chi2dof', 'iqr', 'eta', 'stetson_j']:
+        cur.execute(f'ALTER TABLE object_stats ADD COLUMN IF NOT EXISTS {name} REAL')
+
+    cur.execute('ALTER TABLE objects ADD COLUMN IF NOT EXISTS period FLOAT')
+    cur.execute('ALTER TABLE objects ADD COLUMN IF NOT EXISTS period_power REAL')
+    cur.execute('ALTER TABLE objects ADD COLUMN IF NOT EXISTS period_fap REAL')
+
+    log("Added variability columns")
@@ -1,4 +1,5 @@
-from django.http import HttpResponse, FileResponse, HttpResponseRedirect
+from django.http import HttpResponse, FileResponse, HttpResponseRedirect, JsonResponse, Http404
+from django.views.decorators.http import condition
 from django.template.response import TemplateResponse
 from django.urls import reverse
 from django.conf import settings
@@ -10,8 +11,6 @@ from django.contrib.auth.decorators import login_required
 import os, io
 import shutil
 
-from mocpy import MOC
-
 from . import models
 
 
@@ -21,25 +20,36 @@ def index(request):
     return TemplateResponse(request, 'index.html', context=context)
 
 
-def coverage(request, seq_id=None, frame_id=None):
-    moc0 = None
+def get_coverage_etag(request, name='all'):
+    version = models.Coverage.objects.filter(name=name).values_list('version', flat=True).first()
+
+    if version is not None:
+        return '"%s:%d"' % (name, version)
+
+
+def get_coverage_time(request, name='all'):
+    return models.Coverage.objects.filter(name=name).values_list('time', flat=True).first()
+
+
+@condition(etag_func=get_coverage_etag, last_modified_func=get_coverage_time)
+def coverage(request, name='all'):
+    """Precomputed coverage MOC as FITS file, maintained incrementally during the ingestion"""
+    data = models.Coverage.objects.filter(name=name).values_list('moc', flat=True).first()
+
+    if data is None:
+        raise Http404(f"No coverage {name}")
+
+    data = bytes(data)
 
-    for seq in models.Sequences.objects.all():
-        moc = MOC.from_string(seq.moc)
+    response = HttpResponse(data, content_type='application/octet-stream')
+    response['Content-Disposition'] = 'attachment; filename=coverage_' + name.replace('/', '_') + '.fits'
+    response['Content-Length'] = len(data)
 
-        if moc0 is None:
-            moc0 = moc
-        else:
-            moc0 = moc0.union(moc)
+    return response
 
-    if moc0 is not None:
-        s = io.BytesIO()
-        hdus = moc0.serialize(format='fits')
-        hdus.writeto(s)
 
-        response = HttpResponse(s.getvalue(), content_type='application/octet-stream')
-        # response['Content-Disposition'] = 'attachment; filename=' + os.path.split(filename)[-1] + '.processed.fits'
-        response['Content-Length'] = len(s.getvalue())
-        return response
+def coverage_list(request):
+    """List of available coverage maps with their versions and update times"""
+    coverages = models.Coverage.objects.exclude(moc=None).order_by('name').values('name', 'version', 'time')
 
-    return HttpResponse('coverage', content_type='text/plain')
+    return JsonResponse({'coverage': list(coverages)})
@@ -0,0 +1,128 @@
+"""Asynchronous versions of the light curve, coverage and photometry form views for ASGI deployment.
+
+Blocking parts - database queries, rendering and name resolution - run in a bounded thread pool,
+so that a slow cone query or resolver call occupies only one of its threads instead of the
+single thread Django uses for all synchronous views under ASGI. Network lookups of the resolver
+are bounded in time by the resolver itself.
+"""
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.views.decorators.csrf import csrf_exempt
+
+import asyncio
+import functools
+
+from concurrent.futures import ThreadPoolExecutor
+
+from . import forms
+from . import resolver
+from . import views
+from . import views_photometry
+
+db_executor = ThreadPoolExecutor(max_workers=settings.ASYNC_DB_THREADS, thread_name_prefix='reticulum-db')
+
+
+def _call(func, *args, **kwargs):
+    """Runs the function in the pool thread, handling its database connection like a request would"""
+    close_old_connections()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+async def run_blocking(func, *args, executor=db_executor, timeout=None, **kwargs):
+    """Runs blocking function in the thread pool, optionally raising asyncio.TimeoutError
+    if it does not finish in timeout seconds. The thread itself is not interrupted then."""
+    loop = asyncio.get_running_loop()
+    future = loop.run_in_executor(executor, functools.partial(_call, func, *args, **kwargs))
+
+    if timeout:
+        return await asyncio.wait_for(future, timeout)
+    else:
+        return await future
+
+
+async def iterate_blocking(iterator, maxsize=2):
+    """Async iterator over the items of blocking iterator, consumed in a single pool thread so that
+    its database cursor stays with the connection it was opened on. At most maxsize items are
+    read ahead of the client. The generator is closed in the same thread when the client stops reading."""
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue(maxsize=maxsize)
+    done, stopped = object(), False
+
+    def produce():
+        try:
+            for item in iterator:
+                asyncio.run_coroutine_threadsafe(queue.put(item), loop).result()
+                if stopped:
+                    break
+        except Exception as e:
+            item = e
+        else:
+            item = done
+        finally:
+            # Releases the server-side cursor right away, on the connection it was opened with
+            iterator.close()
+
+        if not stopped:
+            asyncio.run_coroutine_threadsafe(queue.put(item), loop).result()
+
+    producer = loop.run_in_executor(db_executor, functools.partial(_call, produce))
+
+    try:
+        while (item := await queue.get()) is not done:
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        # Client went away - let the producer finish its pending put and stop
+        stopped = True
+        while not queue.empty():
+            queue.get_nowait()
+        await producer
+
+
+def offload(view):
+    """Async version of the blocking view, running it as a whole in the thread pool"""
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        return await run_blocking(view, request, *args, **kwargs)
+
+    return wrapper
+
+
+@csrf_exempt
+async def lc_export(request, format='text'):
+    response = await run_blocking(views_photometry.lc_export, request, format=format, stream=iterate_blocking)
+
+    return response
+
+
+@csrf_exempt
+async def lc(request, mode='jpeg', size=800):
+    if mode in views_photometry.lc_export_formats:
+        return await lc_export(request, format=mode)
+
+    return await run_blocking(views_photometry.lc, request, mode=mode, size=size)
+
+
+lc_variability = offload(views_photometry.lc_variability)
+lc_batch = offload(views_photometry.lc_batch)
+objects_search = offload(views_photometry.objects_search)
+
+coverage = offload(views.coverage)
+coverage_list = offload(views.coverage_list)
+
+
+async def photometry(request):
+    form = forms.PhotometryForm(request.POST or None)
+
+    target = None
+
+    if request.method == 'POST' and form.is_valid():
+        # Resolver bounds the time of network lookups itself
+        target = await run_blocking(resolver.resolve, form.cleaned_data.get('target'))
+
+    return views_photometry.photometry_response(request, form, target)
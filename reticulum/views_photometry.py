@@ -1,27 +1,36 @@
-from django.http import HttpResponse, FileResponse
+from django.http import HttpResponse, FileResponse, StreamingHttpResponse, JsonResponse, Http404
 from django.template.response import TemplateResponse
 from django.shortcuts import redirect
 from django.views.decorators.cache import cache_page
 from django.views.decorators.csrf import csrf_protect, csrf_exempt, ensure_csrf_cookie
 from django.db.models import Q
+from django.db import connection, transaction
 from django.urls import reverse
 from django.contrib import messages
+from django.core.cache import cache
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
 
-from matplotlib.backends.backend_agg import FigureCanvasAgg as FigureCanvas
-from matplotlib.figure import Figure
 import numpy as np
 import json
+import os
+import io
 
 from urllib.parse import urlencode
 
 from astropy.time import Time
+from astropy.table import Table
 from astropy.stats import mad_std
 
-from stdpipe import resolve
-
 from . import models
 from . import forms
 from . import utils
+from . import ingest
+from . import objects
+from . import variability
+from . import plots
+from . import resolver
+from . import encoding
 
 
 def radectoxieta(ra, dec, ra0=0, dec0=0):
@@ -44,85 +53,292 @@ def radectoxieta(ra, dec, ra0=0, dec0=0):
     return xi,eta
 
 
-def get_lc(request):
-    lc = models.Photometry.objects.order_by('time')
+def get_lc_params(request):
+    """Normalized parameters of the light curve query, suitable for use as a cache key"""
+    params = {}
+
+    obj = request.GET.get('object')
+    params['object'] = int(obj) if obj else None
+
+    if params['object'] and not request.GET.get('ra'):
+        # Center on the object
+        obj = models.Objects.objects.filter(id=params['object']).values_list('ra', 'dec').first()
+        if obj is None:
+            raise Http404(f"No object {params['object']}")
+        ra, dec = obj
+    else:
+        ra, dec = request.GET.get('ra'), request.GET.get('dec')
+
+    # Coordinates rounded to ~0.04 arcsec, radius (in arcsec) to 0.01 arcsec
+    params['ra'] = round(float(ra), 5)
+    params['dec'] = round(float(dec), 5)
+    params['sr'] = round(float(request.GET.get('sr', 0.01)), 2)
 
     magerr = request.GET.get('magerr')
-    if magerr:
-        magerr = float(magerr)
-        lc = lc.filter(magerr__lt=magerr)
+    params['magerr'] = float(magerr) if magerr else None
 
-    filt = request.GET.get('filter')
-    if filt:
-        lc = lc.filter(filter=filt+'mag')
+    params['filter'] = request.GET.get('filter') or None
+
+    return params
 
-    ra = float(request.GET.get('ra'))
-    dec = float(request.GET.get('dec'))
-    sr = float(request.GET.get('sr', 0.01))
+
+def get_lc(request, params=None):
+    if params is None:
+        params = get_lc_params(request)
+
+    lc = models.Photometry.objects.order_by('frame__time')
+
+    if params['magerr']:
+        lc = lc.filter(magerr__lt=params['magerr'])
+
+    if params['filter']:
+        lc = lc.filter(filter__name=params['filter']+'mag')
+
+    ra, dec, sr = params['ra'], params['dec'], params['sr']
+
+    if params['object']:
+        # All detections associated with the object, using the index
+        return lc.filter(object=params['object'])
 
     # Lc with centers within given search radius
-    lc = lc.extra(where=["q3c_radial_query(ra, dec, %s, %s, %s)"], params=(ra, dec, sr/3600))
+    lc = lc.extra(where=["q3c_radial_query(photometry.ra, photometry.dec, %s, %s, %s)"], params=(ra, dec, sr/3600))
+
+    # Explicit list of sky regions lets the planner skip irrelevant partitions
+    lc = lc.filter(hpx__in=ingest.get_photometry_hpx_cone(ra, dec, sr/3600))
 
     return lc
 
 
-from scipy.optimize import minimize
+# Columns of the light curve as returned by get_lc_data(), with corresponding model fields and types
+lc_columns = [
+    ('time', 'frame__time', 'datetime64[us]'),
+    ('filter', 'filter__name', 'U'),
+    ('ra', 'ra', 'f8'),
+    ('dec', 'dec', 'f8'),
+    ('mag', 'mag', 'f8'),
+    ('magerr', 'magerr', 'f8'),
+    ('flags', 'flags', 'i8'),
+    ('fwhm', 'fwhm', 'f8'),
+    ('color_term', 'color_term', 'f8'),
+    ('color_term2', 'color_term2', 'f8'),
+    ('seq_id', 'sequence_id', 'i8'),
+    ('site', 'sequence__site', 'U'),
+    ('observer', 'sequence__observer', 'U'),
+    ('ofilter', 'frame__filter', 'U'),
+    ('exposure', 'frame__exposure', 'f8'),
+]
+
+
+def _column_to_array(values, dtype):
+    if dtype == 'U':
+        return np.array(['' if _ is None else _ for _ in values], dtype=str)
+    elif dtype == 'i8':
+        return np.array([0 if _ is None else _ for _ in values], dtype=np.int64)
+    else:
+        # None becomes NaN or NaT here
+        return np.array(values, dtype=dtype)
+
+
+def _make_lc_data(columns):
+    """Converts the list of value sequences for lc_columns into the dict of numpy arrays"""
+    data = {name: _column_to_array(values, dtype) for (name,field,dtype),values in zip(lc_columns, columns)}
+
+    # Times are stored as UTC
+    data['mjd'] = (data['time'] - np.datetime64('1858-11-17', 'us')) / np.timedelta64(86400000000, 'us')
+
+    return data
+
+
+def fetch_lc_data(request, params=None):
+    """Fetches the light curve as a dict of typed numpy arrays, using a single joined query"""
+    lc = get_lc(request, params=params).values_list(*[_[1] for _ in lc_columns])
+
+    # Raw cursor avoids constructing model instances or converting the values row by row
+    sql, params = lc.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+
+    columns = list(zip(*rows)) if rows else [[] for _ in lc_columns]
+
+    return _make_lc_data(columns)
+
+
+def get_lc_version(params):
+    """Version stamp of sky regions the light curve with given parameters may get new data from"""
+    # New detections of the object may appear anywhere within association radius from it
+    sr = max(params['sr']/3600, 2*objects.object_match_radius) if params['object'] else params['sr']/3600
+
+    with connection.cursor() as cursor:
+        return ingest.get_sky_version(cursor, params['ra'], params['dec'], sr)
+
+
+def get_lc_cache_key(params, prefix='lc', version=None):
+    """Cache key for the light curve with given parameters, changing whenever new data
+    is ingested in its sky region. Version stamp is looked up unless given"""
+    if version is None:
+        version = get_lc_version(params)
+
+    return prefix + ':' + ':'.join(str(params[_]) for _ in ['ra', 'dec', 'sr', 'filter', 'magerr', 'object']) + f":{version}"
+
+
+def get_lc_data(request, params=None, version=None):
+    """Cached version of fetch_lc_data().
+
+    The key includes normalized query parameters and the version stamp of sky regions
+    overlapping the cone, which is bumped by ingestion, so new data appears immediately
+    without flushing the whole cache.
+    """
+    if params is None:
+        params = get_lc_params(request)
+    key = get_lc_cache_key(params, version=version)
 
-def get_bv(mags, magerrs, fnames, color_terms, color_terms2):
-    def fn(bvs):
-        results = []
+    data = cache.get(key)
 
-        for bv in bvs:
-            value = 0
-            for fn in np.unique(fnames):
-                idx = fnames == fn
-                idx &= np.isfinite(mags)
-                mag = mags[idx]
-                magerr = magerrs[idx]
-                mag += color_terms[idx]*bv + color_terms2[idx]*bv**2
+    if data is None:
+        data = fetch_lc_data(request, params=params)
+        cache.set(key, data, timeout=settings.LC_CACHE_TIMEOUT)
 
-                value += np.sum((mag - np.mean(mag))**2 / magerr**2)
+    return data
 
-            results.append(np.sqrt(value))
 
-        return results
+def get_bv(mags, magerrs, fnames, color_terms, color_terms2, bv0=1.0):
+    """Estimates B-V color that minimizes the weighted scatter of color-corrected magnitudes
+    around their mean within every filter.
 
-    res = minimize(fn, [1.0], tol=1e-12)
+    The objective is a quartic polynomial in B-V, so its coefficients are computed once
+    with per-filter sums, and the minimum is found analytically among the roots of its
+    derivative. Returns B-V and its uncertainty, estimated from the curvature of the
+    objective and scaled by reduced chi2 if it is larger than unity. If the objective does
+    not depend on B-V, returns bv0 and NaN.
+    """
+    mags, magerrs, fnames, color_terms, color_terms2 = [
+        np.asarray(_) for _ in (mags, magerrs, fnames, color_terms, color_terms2)
+    ]
+
+    idx = np.isfinite(mags) & np.isfinite(magerrs) & (magerrs > 0)
+    idx &= np.isfinite(color_terms) & np.isfinite(color_terms2)
+
+    if not np.any(idx):
+        return bv0, np.nan
+
+    _,groups = np.unique(fnames[idx], return_inverse=True)
+    groups = groups.ravel()
+    counts = np.bincount(groups)
+
+    def center(x):
+        return x - (np.bincount(groups, weights=x) / counts)[groups]
+
+    # Residuals from per-filter means are a + b*bv + c*bv**2
+    a = center(mags[idx])
+    b = center(color_terms[idx])
+    c = center(color_terms2[idx])
+    w = 1/magerrs[idx]**2
+
+    if np.all(np.abs(b) < 1e-10) and np.all(np.abs(c) < 1e-10):
+        # Color terms are the same for all points in every filter, B-V is undefined
+        return bv0, np.nan
+
+    # Coefficients of sum(w*(a + b*bv + c*bv**2)**2), highest power first
+    poly = np.array([
+        np.sum(w*c*c),
+        2*np.sum(w*b*c),
+        np.sum(w*(b*b + 2*a*c)),
+        2*np.sum(w*a*b),
+        np.sum(w*a*a),
+    ])
+
+    roots = np.roots(np.polyder(poly))
+    roots = roots[np.abs(roots.imag) <= 1e-8*np.maximum(1, np.abs(roots.real))].real
+
+    if not len(roots):
+        return bv0, np.nan
+
+    bv = roots[np.argmin(np.polyval(poly, roots))]
+
+    chi2 = np.polyval(poly, bv)
+    curvature = np.polyval(np.polyder(poly, 2), bv)
+    dof = np.sum(idx) - len(counts) - 1
+
+    if curvature > 0 and dof > 0:
+        bverr = np.sqrt(2/curvature * max(1, chi2/dof))
+    else:
+        bverr = np.nan
+
+    return bv, bverr
+
+
+def get_plot_cache_key(request, params, format, size, version=None):
+    """Cache key for the rendered light curve, changing whenever new data is ingested in its sky region"""
+    extra = [format, size] + [request.GET.get(_) for _ in ['bv', 'name', 'sr']]
+
+    return get_lc_cache_key(params, prefix='plot', version=version) + ':' + ':'.join(str(_) for _ in extra)
+
+
+# Decimal places of numeric columns in JSON light curves, integer ones are kept as is
+lc_json_precision = {
+    'mjd': 7, 'xi': 3, 'eta': 3, 'mag': 4, 'magerr': 4, 'fwhm': 2,
+    'color_term': 5, 'color_term2': 5, 'exposure': 2,
+}
 
-    return res['x'][0]
 
 @csrf_exempt
 def lc(request, mode="jpg", size=800):
-    lc = get_lc(request)
-
-    times = np.array([_.time for _ in lc])
-    filters = np.array([_.filter for _ in lc])
-    ras = np.array([_.ra for _ in lc])
-    decs = np.array([_.dec for _ in lc])
-    mags = np.array([_.mag for _ in lc])
-    magerrs = np.array([_.magerr for _ in lc])
-    flags = np.array([_.flags for _ in lc])
-    fwhms = np.array([_.fwhm for _ in lc])
-    color_terms = np.array([_.color_term for _ in lc])
-    color_terms2 = np.array([_.color_term2 for _ in lc])
-
-    seq_ids = np.array([_.sequence.id for _ in lc])
-    sites = np.array([_.sequence.site for _ in lc])
-    observers = np.array([_.sequence.observer for _ in lc])
-    ofilters = np.array([_.frame.filter for _ in lc])
-    exposures = np.array([_.frame.exposure for _ in lc])
-
-    mjds = Time(times).mjd if len(times) else []
+    if mode in lc_export_formats:
+        return lc_export(request, format=mode)
+
+    # Parsed and versioned once, so that the keys of the plot and the data agree
+    params = get_lc_params(request)
+    version = get_lc_version(params)
+
+    if mode in plots.plot_formats:
+        # Image format and size may be requested explicitly
+        if request.GET.get('format') in plots.plot_formats:
+            mode = request.GET.get('format')
+        size = min(max(int(request.GET.get('size', size)), 100), 4000)
+
+        plot_key = get_plot_cache_key(request, params, mode, size, version=version)
+        content = cache.get(plot_key)
+
+        if content is not None:
+            return HttpResponse(content, content_type=plots.plot_formats[mode])
+
+    data = get_lc_data(request, params=params, version=version)
+
+    times = data['time']
+    filters = data['filter']
+    ras = data['ra']
+    decs = data['dec']
+    mags = data['mag']
+    magerrs = data['magerr']
+    flags = data['flags']
+    fwhms = data['fwhm']
+    color_terms = data['color_term']
+    color_terms2 = data['color_term2']
+
+    seq_ids = data['seq_id']
+    sites = data['site']
+    observers = data['observer']
+    ofilters = data['ofilter']
+    exposures = data['exposure']
+
+    mjds = data['mjd']
 
     bv = request.GET.get('bv')
     if bv is not None:
         bv = float(bv)
+        bverr = None
     else:
-        bv = get_bv(mags, magerrs, filters, color_terms, color_terms2)
+        bv,bverr = get_bv(mags, magerrs, filters, color_terms, color_terms2)
+        if not np.isfinite(bverr):
+            bverr = None
 
     mags += color_terms * bv
     mags += color_terms2 * bv**2
 
+    # Colors of the points, looked up once per unique filter
+    fnames,finverse = np.unique(filters, return_inverse=True)
+    finverse = finverse.ravel()
     cols = np.array([{
         'Bmag':'blue',
         'Vmag':'green',
@@ -132,10 +348,10 @@ def lc(request, mode="jpg", size=800):
         'rmag':'darkred',
         'imag':'darkorange',
         'zmag':'magenta',
-    }.get(_, 'black') for _ in filters])
+    }.get(_, 'black') for _ in fnames] + ['black'])[finverse]  # Extra item keeps it a string array when empty
 
-    ra = float(request.GET.get('ra'))
-    dec = float(request.GET.get('dec'))
+    ra = params['ra']
+    dec = params['dec']
     sr = float(request.GET.get('sr', 1/3600))
     name = request.GET.get('name')
 
@@ -157,110 +373,568 @@ def lc(request, mode="jpg", size=800):
         title = ''
 
     title += '%.4f %.3f %.1f"  :  %d pts  :  B-V = %.2f' % (ra, dec, sr, len(mags), bv)
+    if bverr is not None:
+        title += ' +/- %.2f' % bverr
 
     xi,eta = radectoxieta(ras, decs, ra, dec)
     xi *= 3600
     eta *= 3600
 
-    if mode == 'jpeg':
-        # Plot lc
-        fig = Figure(facecolor='white', dpi=72, figsize=(size/72,0.5*size/72), tight_layout=True)
-        ax = fig.add_subplot(111)
-        ax.grid(True, alpha=0.1, color='gray')
+    if mode in plots.plot_formats:
+        # Filters with less than two good points are not shown
+        idx = idx0 & (np.bincount(finverse[idx0], minlength=len(fnames)) >= 2)[finverse]
+
+        content = plots.render_lc(times[idx], mags[idx], magerrs[idx], cols[idx], title=title, size=size, format=mode, groups=filters[idx])
+        cache.set(plot_key, content, timeout=settings.LC_CACHE_TIMEOUT)
+
+        return HttpResponse(content, content_type=plots.plot_formats[mode])
+
+    elif mode == 'json':
+        # Good points of every filter and sequence, grouped together, keeping time order inside the groups
+        idx = np.where(idx0 & np.isfinite(fwhms))[0]
+        idx = idx[np.lexsort((seq_ids[idx], finverse[idx]))]
+
+        new = np.ones(len(idx), dtype=bool)
+        new[1:] = (finverse[idx][1:] != finverse[idx][:-1]) | (seq_ids[idx][1:] != seq_ids[idx][:-1])
+        counts = np.diff(np.append(np.where(new)[0], len(idx)))
+
+        # Groups with less than two points are not shown
+        idx = idx[np.repeat(counts >= 2, counts)]
+        offsets = np.concatenate([[0], np.cumsum(counts[counts >= 2])])
+
+        columns = {
+            'time': times[idx], 'mjd': mjds[idx], 'filter': np.char.replace(fnames, 'mag', '')[finverse[idx]],
+            'seq_id': seq_ids[idx], 'xi': xi[idx], 'eta': eta[idx],
+            'mag': mags[idx], 'magerr': magerrs[idx], 'flags': flags[idx],
+            'fwhm': fwhms[idx], 'color_term': color_terms[idx], 'color_term2': color_terms2[idx],
+            'site': sites[idx], 'observer': observers[idx],
+            'ofilter': ofilters[idx], 'exposure': exposures[idx],
+        }
+        meta = {
+            'name': name, 'title': title, 'ra': float(ra), 'dec': float(dec), 'sr': sr,
+            'bv': float(bv), 'bverr': None if bverr is None else float(bverr),
+        }
+
+        format = encoding.get_format(request, encoding.binary_formats)
+
+        if format in encoding.binary_formats:
+            # Flat table of all the points, with the boundaries of light curves in meta
+            meta['offsets'] = offsets.tolist()
+            response = HttpResponse(encoding.encode(format, columns, meta), content_type=encoding.binary_formats[format])
+        else:
+            # Numeric columns are rounded to meaningful precision and encoded as arrays, string ones
+            # are converted to lists as a whole, then all are sliced into separate light curves
+            columns['time'] = np.datetime_as_string(columns['time'], unit='us')
+            for key,value in columns.items():
+                if value.dtype.kind == 'U':
+                    columns[key] = value.tolist()
+                elif key in lc_json_precision:
+                    columns[key] = np.round(value, lc_json_precision[key])
+            colors = cols[idx].tolist()
+
+            lcs = []
+
+            for i0,i1 in zip(offsets[:-1].tolist(), offsets[1:].tolist()):
+                lc = {'filter': columns['filter'][i0], 'sid': int(columns['seq_id'][i0]), 'color': colors[i0]}
+                for key in ['time', 'mjd', 'xi', 'eta', 'mag', 'magerr', 'flags', 'fwhm', 'color_term', 'color_term2',
+                            'site', 'observer', 'ofilter', 'exposure']:
+                    lc[key] = columns[key][i0:i1]
+                lcs.append(lc)
+
+            data = dict(meta, lcs=lcs)
+            response = HttpResponse(encoding.encode_json(data), content_type="application/json")
+
+        patch_vary_headers(response, ['Accept'])
+
+        return encoding.compress_response(request, response)
+
+
+# Columns of exported light curves, with printf-style formats for text outputs and VOTable datatypes
+lc_export_columns = [
+    ('time', '%s', 'char'),
+    ('mjd', '%.7f', 'double'),
+    ('filter', '%s', 'char'),
+    ('mag', '%.4f', 'double'),
+    ('magerr', '%.4f', 'double'),
+    ('flags', '%d', 'long'),
+    ('fwhm', '%.2f', 'double'),
+    ('color_term', '%.5f', 'double'),
+    ('color_term2', '%.5f', 'double'),
+    ('ra', '%.6f', 'double'),
+    ('dec', '%.6f', 'double'),
+    ('seq_id', '%d', 'long'),
+    ('site', '%s', 'char'),
+    ('observer', '%s', 'char'),
+    ('ofilter', '%s', 'char'),
+    ('exposure', '%.2f', 'double'),
+]
+
+lc_export_formats = {
+    # format: (content type, file extension)
+    'text': ('text/plain', 'txt'),
+    'mjd': ('text/plain', 'txt'),
+    'csv': ('text/csv', 'csv'),
+    'votable': ('application/x-votable+xml', 'vot'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+
+
+def iterate_lc_data(request, params=None, chunk_size=50000):
+    """Yields the light curve as a sequence of dicts of numpy arrays with at most chunk_size
+    points each, fetched through a server-side cursor so that the whole light curve is never
+    kept in memory. If bv parameter is given, color correction is applied to magnitudes.
+    """
+    lc = get_lc(request, params=params).values_list(*[_[1] for _ in lc_columns])
+    sql, params = lc.query.sql_with_params()
+
+    bv = request.GET.get('bv')
+    bv = float(bv) if bv else None
+
+    cursor = connection.chunked_cursor()
+
+    try:
+        cursor.execute(sql, params)
+
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+
+            data = _make_lc_data(list(zip(*rows)))
+
+            if bv is not None:
+                data['mag'] = data['mag'] + data['color_term']*bv + data['color_term2']*bv**2
+
+            yield data
+    finally:
+        cursor.close()
+
+
+def _format_lines(columns, fmts, delimiter=' '):
+    """Formats the list of arrays as text lines, column by column"""
+    lines = None
 
-        for fn in np.unique(filters):
-            idx = idx0 & (filters == fn)
+    for col,fmt in zip(columns, fmts):
+        col = np.char.mod(fmt, col)
+        lines = col if lines is None else np.char.add(np.char.add(lines, delimiter), col)
 
-            if len(mags[idx]) < 2:
+    return '\n'.join(lines) + '\n'
+
+
+def _csv_quote(values):
+    """Quotes the strings containing delimiters, quotes or line breaks, as per RFC 4180"""
+    quote = np.zeros(len(values), dtype=bool)
+    for c in (',', '"', '\r', '\n'):
+        quote |= np.char.find(values, c) >= 0
+
+    if not np.any(quote):
+        return values
+
+    quoted = np.char.add(np.char.add('"', np.char.replace(values, '"', '""')), '"')
+
+    return np.where(quote, quoted, values)
+
+
+def _xml_escape(values):
+    for a,b in (('&', '&amp;'), ('<', '&lt;'), ('>', '&gt;')):
+        values = np.char.replace(values, a, b)
+
+    return values
+
+
+class _ParquetStream:
+    """Minimal write-only file-like object collecting the output of pyarrow ParquetWriter,
+    so that written row groups may be streamed as soon as they are ready"""
+    def __init__(self):
+        self.chunks = []
+        self.pos = 0
+        self.closed = False
+
+    def write(self, data):
+        data = bytes(data)
+        self.chunks.append(data)
+        self.pos += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.pos
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def pop(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def stream_lc(chunks, format='text', single=False):
+    """Generator converting the chunks of light curve into the bytes of given format"""
+    names = [_[0] for _ in lc_export_columns]
+    fmts = [_[1] for _ in lc_export_columns]
+
+    if format == 'text':
+        yield b'# Date Time MJD Site Observer Filter Mag Magerr Flags FWHM\n'
+
+        for data in chunks:
+            times = np.char.replace(np.datetime_as_string(data['time'], unit='us'), 'T', ' ')
+            yield _format_lines(
+                [times, data['mjd'], data['site'], data['observer'], data['filter'], data['mag'], data['magerr'], data['flags'], data['fwhm']],
+                ['%s', '%.7f', '%s', '%s', '%s', '%.4f', '%.4f', '%d', '%.2f'],
+            ).encode()
+
+    elif format == 'mjd':
+        yield b'# MJD Mag Magerr\n' if single else b'# MJD Mag Magerr Filter\n'
+
+        for data in chunks:
+            idx = np.isfinite(data['mag'])
+            if not np.any(idx):
                 continue
+            columns = [data['mjd'][idx], data['mag'][idx], data['magerr'][idx]]
+            if not single:
+                columns.append(data['filter'][idx])
+            yield _format_lines(columns, ['%.7f', '%.4f', '%.4f', '%s']).encode()
+
+    elif format == 'csv':
+        yield (','.join(names) + '\n').encode()
+
+        for data in chunks:
+            data['time'] = np.datetime_as_string(data['time'], unit='us')
+            for _ in ('filter', 'site', 'observer', 'ofilter'):
+                data[_] = _csv_quote(data[_])
+            yield _format_lines([data[_] for _ in names], fmts, delimiter=',').encode()
+
+    elif format == 'votable':
+        yield (
+            '<?xml version="1.0" encoding="utf-8"?>\n'
+            '<VOTABLE version="1.4" xmlns="http://www.ivoa.net/xml/VOTable/v1.3">\n'
+            '<RESOURCE type="results">\n<TABLE name="lc">\n' +
+            ''.join(
+                f'<FIELD name="{name}" datatype="char" arraysize="*"/>\n' if datatype == 'char' else
+                f'<FIELD name="{name}" datatype="{datatype}"/>\n'
+                for name,fmt,datatype in lc_export_columns
+            ) +
+            '<DATA>\n<TABLEDATA>\n'
+        ).encode()
+
+        for data in chunks:
+            data['time'] = np.datetime_as_string(data['time'], unit='us')
+            for _ in ('filter', 'site', 'observer', 'ofilter'):
+                data[_] = _xml_escape(data[_])
+            lines = _format_lines([data[_] for _ in names], fmts, delimiter='</TD><TD>')
+            yield ''.join(f"<TR><TD>{_}</TD></TR>\n" for _ in lines.splitlines()).encode()
+
+        yield b'</TABLEDATA>\n</DATA>\n</TABLE>\n</RESOURCE>\n</VOTABLE>\n'
+
+    elif format == 'parquet':
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        stream = _ParquetStream()
+        writer = None
+
+        for data in chunks:
+            table = pa.table({_: data[_] for _ in names})
+            if writer is None:
+                writer = pq.ParquetWriter(stream, table.schema)
+            writer.write_table(table)
+            yield stream.pop()
+
+        if writer is None:
+            # Empty light curve, still with proper schema
+            data = _make_lc_data([[] for _ in lc_columns])
+            writer = pq.ParquetWriter(stream, pa.table({_: data[_] for _ in names}).schema)
+
+        writer.close()
+        yield stream.pop()
 
-            ax.errorbar(times[idx], mags[idx], magerrs[idx], fmt='.', color=cols[idx][0], capsize=0, alpha=0.3)
-            ax.scatter(times[idx], mags[idx], marker='.', c=cols[idx][0])
-            ax.invert_yaxis()
 
-        ax.invert_yaxis()
+@csrf_exempt
+def lc_export(request, format='text', stream=None):
+    """Streams the full light curve in one of lc_export_formats, with constant memory usage.
+    Optional stream function wraps the generator of the content, e.g. to consume it asynchronously.
+    """
+    params = get_lc_params(request)
 
-        ax.set_title(title)
+    content_type,ext = lc_export_formats[format]
 
-        canvas = FigureCanvas(fig)
+    content = stream_lc(iterate_lc_data(request, params=params), format=format, single=params['filter'] is not None)
 
-        response = HttpResponse(content_type='image/jpeg')
-        canvas.print_jpg(response)
+    response = StreamingHttpResponse(
+        content if stream is None else stream(content),
+        content_type=content_type
+    )
 
-        return response
+    response['Content-Disposition'] = 'attachment; filename=lc_%s_%s_%s_%s.%s' % (
+        'mjd' if format == 'mjd' else 'full', params['ra'], params['dec'], params['sr'], ext
+    )
 
-    elif mode == 'json':
-        lcs = []
+    return response
 
-        for fn in np.unique(filters):
-            idx1 = idx0 & (filters == fn)
 
-            for sid in np.unique(seq_ids[idx1]):
-                idx = idx1 & (seq_ids == sid)
-                idx &= np.isfinite(mags)
-                idx &= np.isfinite(fwhms)
+def lc_variability(request):
+    """Variability indices and periodogram of the light curve, cached together with it.
+    If bv is given, color correction is applied to magnitudes first."""
+    params = get_lc_params(request)
 
-                if len(mags[idx]) < 2:
-                    continue
+    bv = request.GET.get('bv')
+    bv = float(bv) if bv else None
 
-                times_idx = [_.isoformat() for _ in times[idx]]
+    min_period = float(request.GET.get('min_period', 0.05))
+    max_period = request.GET.get('max_period')
+    max_period = float(max_period) if max_period else None
 
-                lcs.append({
-                    'filter': fn.replace('mag', ''), 'sid': sid, 'color': cols[idx][0],
-                    'time': times_idx, 'mjd': list(mjds[idx]), 'xi': list(xi[idx]), 'eta': list(eta[idx]),
-                    'mag': list(mags[idx]), 'magerr': list(magerrs[idx]), 'flags': list(flags[idx]),
-                    'fwhm': list(fwhms[idx]), 'color_term': list(color_terms[idx]), 'color_term2': list(color_terms2[idx]),
-                    'site': list(sites[idx]), 'observer': list(observers[idx]),
-                    'ofilter': list(ofilters[idx]), 'exposure': list(exposures[idx]),
-                })
+    version = get_lc_version(params)
+    key = get_lc_cache_key(params, prefix='var', version=version) + f":{bv}:{min_period}:{max_period}"
 
-        data = {'name': name, 'title': title, 'ra': ra, 'dec': dec, 'sr': sr, 'bv': bv, 'lcs': lcs}
+    result = cache.get(key)
 
-        return HttpResponse(json.dumps(data, cls=utils.NumpyEncoder), content_type="application/json")
+    if result is None:
+        data = get_lc_data(request, params=params, version=version)
 
-    elif mode == 'text':
-        response = HttpResponse(request, content_type='text/plain')
+        mags = data['mag']
+        if bv is not None:
+            mags = mags + data['color_term']*bv + data['color_term2']*bv**2
 
-        response['Content-Disposition'] = 'attachment; filename=lc_full_%s_%s_%s.txt' % (ra, dec, sr)
+        result = variability.analyze_lc(
+            data['mjd'], mags, data['magerr'], data['filter'],
+            min_period=min_period, max_period=max_period,
+        )
 
-        print('# Date Time MJD Site CCD Filter Mag Magerr Flags FWHM Std Nstars', file=response)
+        cache.set(key, result, timeout=settings.LC_CACHE_TIMEOUT)
 
-        for _ in xrange(len(times)):
-            print(times[_], mjds[_], sites[_], ccds[_], filters[_], mags[_], magerrs[_], flags[_], fwhms[_], stds[_], nstars[_], file=response)
+    result = dict(result, ra=params['ra'], dec=params['dec'], sr=params['sr'], object=params['object'])
 
-        return response
+    if result['periodogram'] is not None:
+        if request.GET.get('periodogram'):
+            result['periodogram'] = {_: np.asarray(__).tolist() for _,__ in result['periodogram'].items()}
+        else:
+            # Full periodogram only on request
+            result['periodogram'] = {_: result['periodogram'][_] for _ in ['period', 'power', 'fap']}
 
-    # elif mode == 'mjd':
-    #     response = HttpResponse(request, content_type='text/plain')
+    return HttpResponse(json.dumps(result, cls=utils.NumpyEncoder), content_type="application/json")
 
-    #     response['Content-Disposition'] = 'attachment; filename=lc_mjd_%s_%s_%s.txt' % (ra, dec, sr)
 
-    #     if len(np.unique(filters)) == 1:
-    #         single = True
-    #     else:
-    #         single = False
+# Columns of the batch light curves in the same order as lc_columns
+lc_batch_fields = [
+    'f.time', 'fl.name', 'p.ra', 'p.dec', 'p.mag', 'p.magerr', 'p.flags', 'p.fwhm', 'p.color_term', 'p.color_term2',
+    'p.sequence', 's.site', 's.observer', 'f.filter', 'f.exposure',
+]
 
-    #     if single:
-    #         print('# MJD Mag Magerr', file=response)
-    #     else:
-    #         print('# MJD Mag Magerr Filter', file=response)
+# Max number of targets in a single batch request
+lc_batch_max_targets = 10000
 
-    #     idx = idx0
 
-    #     for _ in xrange(len(times[idx])):
-    #         if single:
-    #             print(mjds[idx][_], mags[idx][_], magerrs[idx][_], file=response)
-    #         else:
-    #             print(mjds[idx][_], mags[idx][_], magerrs[idx][_], filters[idx][_], file=response)
+def _get_table_column(table, names):
+    for name in names:
+        if name in table.colnames:
+            return np.asarray(table[name])
 
-    #     return response
+    return None
 
 
-def photometry(request):
-    context = {}
+def get_batch_targets(request, sr=None):
+    """Parses the list of targets of the batch request, returns the arrays of ra, dec (degrees),
+    search radii (arcsec) and target ids. Targets may be given as uploaded table with ra, dec and
+    optional sr and id columns, as JSON body with targets list of [ra, dec, sr] lists or dicts,
+    or as targets parameter with one 'ra dec [sr]' target per line.
+    """
+    if sr is None:
+        sr = float(request.POST.get('sr', request.GET.get('sr', 2)))
 
-    form = forms.PhotometryForm(request.POST or None)
+    ids = None
+
+    if request.FILES.get('file'):
+        upload = request.FILES['file']
+        ext = os.path.splitext(upload.name)[1].lower()
+        fmt = request.POST.get('format') or {
+            '.csv': 'ascii.csv', '.vot': 'votable', '.xml': 'votable', '.fits': 'fits', '.parquet': 'parquet'
+        }.get(ext, 'ascii')
+
+        table = Table.read(io.BytesIO(upload.read()), format=fmt)
+
+        ra = _get_table_column(table, ['ra', 'RA', 'RAJ2000', 'ra_deg'])
+        dec = _get_table_column(table, ['dec', 'DEC', 'Dec', 'DEJ2000', 'dec_deg'])
+        srs = _get_table_column(table, ['sr', 'radius'])
+        ids = _get_table_column(table, ['id', 'name', 'Name'])
+
+        if ra is None or dec is None:
+            raise ValueError("Uploaded table should have ra and dec columns")
+
+    elif request.content_type == 'application/json':
+        body = json.loads(request.body)
+        sr = float(body.get('sr', sr))
+        targets = body.get('targets', [])
+
+        if targets and isinstance(targets[0], dict):
+            ra = [_['ra'] for _ in targets]
+            dec = [_['dec'] for _ in targets]
+            srs = [_.get('sr', sr) for _ in targets]
+            ids = [_.get('id', i) for i,_ in enumerate(targets)]
+        else:
+            ra = [_[0] for _ in targets]
+            dec = [_[1] for _ in targets]
+            srs = [_[2] if len(_) > 2 else sr for _ in targets]
+
+    else:
+        lines = request.POST.get('targets', request.GET.get('targets', '')).replace(';', '\n').splitlines()
+        targets = [[float(__) for __ in _.replace(',', ' ').split()] for _ in lines if _.strip()]
 
+        ra = [_[0] for _ in targets]
+        dec = [_[1] for _ in targets]
+        srs = [_[2] if len(_) > 2 else sr for _ in targets]
+
+    ra = np.asarray(ra, dtype=np.float64)
+    dec = np.asarray(dec, dtype=np.float64)
+    srs = np.full(len(ra), sr) if srs is None else np.asarray(srs, dtype=np.float64)
+    ids = np.arange(len(ra)) if ids is None else np.asarray(ids)
+    if ids.dtype.kind in 'SO':
+        ids = ids.astype(str)
+
+    return ra, dec, srs, ids
+
+
+def fetch_lc_batch(ra, dec, srs, magerr=None, fname=None):
+    """Light curves of all targets fetched with a single cross-match of the targets table against
+    photometry. Returns the index of the target for every point, and the dict of numpy arrays for
+    lc_columns, ordered by target and time.
+    """
+    # All sky regions touched by the targets, for the planner to skip irrelevant partitions
+    pixels = sorted(set(int(__) for _ra,_dec,_sr in zip(ra, dec, srs) for __ in ingest.get_photometry_hpx_cone(_ra, _dec, _sr/3600)))
+
+    where = ['p.hpx = ANY(%s)']
+    values = [pixels]
+
+    if magerr:
+        where.append('p.magerr < %s')
+        values.append(magerr)
+
+    if fname:
+        where.append('fl.name = %s')
+        values.append(fname + 'mag')
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            'CREATE TEMPORARY TABLE lc_batch_targets (id INT, ra FLOAT8, dec FLOAT8, sr FLOAT8) ON COMMIT DROP'
+        )
+        cursor.execute(
+            'INSERT INTO lc_batch_targets SELECT * FROM unnest(%s::int[], %s::float8[], %s::float8[], %s::float8[])',
+            (list(range(len(ra))), ra.tolist(), dec.tolist(), (srs/3600).tolist())
+        )
+        cursor.execute('ANALYZE lc_batch_targets')
+
+        # q3c_join uses the positional index of photometry for every target
+        cursor.execute(
+            'SELECT t.id, ' + ', '.join(lc_batch_fields) + ' FROM lc_batch_targets t '
+            'JOIN photometry p ON q3c_join(t.ra, t.dec, p.ra, p.dec, t.sr) '
+            'JOIN frames f ON f.id = p.frame JOIN sequences s ON s.id = p.sequence JOIN filters fl ON fl.id = p.filter '
+            'WHERE ' + ' AND '.join(where) + ' ORDER BY t.id, f.time',
+            values
+        )
+        rows = cursor.fetchall()
+
+    columns = list(zip(*rows)) if rows else [[] for _ in range(len(lc_columns) + 1)]
+
+    return np.array(columns[0], dtype=np.int64), _make_lc_data(columns[1:])
+
+
+@csrf_exempt
+def lc_batch(request):
+    """Light curves of many targets at once, as columnar JSON or binary table with the points grouped
+    by target. Every target has the offset and number of its points in the columns."""
+    try:
+        ra, dec, srs, ids = get_batch_targets(request)
+    except (ValueError, TypeError, KeyError, IndexError) as e:
+        return JsonResponse({'error': f"Cannot parse targets: {e}"}, status=400)
+
+    if len(ra) > lc_batch_max_targets:
+        return JsonResponse({'error': f"Too many targets, max {lc_batch_max_targets}"}, status=400)
+
+    magerr = request.POST.get('magerr', request.GET.get('magerr'))
+    fname = request.POST.get('filter', request.GET.get('filter'))
+
+    index, data = fetch_lc_batch(ra, dec, srs, magerr=float(magerr) if magerr else None, fname=fname or None)
+
+    counts = np.bincount(index, minlength=len(ra))
+    offsets = np.cumsum(counts) - counts
+
+    fnames,inverse = np.unique(data['filter'], return_inverse=True)
+    data['filter'] = np.array([_.replace('mag', '') for _ in fnames] or [''])[inverse.ravel()]
+
+    targets = {
+        'id': ids.tolist(), 'ra': ra.tolist(), 'dec': dec.tolist(), 'sr': srs.tolist(),
+        'offset': offsets.tolist(), 'count': counts.tolist(),
+    }
+    columns = {name: data[name] for name in ['time', 'mjd'] + [_[0] for _ in lc_columns if _[0] != 'time']}
+
+    format = encoding.get_format(request, encoding.binary_formats)
+
+    if format in encoding.binary_formats:
+        response = HttpResponse(encoding.encode(format, columns, {'targets': targets}), content_type=encoding.binary_formats[format])
+    else:
+        # Same encoding as for the light curves of a single target
+        columns['time'] = np.datetime_as_string(columns['time'], unit='us')
+        for key,value in columns.items():
+            if value.dtype.kind == 'U':
+                columns[key] = value.tolist()
+            elif key in lc_json_precision:
+                columns[key] = np.round(value, lc_json_precision[key])
+
+        response = HttpResponse(encoding.encode_json({'targets': targets, 'columns': columns}), content_type="application/json")
+
+    patch_vary_headers(response, ['Accept'])
+
+    return encoding.compress_response(request, response)
+
+
+def objects_search(request):
+    """Objects within the cone, optionally selected by their per-filter statistics,
+    e.g. for finding variable ones"""
+    ra = float(request.GET.get('ra'))
+    dec = float(request.GET.get('dec'))
+    sr = float(request.GET.get('sr', 60))
+    fname = request.GET.get('filter')
+    min_nmeas = int(request.GET.get('min_nmeas', 0))
+    min_std = float(request.GET.get('min_std', 0))
+    limit = min(int(request.GET.get('limit', 1000)), 100000)
+
+    where = ['q3c_radial_query(o.ra, o.dec, %s, %s, %s)', 's.nmeas >= %s', 's.std >= %s']
+    values = [ra, dec, sr/3600, min_nmeas, min_std]
+
+    if fname:
+        where.append('f.name = %s')
+        values.append(fname + 'mag')
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT o.id, o.ra, o.dec, o.nmeas, o.time_min, o.time_max, f.name, s.nmeas, s.mag, s.std '
+            'FROM objects o JOIN object_stats s ON s.object = o.id JOIN filters f ON f.id = s.filter '
+            'WHERE ' + ' AND '.join(where) + ' ORDER BY o.id, f.name',
+            values
+        )
+        rows = cursor.fetchall()
+
+    result = {}
+    for oid,ora,odec,nmeas,tmin,tmax,fn,fnmeas,mag,std in rows:
+        if oid not in result:
+            if len(result) >= limit:
+                break
+
+            result[oid] = {
+                'id': oid, 'ra': ora, 'dec': odec, 'nmeas': nmeas,
+                'time_min': tmin, 'time_max': tmax, 'filters': {}
+            }
+
+        result[oid]['filters'][fn.replace('mag', '')] = {'nmeas': fnmeas, 'mag': mag, 'std': std}
+
+    return JsonResponse({'objects': list(result.values())})
+
+
+def photometry_response(request, form, target=None):
+    """Photometry form page for the target already resolved from the submitted form"""
     context = {'form': form}
 
     if request.method == 'POST':
@@ -271,8 +945,6 @@ def photometry(request):
             bv = form.cleaned_data.get('bv')
             filt = form.cleaned_data.get('filter')
 
-            target = resolve.resolve(target_name)
-
             if target is None:
                 messages.warning(request, f"Cannot resolve target: {target_name}")
             else:
@@ -285,3 +957,14 @@ def photometry(request):
                 context['filter'] = filt
 
     return TemplateResponse(request, 'photometry.html', context=context)
+
+
+def photometry(request):
+    form = forms.PhotometryForm(request.POST or None)
+
+    target = None
+
+    if request.method == 'POST' and form.is_valid():
+        target = resolver.resolve(form.cleaned_data.get('target'))
+
+    return photometry_response(request, form, target)
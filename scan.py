@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+
+import os, sys
+
+from reticulum import scanner
+
+
+def queue_files(paths, state, reprocess=False, batch=100, verbose=False):
+    """Submits the files for calibration and ingestion, and marks them as queued"""
+    # Celery tasks need configured Django
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'reticulum.settings')
+    import django
+    django.setup()
+
+    from reticulum import tasks
+
+    tasks.process_frames(paths, batch=batch, reprocess=reprocess)
+    scanner.set_status(state, paths, 'queued')
+
+    if verbose:
+        verbose(f"{len(paths)} files queued")
+
+
+def print_files(paths, state):
+    """Prints the files, e.g. for passing them to calibrate.py, and marks them as listed"""
+    for path in paths:
+        print(path)
+    sys.stdout.flush()
+
+    scanner.set_status(state, paths, 'listed')
+
+
+if __name__ == '__main__':
+    from optparse import OptionParser
+
+    parser = OptionParser(usage="usage: %prog [options] root1 [root2 ...]")
+    parser.add_option('-s', '--state', help='State database file', action='store', dest='state', type='str', default='scan.sqlite')
+    parser.add_option('-p', '--pattern', help='Pattern for the names of SIPS exports', action='store', dest='pattern', type='str', default='*.csv')
+    parser.add_option('--full', help='Check all files, not only the ones in changed directories', action='store_true', dest='full', default=False)
+    parser.add_option('--min-age', help='Defer the files modified less than this number of seconds ago', action='store', dest='min_age', type='float', default=60)
+    parser.add_option('-q', '--queue', help='Submit new files to the task queue instead of printing them', action='store_true', dest='queue', default=False)
+    parser.add_option('-r', '--reprocess', help='Recalibrate the changed files even if already calibrated', action='store_true', dest='reprocess', default=False)
+    parser.add_option('-b', '--batch', help='Number of queued files to ingest in a single transaction', action='store', dest='batch', type='int', default=100)
+    parser.add_option('-w', '--watch', help='Keep watching for new files', action='store_true', dest='watch', default=False)
+    parser.add_option('-i', '--interval', help='Interval between scans in watch mode, seconds', action='store', dest='interval', type='float', default=60)
+    parser.add_option('-v', '--verbose', help='Verbose', action='store_true', dest='verbose', default=False)
+
+    (options,roots) = parser.parse_args()
+
+    if not roots:
+        parser.error("No directories to scan")
+
+    # Log to stderr so that the list of files on stdout stays clean
+    verbose = (lambda *args,**kwargs: print(*args, **kwargs, file=sys.stderr)) if options.verbose else False
+
+    state = scanner.open_state(options.state)
+
+    if options.queue:
+        callback = lambda paths: queue_files(paths, state, reprocess=options.reprocess, batch=options.batch, verbose=verbose)
+    else:
+        callback = lambda paths: print_files(paths, state)
+
+    if options.watch:
+        scanner.watch(state, roots, callback, pattern=options.pattern, interval=options.interval, min_age=options.min_age, verbose=verbose)
+    else:
+        paths, ndeferred = scanner.scan(state, roots, pattern=options.pattern, full=options.full, min_age=options.min_age, verbose=verbose)
+        # Files left pending by previous runs
+        paths = sorted(set(paths + scanner.get_files(state, 'new')))
+
+        if paths:
+            callback(paths)
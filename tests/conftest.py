@@ -0,0 +1,12 @@
+import os
+import sys
+
+# Repository root, so that the tests may also be run by plain pytest command
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Some of the modules need configured Django settings, though not the database
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'reticulum.settings')
+
+import django
+
+django.setup()
@@ -0,0 +1,108 @@
+import io
+import gzip
+import json
+
+import numpy as np
+import pytest
+
+from django.http import HttpResponse
+from django.test import RequestFactory
+
+from reticulum import encoding
+
+
+@pytest.fixture
+def columns():
+    return {
+        'time': np.datetime64('2024-01-01T00:00:00.123456') + np.arange(3)*np.timedelta64(1, 'h'),
+        'mag': np.array([15.1234, np.nan, 14.5]),
+        'magerr': np.array([0.01, 0.02, np.inf], dtype=np.float32),
+        'flags': np.array([0, 1, 2], dtype=np.int32),
+        'filter': np.array(['V', 'R', 'V']),
+    }
+
+
+def test_encode_json_fallback(monkeypatch):
+    data = {
+        'a': np.array([1.5, np.nan, np.inf]), 'b': np.float32(np.nan), 'c': [float('nan'), 1, 'x', np.int64(3)],
+        'd': np.array([1, 2], dtype=np.int16), 'e': np.round(np.array([0.1, 0.25], dtype=np.float32), 4),
+        'f': {'g': (1.0, None), 'h': np.array([[1.5, np.nan]])},
+    }
+    expected = {
+        'a': [1.5, None, None], 'b': None, 'c': [None, 1, 'x', 3], 'd': [1, 2], 'e': [0.1, 0.25],
+        'f': {'g': [1.0, None], 'h': [[1.5, None]]},
+    }
+
+    if encoding.orjson is not None:
+        assert json.loads(encoding.encode_json(data)) == expected
+
+    monkeypatch.setattr(encoding, 'orjson', None)
+
+    assert json.loads(encoding.encode_json(data)) == expected
+
+
+def test_encode_arrow(columns):
+    pa = pytest.importorskip('pyarrow')
+
+    table = pa.ipc.open_stream(encoding.encode_arrow(columns, {'offsets': [0, 3]})).read_all()
+
+    assert table.column_names == list(columns)
+    assert json.loads(table.schema.metadata[b'meta']) == {'offsets': [0, 3]}
+    assert np.array_equal(table['time'].to_numpy(), columns['time'])
+    assert np.array_equal(table['mag'].to_numpy(), columns['mag'], equal_nan=True)
+    assert table['filter'].to_pylist() == ['V', 'R', 'V']
+
+
+def test_encode_npz(columns):
+    data = np.load(io.BytesIO(encoding.encode('npz', columns, {'a': 1})), allow_pickle=False)
+
+    assert json.loads(str(data['meta'])) == {'a': 1}
+    for key,value in columns.items():
+        assert data[key].dtype == value.dtype
+        assert np.array_equal(data[key], value, equal_nan=value.dtype.kind == 'f')
+
+
+def test_encode_msgpack(columns):
+    msgpack = pytest.importorskip('msgpack')
+
+    data = msgpack.unpackb(encoding.encode('msgpack', columns, {'a': 1}))
+
+    assert data['meta'] == {'a': 1}
+    assert data['columns']['time'][0] == 1704067200123456
+    assert data['columns']['filter'] == ['V', 'R', 'V']
+
+
+def test_get_format():
+    rf = RequestFactory()
+    formats = encoding.binary_formats
+
+    assert encoding.get_format(rf.get('/'), formats) == 'json'
+    assert encoding.get_format(rf.get('/', {'format': 'npz'}), formats) == 'npz'
+    assert encoding.get_format(rf.get('/', HTTP_ACCEPT='application/vnd.apache.arrow.stream'), formats) == 'arrow'
+    assert encoding.get_format(rf.get('/', HTTP_ACCEPT='text/html,*/*'), formats) == 'json'
+    assert encoding.get_format(rf.get('/', {'format': 'unknown'}, HTTP_ACCEPT='application/x-npz'), formats) == 'npz'
+
+
+def test_get_accepted_encodings():
+    rf = RequestFactory()
+
+    assert encoding.get_accepted_encodings(rf.get('/')) == set()
+    assert encoding.get_accepted_encodings(rf.get('/', HTTP_ACCEPT_ENCODING='gzip, deflate, br')) == {'gzip', 'deflate', 'br'}
+    assert encoding.get_accepted_encodings(rf.get('/', HTTP_ACCEPT_ENCODING='gzip;q=0, zstd;q=0.5')) == {'zstd'}
+    assert encoding.get_accepted_encodings(rf.get('/', HTTP_ACCEPT_ENCODING='GZIP;q=0.0')) == set()
+
+
+def test_compress_response():
+    rf = RequestFactory()
+    content = b'[' + b','.join(b'%d' % _ for _ in range(1000)) + b']'
+
+    response = encoding.compress_response(rf.get('/', HTTP_ACCEPT_ENCODING='gzip'), HttpResponse(content))
+
+    assert response['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response['Vary']
+    assert int(response['Content-Length']) == len(response.content) < len(content)
+    assert gzip.decompress(response.content) == content
+
+    # Small or not accepted responses are kept as is
+    assert not encoding.compress_response(rf.get('/', HTTP_ACCEPT_ENCODING='gzip'), HttpResponse(b'[]')).has_header('Content-Encoding')
+    assert encoding.compress_response(rf.get('/'), HttpResponse(content)).content == content
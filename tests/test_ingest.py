@@ -0,0 +1,95 @@
+import struct
+
+import numpy as np
+import pytest
+import astropy.units as u
+
+from mocpy import MOC
+
+from reticulum import ingest
+
+
+def parse_copy_binary(data, types):
+    """Decodes PostgreSQL binary COPY data into the list of rows"""
+    assert data[:11] == b'PGCOPY\n\xff\r\n\x00'
+    pos = 19
+
+    rows = []
+    while True:
+        nfields, = struct.unpack_from('>h', data, pos)
+        pos += 2
+        if nfields == -1:
+            break
+
+        assert nfields == len(types)
+
+        row = []
+        for pgtype in types:
+            length, = struct.unpack_from('>i', data, pos)
+            value = data[pos + 4:pos + 4 + length]
+            pos += 4 + length
+
+            if pgtype == 'text':
+                row.append(value.decode('utf-8'))
+            elif pgtype == 'timestamp':
+                row.append(ingest._pg_epoch + np.frombuffer(value, dtype='>i8')[0].astype('timedelta64[us]'))
+            else:
+                row.append(np.frombuffer(value, dtype=ingest._copy_formats[pgtype])[0])
+        rows.append(row)
+
+    assert pos == len(data)
+
+    return rows
+
+
+def test_make_copy_binary_roundtrip():
+    types = ['int4', 'text', 'float8', 'float4', 'int2', 'timestamp', 'text']
+    columns = [
+        np.arange(6),
+        np.array(['V', 'Rmag', '', 'V', 'кириллица', 'g']),
+        np.array([1.5, -2.25, np.nan, 1e10, 0, 3]),
+        np.array([0.1, 0.2, 0.3, 0.4, 0.5, 0.6], dtype=np.float32),
+        np.array([1, 2, 3, 4, 5, -1]),
+        np.datetime64('2024-01-01T12:00:00.123456') + np.arange(6)*np.timedelta64(1, 'D'),
+        np.array(['a', 'bb', 'a', 'ccc', '', 'dd']),
+    ]
+
+    rows = parse_copy_binary(ingest.make_copy_binary(columns, types), types)
+
+    # Rows are grouped by the lengths of their text values, so the order is not kept
+    rows = sorted(rows, key=lambda _: _[0])
+
+    assert len(rows) == 6
+    for i,col in enumerate(columns):
+        values = [_[i] for _ in rows]
+        if col.dtype.kind == 'f':
+            assert np.array_equal(np.array(values, dtype=col.dtype), col, equal_nan=True)
+        else:
+            assert values == col.tolist() or np.array_equal(np.array(values), col)
+
+
+def test_make_copy_binary_empty():
+    types = ['int4', 'text']
+
+    assert parse_copy_binary(ingest.make_copy_binary([np.zeros(0, dtype=int), np.zeros(0, dtype=str)], types), types) == []
+
+
+@pytest.mark.parametrize('moc', [
+    MOC.from_cone(lon=10*u.deg, lat=20*u.deg, radius=0.5*u.deg, max_depth=12),
+    MOC.from_cone(lon=200*u.deg, lat=-60*u.deg, radius=5*u.deg, max_depth=8).union(MOC.from_cone(lon=0*u.deg, lat=89*u.deg, radius=0.1*u.deg, max_depth=8)),
+    MOC.new_empty(10),
+])
+def test_moc_bytes_roundtrip(moc):
+    data = ingest.moc_to_bytes(moc)
+    result = ingest.moc_from_bytes(data)
+
+    assert result.max_order == moc.max_order
+    assert result == moc
+    assert len(data) == 8*(1 + 2*len(moc.to_depth29_ranges))
+
+
+def test_get_coverage_names():
+    assert ingest.get_coverage_names() == ['all']
+    assert ingest.get_coverage_names('V', 'T1', np.datetime64('2024-03-05T01:02:03').astype(object)) == [
+        'all', 'filter/V', 'site/T1', 'month/2024-03',
+    ]
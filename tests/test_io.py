@@ -0,0 +1,108 @@
+import numpy as np
+from astropy.table import Table
+
+from reticulum import io
+
+header = [
+    ('Telescope', 'T1'), ('Observer', 'Me'), ('Filter', 'V'), ('Object', 'M 31'),
+    ('Exposure', '2024-01-01T00:00:00'), ('ExposureTime', '30'),
+    ('CenterRADeg', '10.5'), ('CenterDecDeg', '-0.2'), ('PixelScaleX', '1.2'), ('PixelScaleY', '1.2'),
+]
+
+colnames = ['Name', 'RA', 'Dec', 'CatalogRA', 'CatalogDec', 'X', 'Y', 'FWHMX', 'FWHMY', 'Ap3', 'Ap3Dev', 'Flag', 'Note']
+
+
+def sexa(value, hour=False):
+    value = value/15 if hour else value
+    sign = '-' if value < 0 else ''
+    value = abs(value)
+    d = int(value)
+    m = int((value - d)*60)
+
+    return f"{sign}{d:02d} {m:02d} {(value - d - m/60)*3600:05.2f}"
+
+
+def write_sips(filename, nrows, seed=1):
+    """Synthetic SIPS export with empty and saturated values, returns the index of its header line"""
+    rng = np.random.default_rng(seed)
+
+    lines = ['sep=;'] + [f"{key};{value}" for key,value in header] + [';'.join(colnames)]
+
+    for i in range(nrows):
+        ra, dec = rng.uniform(0, 360), rng.uniform(-1, 1)
+        lines.append(';'.join([
+            f"S{i}", sexa(ra, hour=True), sexa(dec),
+            sexa(ra, hour=True) if i % 3 else '', sexa(dec) if i % 3 else '',
+            f"{rng.uniform(0, 1000):.3f}", f"{rng.uniform(0, 800):.3f}",
+            f"{rng.uniform(1, 3):.2f}", f"{rng.uniform(1, 3):.2f}",
+            'saturated' if i % 7 == 0 else f"{rng.uniform(100, 1e5):.1f}",
+            '' if i % 11 == 0 else f"{rng.uniform(1, 100):.2f}",
+            str(i % 4), 'x' if i % 2 else 'y',
+        ]))
+
+    with open(filename, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+
+    return len(header) + 1
+
+
+def test_read_sips_matches_astropy(tmp_path):
+    filename = str(tmp_path / 'frame.csv')
+    header_start = write_sips(filename, 100)
+
+    table = io.read_sips(filename)
+
+    # Reference is the generic ASCII reader of astropy, with coordinates converted value by value
+    ref = Table.read(
+        filename, format='ascii', header_start=header_start, delimiter=';',
+        fill_values=(('', '0'), ('saturated', '0')), converters={'Name': str},
+    )
+
+    assert table.colnames == ['Name', 'ra', 'dec', 'CatalogRA', 'CatalogDec', 'x', 'y'] + colnames[7:]
+    assert table.meta['Telescope'] == 'T1'
+    assert len(table) == len(ref) == 100
+
+    for name,refname in zip(table.colnames, ref.colnames):
+        if refname in ['RA', 'Dec', 'CatalogRA', 'CatalogDec']:
+            expected = [io.parse_sexa(_, hour=refname.endswith('RA')) if _ else np.nan for _ in np.ma.filled(ref[refname], '')]
+            assert np.allclose(np.asarray(table[name], dtype=float), expected, equal_nan=True)
+        else:
+            assert np.array_equal(np.ma.getmaskarray(table[name]), np.ma.getmaskarray(ref[refname]))
+            good = ~np.ma.getmaskarray(ref[refname])
+            assert np.array_equal(np.asarray(table[name])[good], np.asarray(ref[refname])[good])
+
+
+def test_read_sips_filled(tmp_path):
+    filename = str(tmp_path / 'frame.csv')
+    write_sips(filename, 20)
+
+    table = io.read_sips(filename, filled=True)
+
+    assert not table.has_masked_columns
+    assert np.isnan(table['Ap3'][0])
+    assert np.isnan(table['CatalogRA'][0])
+
+
+def test_read_sips_quoted(tmp_path):
+    filename = str(tmp_path / 'frame.csv')
+    write_sips(filename, 5)
+
+    with open(filename) as f:
+        text = f.read()
+    with open(filename, 'w') as f:
+        f.write(text.replace('\nS1;', '\n"S;1";').replace(';x\n', ';"a;b"\n', 1))
+
+    table = io.read_sips(filename)
+
+    assert len(table) == 5
+    assert table['Name'][1] == 'S;1'
+    assert table['Note'][1] == 'a;b'
+
+
+def test_read_sips_not_sips(tmp_path):
+    filename = str(tmp_path / 'frame.csv')
+
+    with open(filename, 'w') as f:
+        f.write('a;b\n1;2\n')
+
+    assert io.read_sips(filename) is None
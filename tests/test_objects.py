@@ -0,0 +1,51 @@
+import numpy as np
+
+from reticulum import objects
+
+
+def test_radec_xyz_roundtrip():
+    ra, dec = np.array([0, 10, 359.5, 180]), np.array([0, -45, 89.9, -89.9])
+
+    ra1, dec1 = objects.xyz_to_radec(objects.radec_to_xyz(ra, dec))
+
+    assert np.allclose(ra1, ra) and np.allclose(dec1, dec)
+
+
+def test_cluster_positions():
+    sr = 2/3600
+    rng = np.random.default_rng(1)
+
+    # Two known objects, and two new ones, one of them on RA wrap-around
+    obj_ra, obj_dec = np.array([10.0, 10.01]), np.array([20.0, 20.0])
+    centers = [(10.0, 20.0), (10.01, 20.0), (10.02, 20.0), (0.0, -30.0)]
+    truth = np.repeat(np.arange(4), 5)
+
+    ra = np.array([centers[_][0] for _ in truth]) + rng.normal(0, 0.2/3600, len(truth))
+    dec = np.array([centers[_][1] for _ in truth]) + rng.normal(0, 0.2/3600, len(truth))
+    ra %= 360
+
+    index, (new_ra, new_dec) = objects.cluster_positions(ra, dec, obj_ra, obj_dec, sr=sr)
+
+    assert np.all(index[truth == 0] == 0)
+    assert np.all(index[truth == 1] == 1)
+    assert len(new_ra) == 2
+
+    # New objects get their own indices, offset by the number of known ones
+    assert len(set(index[truth == 2])) == 1 and len(set(index[truth == 3])) == 1
+    assert sorted({index[truth == 2][0], index[truth == 3][0]}) == [2, 3]
+
+    for i in (2, 3):
+        j = index[truth == i][0] - 2
+        dist = np.hypot((new_ra[j] - centers[i][0] + 180) % 360 - 180, new_dec[j] - centers[i][1])
+        assert dist < 0.5/3600
+
+
+def test_cluster_positions_no_known():
+    index, (new_ra, new_dec) = objects.cluster_positions(np.array([1.0, 1.0 + 1/3600, 2.0]), np.array([0.0, 0.0, 0.0]))
+
+    assert index[0] == index[1] != index[2]
+    assert len(new_ra) == 2
+
+    index, (new_ra, new_dec) = objects.cluster_positions(np.zeros(0), np.zeros(0), [1.0], [0.0])
+
+    assert len(index) == 0 and len(new_ra) == 0
@@ -0,0 +1,49 @@
+import numpy as np
+
+from reticulum.views_photometry import get_bv
+
+
+def make_lc(bv, nsigma=0.01, seed=1):
+    """Light curve in two filters with varying color terms, constant after correction for given B-V"""
+    rng = np.random.default_rng(seed)
+    n = 200
+
+    fnames = np.where(np.arange(n) % 2, 'Vmag', 'Rmag')
+    color_terms = rng.uniform(-0.3, 0.3, n)
+    color_terms2 = rng.uniform(-0.05, 0.05, n)
+    magerrs = np.full(n, nsigma)
+    mags = np.where(fnames == 'Vmag', 12.0, 11.5) - color_terms*bv - color_terms2*bv**2 + rng.normal(0, nsigma, n)
+
+    return mags, magerrs, fnames, color_terms, color_terms2
+
+
+def test_get_bv():
+    mags, magerrs, fnames, color_terms, color_terms2 = make_lc(0.7)
+
+    bv, bverr = get_bv(mags, magerrs, fnames, color_terms, color_terms2)
+
+    assert np.isfinite(bverr) and 0 < bverr < 0.05
+    assert abs(bv - 0.7) < 4*bverr
+
+
+def test_get_bv_matches_brute_force():
+    mags, magerrs, fnames, color_terms, color_terms2 = make_lc(-0.3, nsigma=0.05, seed=2)
+
+    bv, _ = get_bv(mags, magerrs, fnames, color_terms, color_terms2)
+
+    def scatter(bv):
+        corrected = mags + color_terms*bv + color_terms2*bv**2
+        return sum(np.sum((corrected[fnames == _] - np.mean(corrected[fnames == _]))**2) for _ in np.unique(fnames))
+
+    grid = np.linspace(-3, 3, 60001)
+    best = grid[np.argmin([scatter(_) for _ in grid])]
+
+    assert abs(bv - best) < 2e-4
+
+
+def test_get_bv_undefined():
+    mags, magerrs, fnames, _, _ = make_lc(0.5)
+
+    # Color terms constant within every filter do not constrain B-V
+    assert get_bv(mags, magerrs, fnames, np.where(fnames == 'Vmag', 0.1, 0.2), np.zeros(len(mags)), bv0=1.0)[0] == 1.0
+    assert np.isnan(get_bv([], [], [], [], [])[1])
@@ -0,0 +1,38 @@
+import numpy as np
+
+from reticulum import plots
+
+
+def test_downsample_lc():
+    rng = np.random.default_rng(1)
+    n = 20000
+
+    times = rng.uniform(0, 1000, n)
+    groups = np.where(rng.random(n) < 0.3, 'V', 'R')
+    magerrs = np.full(n, 0.01)
+    mags = np.where(groups == 'V', 15, 14) + rng.normal(0, 0.01, n)
+
+    outliers = rng.choice(n, 50, replace=False)
+    mags[outliers] += 1
+
+    idx = plots.downsample_lc(times, mags, magerrs, groups, max_points=1000)
+
+    # All outliers are kept, and every group is represented
+    assert set(outliers) <= set(idx)
+    assert len(idx) <= 1000 + len(np.unique(groups))
+    assert len(np.unique(groups[idx])) == 2
+    assert len(np.unique(idx)) == len(idx)
+    assert np.all(np.diff(times[idx]) >= 0)
+
+
+def test_downsample_lc_small():
+    assert plots.downsample_lc([3, 1, 2], [1, 2, 3], [0.1, 0.1, 0.1], ['V', 'V', 'R'], max_points=10).tolist() == [0, 1, 2]
+
+
+def test_render_lc():
+    rng = np.random.default_rng(1)
+    times = np.datetime64('2024-01-01') + np.arange(100)*np.timedelta64(1, 'h')
+
+    for format in plots.plot_formats:
+        content = plots.render_lc(times, rng.normal(15, 0.1, 100), np.full(100, 0.05), np.full(100, 'green'), size=200, format=format)
+        assert len(content) > 0
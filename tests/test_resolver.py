@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+
+from reticulum import resolver
+
+
+@pytest.mark.parametrize('string,ra,dec', [
+    ('10.684 41.269', 10.684, 41.269),
+    ('10.684,-41.269', 10.684, -41.269),
+    ('  0 0 ', 0, 0),
+    ('359.9 +90', 359.9, 90),
+    ('12 34 56.7 +45 12 34', 188.73625, 45.20944),
+    ('12:34:56.7 -45:12:34', 188.73625, -45.20944),
+    ('12h34m56.7s +45d12m34s', 188.73625, 45.20944),
+])
+def test_parse_coords(string, ra, dec):
+    target = resolver.parse_coords(string)
+
+    assert target is not None
+    assert np.isclose(target.ra.deg, ra, atol=1e-4) and np.isclose(target.dec.deg, dec, atol=1e-4)
+
+
+@pytest.mark.parametrize('string', [
+    '400 20', '10 95', '25 00 00 +10 00 00', 'M 31', 'Vega', '', 'abc 10 20',
+])
+def test_parse_coords_invalid(string):
+    assert resolver.parse_coords(string) is None
+
+
+def test_normalize_name():
+    assert resolver.normalize_name(' M  31 ') == resolver.normalize_name('m31') == 'm31'
+    assert resolver.get_cache_key('M 31') == resolver.get_cache_key('m31')
+
+
+def test_resolve_local():
+    targets = resolver.get_targets()
+
+    assert 'm31' in targets
+
+    target = resolver.resolve_local('m 31')
+    assert np.isclose(target.ra.deg, targets['m31'][0]) and np.isclose(target.dec.deg, targets['m31'][1])
+
+    assert resolver.resolve_local('10 20').dec.deg == 20
+    assert resolver.resolve_local('no such object') is None
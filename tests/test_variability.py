@@ -0,0 +1,74 @@
+import numpy as np
+
+from reticulum import variability
+
+
+def reference_indices(t, m, e):
+    """Straightforward variability indices of a single light curve"""
+    order = np.argsort(t)
+    t, m, e = t[order], m[order], e[order]
+    n = len(m)
+    w = 1/e**2
+
+    wmean = np.sum(w*m)/np.sum(w)
+    delta = np.sqrt(n/(n - 1))*(m - wmean)/e
+    prod = delta[1:]*delta[:-1]
+
+    return {
+        'nmeas': n,
+        'wmean': wmean,
+        'wstd': np.sqrt(np.sum(w*(m - wmean)**2)/np.sum(w)*n/(n - 1)),
+        'chi2dof': np.sum(w*(m - wmean)**2)/(n - 1),
+        'iqr': np.percentile(m, 75) - np.percentile(m, 25),
+        'eta': np.sum(np.diff(m)**2)/(n - 1)/np.var(m, ddof=1),
+        'stetson_j': np.mean(np.sign(prod)*np.sqrt(np.abs(prod))),
+    }
+
+
+def test_variability_indices():
+    rng = np.random.default_rng(1)
+    sizes = [5, 30, 2, 100]
+
+    groups = np.concatenate([np.full(_, i) for i,_ in enumerate(sizes)])
+    times = rng.uniform(0, 100, len(groups))
+    magerrs = rng.uniform(0.01, 0.1, len(groups))
+    mags = 15 + groups + rng.normal(0, 1, len(groups))*magerrs + 0.2*np.sin(times)*(groups == 3)
+
+    # Shuffled, with invalid points that have to be ignored
+    mags[[0, 10]] = np.nan
+    magerrs[20] = 0
+    order = rng.permutation(len(groups))
+
+    indices = variability.variability_indices(times[order], mags[order], magerrs[order], groups[order], ngroups=5)
+
+    assert set(indices.keys()) == set(variability.variability_columns)
+    assert indices['nmeas'].tolist() == [4, 28, 2, 100, 0]
+
+    good = np.isfinite(mags) & (magerrs > 0)
+    for g in range(4):
+        idx = good & (groups == g)
+        ref = reference_indices(times[idx], mags[idx], magerrs[idx])
+        for name in variability.variability_columns:
+            assert np.isclose(indices[name][g], ref[name]), (g, name)
+
+    # Empty group
+    assert np.isnan(indices['wmean'][4])
+
+    # Variable one stands out
+    assert np.argmax(indices['chi2dof'][:4]) == 3
+
+
+def test_periodogram():
+    rng = np.random.default_rng(2)
+    times = np.sort(rng.uniform(60000, 60100, 300))
+    filters = np.where(rng.random(300) < 0.5, 'V', 'R')
+    magerrs = np.full(300, 0.02)
+    mags = np.where(filters == 'V', 15, 14.5) + 0.2*np.sin(2*np.pi*times/1.37) + rng.normal(0, 0.02, 300)
+
+    res = variability.periodogram(times, mags, magerrs, filters)
+
+    assert abs(res['period'] - 1.37) < 0.01
+    assert res['fap'] < 1e-10
+    assert len(res['frequency']) == len(res['periodogram'])
+
+    assert variability.periodogram(times[:5], mags[:5], magerrs[:5], min_points=10) is None
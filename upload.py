@@ -1,16 +1,38 @@
 #!/usr/bin/env python3
 
 import os, sys, glob
-import io
+import multiprocessing
 from tqdm.auto import tqdm
 
-import numpy as np
-from astropy.table import Table
-from astropy import units as u
+from stdpipe.db import DB
 
-from mocpy import MOC
+from reticulum import ingest, objects
+
+# Per-process database connection used by the workers
+db = None
+
+
+def init_worker(dbname, dbhost):
+    global db
+
+    db = DB(dbname=dbname, dbhost=dbhost)
+    db.conn.autocommit = False
+
+
+def ingest_batch(batch, verbose=False):
+    """Ingests the batch of files in a separate transaction, deferring the update of
+    sequence footprints and coverage maps. Returns the number of new frames and rows,
+    and per-sequence and per-coverage MOCs.
+    """
+    try:
+        res = ingest.ingest_frames(db.conn, batch, update_mocs=False, verbose=verbose)
+        db.conn.commit()
+    except:
+        db.conn.rollback()
+        raise
+
+    return len(batch), res
 
-from stdpipe.db import DB
 
 if __name__ == '__main__':
     from optparse import OptionParser
@@ -18,96 +40,61 @@ if __name__ == '__main__':
     parser = OptionParser(usage="usage: %prog [options] args")
     parser.add_option('-d', '--db', help='Database name', action='store', dest='db', type='str', default='reticulum')
     parser.add_option('-H', '--host', help='Database host', action='store', dest='dbhost', type='str', default=None)
+    parser.add_option('-b', '--batch', help='Number of files to ingest in a single transaction', action='store', dest='batch', type='int', default=100)
+    parser.add_option('-j', '--jobs', help='Number of parallel ingestion processes', action='store', dest='jobs', type='int', default=1)
+    parser.add_option('-o', '--objects', help='Associate new detections with objects after ingestion', action='store_true', dest='objects', default=False)
+    parser.add_option('--rebuild-coverage', help='Recompute all coverage maps from the frames already in the database', action='store_true', dest='rebuild_coverage', default=False)
     parser.add_option('-v', '--verbose', help='Verbose', action='store_true', dest='verbose', default=False)
 
     (options,files) = parser.parse_args()
 
+    if options.rebuild_coverage:
+        db0 = DB(dbname=options.db, dbhost=options.dbhost)
+        db0.conn.autocommit = False
+        ingest.rebuild_coverage(db0.conn, verbose=options.verbose)
+        db0.conn.commit()
+
     if not len(files):
         sys.exit()
 
-    db = DB(dbname=options.db, dbhost=options.dbhost)
-    db.conn.autocommit = False
-    cur = db.conn.cursor()
-
-    s = io.StringIO()
-
-    for i,filename in enumerate(tqdm(files)):
-        dirname = os.path.split(filename)[0]
-        obj = Table.read(filename)
-
-        moc = MOC.from_lonlat(
-            obj["ra"].T * u.deg,
-            obj["dec"].T * u.deg,
-            max_norder=10,
-        )
-
-        seq_id = db.query(
-            'INSERT INTO sequences (path, site, observer, filter, target, moc) '
-            'VALUES (%s, %s, %s, %s, %s, %s) ON CONFLICT DO NOTHING RETURNING id',
-            (
-                dirname,
-                obj.meta['Telescope'],
-                obj.meta['Observer'],
-                obj.meta['Filter'],
-                obj.meta['Object'],
-                moc.to_string(),
-            ),
-            table=False,
-        )
-
-        if not seq_id:
-            # Sequence already exists
-            res = db.query('SELECT id,moc FROM sequences WHERE path = %s', (dirname,), table=False, simplify=False)
-            seq_id = int(res[0]['id'])
-            moc0 = MOC.from_string(res[0]['moc'])
-        else:
-            moc0 = None
-
-        frame_id = db.query(
-            'INSERT INTO frames (sequence, time, filter, exposure, ra, dec, radius, pixscale, width, height, moc, keywords) '
-            'VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s) ON CONFLICT DO NOTHING RETURNING id',
-            (
-                seq_id,
-                obj['time'][0].datetime,
-                #obj['mag_filter_name'][0],
-                obj.meta['Filter'],
-                obj.meta['ExposureTime'],
-                obj.meta['CenterRADeg'], obj.meta['CenterDecDeg'],
-                0.5*np.hypot(
-                    obj.meta['Width']*obj.meta['PixelScaleX'],
-                    obj.meta['Depth']*obj.meta['PixelScaleY']
-                )/3600,
-                0.5*np.hypot(
-                    obj.meta['PixelScaleX'],
-                    obj.meta['PixelScaleY']
-                )/3600,
-                obj.meta['Width'],
-                obj.meta['Depth'],
-                moc.to_string(),
-                obj.meta,
-            ),
-            table=False,
-        )
-
-        if frame_id:
-            Table({
-                'sequence':[seq_id]*len(obj), 'frame': [frame_id]*len(obj), 'time':obj['time'].datetime,
-                'filter': obj['mag_filter_name'], 'ra': obj['ra'], 'dec': obj['dec'],
-                'mag': obj['mag_calib'], 'magerr': obj['mag_calib_err'],
-                'color_term': obj['mag_color_term'][:,0], 'color_term2': obj['mag_color_term'][:,1],
-                'flags': obj['flags'], 'fwhm': obj['fwhm'],
-            }).write(s, format='ascii.no_header', delimiter='\t')
-
-            # Now update MOC of the sequence
-            if moc0 is not None:
-                moc0 = moc0.union(moc)
-                db.query('UPDATE sequences SET moc = %s WHERE path = %s', (moc0.to_string(), dirname))
-
-        columns = ['sequence', 'frame', 'time', 'filter', 'ra', 'dec', 'mag', 'magerr', 'color_term', 'color_term2', 'flags', 'fwhm']
-
-        if i % 100 == 0 or i == len(files) - 1:
-            s.seek(0)
-            cur.copy_from(s, 'photometry', sep='\t', columns=columns, size=65535000)
-            s = io.StringIO()
-
-            db.conn.commit()
+    # Keep the files of the same sequence together, so that the batches rarely share sequences
+    files = sorted(dict.fromkeys(files), key=lambda _: (os.path.split(_)[0], _))
+    batches = [files[i:i + options.batch] for i in range(0, len(files), options.batch)]
+
+    nframes, nrows = 0, 0
+    # Footprints of new frames for every sequence and coverage map, accumulated over the whole run
+    mocs, coverage = {}, {}
+
+    try:
+        with tqdm(total=len(files)) as pbar:
+            if options.jobs > 1:
+                with multiprocessing.Pool(options.jobs, initializer=init_worker, initargs=(options.db, options.dbhost)) as pool:
+                    for N,res in pool.imap_unordered(ingest_batch, batches):
+                        nframes += res[0]
+                        nrows += res[1]
+                        ingest.merge_mocs(mocs, res[2])
+                        ingest.merge_mocs(coverage, res[3])
+                        pbar.update(N)
+            else:
+                init_worker(options.db, options.dbhost)
+
+                for batch in batches:
+                    N,res = ingest_batch(batch, verbose=options.verbose)
+                    nframes += res[0]
+                    nrows += res[1]
+                    ingest.merge_mocs(mocs, res[2])
+                    ingest.merge_mocs(coverage, res[3])
+                    pbar.update(N)
+    finally:
+        # Update the footprints of all touched sequences and coverage maps once, even if some batch failed
+        if mocs or coverage:
+            db0 = DB(dbname=options.db, dbhost=options.dbhost)
+            db0.conn.autocommit = False
+            ingest.update_sequence_mocs(db0.conn, mocs, verbose=options.verbose)
+            ingest.update_coverage_mocs(db0.conn, coverage, verbose=options.verbose)
+            db0.conn.commit()
+
+            if options.objects:
+                objects.build_objects(db0.conn, objects.get_moc_pixels(coverage.get('all')), verbose=options.verbose)
+
+    print(f"{nframes} new frames with {nrows} measurements ingested")